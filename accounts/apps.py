@@ -4,3 +4,35 @@ from django.apps import AppConfig
 class AccountsConfig(AppConfig):
     default_auto_field = "django.db.models.BigAutoField"
     name = "accounts"
+
+    def ready(self):
+        from django.db.models.signals import post_delete, post_save
+        from rest_framework.authtoken.models import Token
+
+        from accounts import authentication, hashers  # noqa: F401
+        from history.registry import register
+        from history.signals import bulk_operation
+        from tutorial.responsecache import invalidate_scope_on_write
+
+        custom_user = self.get_model("CustomUser")
+        register(
+            custom_user,
+            ignore_fields=("last_login",),
+            soft_delete_field="soft_deleted",
+        )
+        # Logins and password rehashes don't change what the lists show.
+        invalidate_scope_on_write(
+            custom_user, "users", ignore_fields=("last_login", "password")
+        )
+
+        uid = "accounts.token_cache"
+        post_save.connect(
+            authentication.user_saved, sender=custom_user, dispatch_uid=uid
+        )
+        bulk_operation.connect(
+            authentication.users_changed_in_bulk, sender=custom_user, dispatch_uid=uid
+        )
+        post_save.connect(authentication.token_changed, sender=Token, dispatch_uid=uid)
+        post_delete.connect(
+            authentication.token_changed, sender=Token, dispatch_uid=uid
+        )
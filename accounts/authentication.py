@@ -0,0 +1,169 @@
+import copy
+
+from django.conf import settings
+from django.core.cache import caches
+from django.utils.translation import gettext_lazy as _
+from rest_framework import exceptions
+from rest_framework.authentication import (
+    BaseAuthentication,
+    TokenAuthentication,
+    get_authorization_header,
+)
+from rest_framework.authtoken.models import Token
+
+from accounts.tokens import (
+    InvalidToken,
+    decode_access_token,
+    revocations,
+    revoke_user_sessions,
+    user_from_claims,
+)
+from tutorial.caching import LRUCache
+
+
+class TokenCache:
+    """
+    Token key -> authenticated user, in a TTL'd in-process LRU in front of an
+    optional shared Django cache backend. Entries are dropped when the user
+    or the token changes; the TTL bounds anything missed.
+    """
+
+    def __init__(
+        self, max_entries=1024, ttl=60, backend=None, key_prefix="accounts:token:"
+    ):
+        self.local = LRUCache(max_entries, ttl=ttl)
+        self.ttl = ttl
+        self.backend = backend
+        self.key_prefix = key_prefix
+
+    def get(self, key):
+        user = self.local.get(key)
+        if user is None and self.backend is not None:
+            user = self.backend.get(self.key_prefix + key)
+            if user is not None:
+                self.local.set(key, user)
+        # Every request gets its own copy to modify.
+        return copy.deepcopy(user)
+
+    def set(self, key, user):
+        self.local.set(key, user)
+        if self.backend is not None:
+            self.backend.set(self.key_prefix + key, user, self.ttl)
+
+    def delete_many(self, keys):
+        for key in keys:
+            self.local.delete(key)
+        if self.backend is not None and keys:
+            self.backend.delete_many([self.key_prefix + key for key in keys])
+
+    def clear(self):
+        self.local.clear()
+
+    def is_empty(self):
+        return self.backend is None and not len(self.local)
+
+
+_cache = None
+
+
+def get_token_cache():
+    global _cache
+
+    if _cache is None:
+        options = getattr(settings, "ACCOUNTS_TOKEN_CACHE", {})
+        backend = options.get("BACKEND")
+        _cache = TokenCache(
+            max_entries=options.get("MAX_ENTRIES", 1024),
+            ttl=options.get("TTL", 60),
+            backend=caches[backend] if backend else None,
+        )
+    return _cache
+
+
+class CachedTokenAuthentication(TokenAuthentication):
+    """
+    `TokenAuthentication` that remembers which user a token belongs to, so
+    repeat requests skip the Token/CustomUser query. Soft deleted users are
+    rejected like inactive ones.
+    """
+
+    def authenticate_credentials(self, key):
+        cache = get_token_cache()
+        user = cache.get(key)
+        if user is None:
+            user, token = super().authenticate_credentials(key)
+            if user.soft_deleted:
+                raise exceptions.AuthenticationFailed(_("User inactive or deleted."))
+            cache.set(key, user)
+            return user, token
+
+        return user, Token(key=key, user=user)
+
+
+class SignedTokenAuthentication(BaseAuthentication):
+    """
+    Authenticates `Authorization: Bearer <access token>` from the signed
+    claims alone, with no query. The user is built from the claims; other
+    fields are loaded only if a view reads them.
+    """
+
+    keyword = "Bearer"
+
+    def authenticate(self, request):
+        auth = get_authorization_header(request).split()
+        if not auth or auth[0].lower() != self.keyword.lower().encode():
+            return None
+        if len(auth) != 2:
+            raise exceptions.AuthenticationFailed(_("Invalid bearer header."))
+
+        try:
+            claims = decode_access_token(auth[1].decode())
+            if revocations.is_revoked(claims["sid"]):
+                raise InvalidToken("Session revoked.")
+            user = user_from_claims(claims)
+        except (InvalidToken, UnicodeError, KeyError):
+            raise exceptions.AuthenticationFailed(_("Invalid or expired token."))
+        return user, claims
+
+    def authenticate_header(self, request):
+        return f'{self.keyword} realm="api"'
+
+
+def invalidate_user_tokens(user_ids):
+    cache = get_token_cache()
+    if cache.is_empty():
+        return
+
+    keys = list(
+        Token.objects.filter(user_id__in=user_ids).values_list("key", flat=True)
+    )
+    cache.delete_many(keys)
+
+
+def user_saved(sender, instance, created, raw, update_fields, **kwargs):
+    if raw:
+        return
+    credentials_changed = instance.credentials_changed(update_fields)
+    instance.remember_credentials()
+
+    # Logging in only touches `last_login`, which tokens don't care about.
+    if created or (update_fields and set(update_fields) <= {"last_login"}):
+        return
+    invalidate_user_tokens([instance.pk])
+
+    # Access tokens carry the staff and superuser flags as claims.
+    if instance.soft_deleted or not instance.is_active or credentials_changed:
+        revoke_user_sessions([instance.pk])
+
+
+def users_changed_in_bulk(sender, object_ids, **kwargs):
+    if object_ids is None:
+        # The rows are unknown; drop this process's entries and leave the
+        # shared tier to its TTL.
+        get_token_cache().clear()
+    else:
+        invalidate_user_tokens(object_ids)
+
+
+def token_changed(sender, instance, **kwargs):
+    get_token_cache().delete_many([instance.key])
@@ -0,0 +1,50 @@
+from django.contrib.auth import get_user_model
+from django.contrib.auth.backends import ModelBackend
+from django.core.exceptions import PermissionDenied
+from rest_framework.request import Request
+
+from accounts.hashing import (
+    HashingPoolBusy,
+    check_password_pooled,
+    make_password_pooled,
+)
+
+UserModel = get_user_model()
+
+
+class PooledHashingBackend(ModelBackend):
+    """
+    `ModelBackend` that hashes on the bounded verification pool, so login
+    storms queue for a fixed number of hashing threads instead of tying up
+    every request thread. Lookups and the rehash save stay on the request
+    thread and its connection.
+
+    A full pool is a 503 `HashingPoolBusy` for API views. Django's own
+    login views would turn it into a server error, so for them it refuses
+    the sign-in instead, which they show as a failed login.
+    """
+
+    def authenticate(self, request, username=None, password=None, **kwargs):
+        try:
+            return self._authenticate(username, password, **kwargs)
+        except HashingPoolBusy:
+            if isinstance(request, Request):
+                raise
+            raise PermissionDenied
+
+    def _authenticate(self, username, password, **kwargs):
+        if username is None:
+            username = kwargs.get(UserModel.USERNAME_FIELD)
+        if username is None or password is None:
+            return None
+
+        try:
+            user = UserModel._default_manager.get_by_natural_key(username)
+        except UserModel.DoesNotExist:
+            # Hash anyway so unknown usernames take as long as wrong passwords.
+            make_password_pooled(password)
+            return None
+
+        if check_password_pooled(user, password) and self.user_can_authenticate(user):
+            return user
+        return None
@@ -0,0 +1,41 @@
+from django.conf import settings
+from django.contrib.auth.hashers import (
+    ScryptPasswordHasher,
+    get_hashers,
+    get_hashers_by_algorithm,
+)
+from django.core.signals import setting_changed
+from django.dispatch import receiver
+
+
+def scrypt_options():
+    options = {"WORK_FACTOR": 2**14, "BLOCK_SIZE": 8, "PARALLELISM": 1}
+    options.update(getattr(settings, "ACCOUNTS_PASSWORD_HASHING", {}).get("SCRYPT", {}))
+    return options
+
+
+class TunableScryptPasswordHasher(ScryptPasswordHasher):
+    """
+    Django's memory-hard scrypt hasher with its cost taken from
+    ACCOUNTS_PASSWORD_HASHING["SCRYPT"]. Passwords hashed with other
+    parameters are rehashed on the next successful login.
+
+    The parameters are read once, so an instance can be shipped to worker
+    processes that have no settings of their own.
+    """
+
+    def __init__(self):
+        options = scrypt_options()
+        self.work_factor = options["WORK_FACTOR"]
+        self.block_size = options["BLOCK_SIZE"]
+        self.parallelism = options["PARALLELISM"]
+        # scrypt needs 128 * n * r * p bytes; leave headroom above that
+        # instead of OpenSSL's 32 MB default.
+        self.maxmem = 2 * 128 * self.work_factor * self.block_size * self.parallelism
+
+
+@receiver(setting_changed)
+def reset_hashers(*, setting, **kwargs):
+    if setting == "ACCOUNTS_PASSWORD_HASHING":
+        get_hashers.cache_clear()
+        get_hashers_by_algorithm.cache_clear()
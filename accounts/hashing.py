@@ -0,0 +1,116 @@
+import threading
+from concurrent.futures import ProcessPoolExecutor, ThreadPoolExecutor
+
+from django.conf import settings
+from django.contrib.auth.hashers import get_hasher, make_password, verify_password
+from rest_framework import status
+from rest_framework.exceptions import APIException
+
+from history.context import audit_context
+
+_pool = None
+_pool_lock = threading.Lock()
+
+
+def _bulk_options():
+    return getattr(settings, "ACCOUNTS_BULK", {})
+
+
+def get_hashing_pool():
+    global _pool
+
+    with _pool_lock:
+        if _pool is None:
+            _pool = ProcessPoolExecutor(
+                max_workers=_bulk_options().get("HASH_PROCESSES")
+            )
+    return _pool
+
+
+def _encode(hasher, password):
+    return hasher.encode(password, hasher.salt())
+
+
+def hash_passwords(passwords):
+    """
+    `make_password` for many passwords at once. Each hash is deliberately
+    slow and holds the GIL, so large batches are spread over a process pool.
+    The hasher is resolved here and shipped to the workers, which therefore
+    need no Django settings of their own.
+    """
+    hasher = get_hasher("default")
+    if len(passwords) < _bulk_options().get("PARALLEL_THRESHOLD", 4):
+        return [_encode(hasher, password) for password in passwords]
+
+    pool = get_hashing_pool()
+    return list(pool.map(_encode, [hasher] * len(passwords), passwords))
+
+
+class HashingPoolBusy(APIException):
+    status_code = status.HTTP_503_SERVICE_UNAVAILABLE
+    default_detail = "Too many sign-ins in progress, try again shortly."
+    default_code = "hashing_pool_busy"
+
+
+class HashingPool:
+    """
+    Runs password hashing on at most `workers` threads; hashlib releases the
+    GIL while hashing, so they run in parallel while request threads only
+    wait. At most `max_pending` hashes may be queued or running; beyond
+    that callers wait up to `timeout` seconds for a slot and then get
+    `HashingPoolBusy` instead of piling up.
+    """
+
+    def __init__(self, workers=4, max_pending=64, timeout=5.0):
+        self.timeout = timeout
+        self._executor = ThreadPoolExecutor(
+            max_workers=workers, thread_name_prefix="password-hashing"
+        )
+        self._slots = threading.BoundedSemaphore(max_pending)
+
+    def run(self, function, *args):
+        if not self._slots.acquire(timeout=self.timeout):
+            raise HashingPoolBusy()
+        try:
+            return self._executor.submit(function, *args).result()
+        finally:
+            self._slots.release()
+
+
+_hashing_pool = None
+
+
+def get_verification_pool():
+    global _hashing_pool
+
+    with _pool_lock:
+        if _hashing_pool is None:
+            options = getattr(settings, "ACCOUNTS_PASSWORD_HASHING", {})
+            _hashing_pool = HashingPool(
+                workers=options.get("VERIFY_WORKERS", 4),
+                max_pending=options.get("VERIFY_QUEUE", 64),
+                timeout=options.get("QUEUE_TIMEOUT", 5.0),
+            )
+    return _hashing_pool
+
+
+def check_password_pooled(user, password):
+    """
+    `user.check_password` with the hashing done on the verification pool.
+    A password stored with an outdated hasher or cost is rehashed with the
+    preferred one and saved.
+    """
+    pool = get_verification_pool()
+    valid, must_update = pool.run(verify_password, password, user.password)
+    if valid and must_update:
+        user.password = pool.run(make_password, password)
+        # Same password in a new hash, which keeps the user's sessions and
+        # isn't worth an audit entry.
+        user.remember_credentials()
+        with audit_context(None):
+            user.save(update_fields=["password"])
+    return valid
+
+
+def make_password_pooled(password):
+    return get_verification_pool().run(make_password, password)
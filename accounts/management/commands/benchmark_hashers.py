@@ -0,0 +1,85 @@
+import time
+from concurrent.futures import ThreadPoolExecutor
+
+from django.conf import settings
+from django.core.management.base import BaseCommand
+from django.utils.module_loading import import_string
+
+from accounts.hashers import TunableScryptPasswordHasher
+
+
+def _worker_counts(value):
+    return [int(count) for count in value.split(",")]
+
+
+class Command(BaseCommand):
+    help = (
+        "Time password verification for each configured hasher and report "
+        "logins/sec when verifying on 1..N worker threads."
+    )
+
+    def add_arguments(self, parser):
+        parser.add_argument(
+            "--hasher",
+            action="append",
+            dest="hashers",
+            help="Dotted path of a hasher to time; defaults to PASSWORD_HASHERS.",
+        )
+        parser.add_argument(
+            "--scrypt-work-factor",
+            action="append",
+            type=int,
+            dest="work_factors",
+            default=[],
+            help="Also time the tunable scrypt hasher with this work factor.",
+        )
+        parser.add_argument(
+            "--workers",
+            type=_worker_counts,
+            default=[1, 2, 4],
+            help="Comma separated worker counts, e.g. 1,2,4.",
+        )
+        parser.add_argument(
+            "--logins", type=int, default=20, help="Verifications per run."
+        )
+
+    def configurations(self, options):
+        for path in options["hashers"] or settings.PASSWORD_HASHERS:
+            hasher = import_string(path)()
+            yield path.rsplit(".", 1)[-1], hasher
+        for work_factor in options["work_factors"]:
+            hasher = TunableScryptPasswordHasher()
+            hasher.work_factor = work_factor
+            hasher.maxmem = 2 * 128 * work_factor * hasher.block_size
+            hasher.maxmem *= hasher.parallelism
+            yield f"TunableScryptPasswordHasher(n={work_factor})", hasher
+
+    def handle(self, *args, **options):
+        password = "benchmark-password"
+        logins = options["logins"]
+
+        for name, hasher in self.configurations(options):
+            try:
+                encoded = hasher.encode(password, hasher.salt())
+            except ValueError as error:
+                # The hasher's library (argon2-cffi, bcrypt) isn't installed.
+                self.stdout.write(f"{name}: skipped ({error})")
+                continue
+
+            start = time.perf_counter()
+            for _ in range(logins):
+                hasher.verify(password, encoded)
+            per_verify = (time.perf_counter() - start) / logins
+            self.stdout.write(f"{name}: {per_verify * 1000:.1f} ms/verify")
+
+            for workers in options["workers"]:
+                with ThreadPoolExecutor(max_workers=workers) as executor:
+                    start = time.perf_counter()
+                    for _ in executor.map(
+                        hasher.verify, [password] * logins, [encoded] * logins
+                    ):
+                        pass
+                    elapsed = time.perf_counter() - start
+                self.stdout.write(
+                    f"  {workers} worker(s): {logins / elapsed:.1f} logins/sec"
+                )
@@ -1,7 +1,28 @@
+from django.contrib.auth.models import UserManager
 from django.db import models
 
+from history.querysets import AuditedQuerySet
 
-class CustomUserManager(models.Manager):
+
+class CustomUserQuerySet(AuditedQuerySet):
+    def soft_delete(self):
+        """
+        Soft delete every matching user with a single UPDATE, audited as one
+        batch of "soft-delete" entries, and revoke their signed-in sessions.
+        """
+        from accounts.tokens import revoke_user_sessions
+
+        queryset = self.filter(soft_deleted=False)
+        revoke_user_sessions(queryset)
+        return queryset._audited_update("soft-delete", soft_deleted=True)
+
+    def restore(self):
+        return self.filter(soft_deleted=True)._audited_update(
+            "restore", soft_deleted=False
+        )
+
+
+class CustomUserManager(models.Manager.from_queryset(CustomUserQuerySet)):
     def get_by_natural_key(self, username):
         return self.get(username=username)
 
@@ -11,3 +32,7 @@ class CustomUserManager(models.Manager):
             return self.all()
 
         return self.filter(soft_deleted=False)
+
+
+class AuditedUserManager(UserManager.from_queryset(CustomUserQuerySet)):
+    pass
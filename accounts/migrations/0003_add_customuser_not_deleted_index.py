@@ -0,0 +1,21 @@
+# Generated by Django 5.0.6 on 2026-10-18 10:51
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+    dependencies = [
+        ("accounts", "0002_alter_customuser_managers"),
+        ("auth", "0012_alter_user_first_name_max_length"),
+    ]
+
+    operations = [
+        migrations.AddIndex(
+            model_name="customuser",
+            index=models.Index(
+                condition=models.Q(("soft_deleted", False)),
+                fields=["id"],
+                name="customuser_not_deleted_idx",
+            ),
+        ),
+    ]
@@ -0,0 +1,22 @@
+# Generated by Django 5.0.6 on 2026-10-18 10:55
+
+import django.db.models.manager
+from django.db import migrations
+
+import accounts.managers
+
+
+class Migration(migrations.Migration):
+    dependencies = [
+        ("accounts", "0003_add_customuser_not_deleted_index"),
+    ]
+
+    operations = [
+        migrations.AlterModelManagers(
+            name="customuser",
+            managers=[
+                ("filtered_objects", django.db.models.manager.Manager()),
+                ("objects", accounts.managers.AuditedUserManager()),
+            ],
+        ),
+    ]
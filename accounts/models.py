@@ -1,10 +1,75 @@
+from django.conf import settings
 from django.contrib.auth.models import AbstractUser
 from django.db import models
 
-from accounts.managers import CustomUserManager
+from accounts.managers import AuditedUserManager, CustomUserManager
+
+
+# Signed-in sessions are revoked when any of these change; see
+# `accounts.authentication.user_saved`.
+SESSION_FIELDS = ("password", "is_staff", "is_superuser")
 
 
 class CustomUser(AbstractUser):
     soft_deleted = models.BooleanField(default=False)
 
     filtered_objects = CustomUserManager()
+    objects = AuditedUserManager()
+
+    class Meta(AbstractUser.Meta):
+        indexes = [
+            # Non-staff readers only ever see users that are not soft deleted.
+            models.Index(
+                fields=["id"],
+                condition=models.Q(soft_deleted=False),
+                name="customuser_not_deleted_idx",
+            ),
+        ]
+
+    @classmethod
+    def from_db(cls, db, field_names, values):
+        instance = super().from_db(db, field_names, values)
+        instance.remember_credentials()
+        return instance
+
+    def remember_credentials(self):
+        """
+        Keep the loaded password and privileges, so a save can tell whether
+        it changed them.
+        """
+        deferred = self.get_deferred_fields()
+        self._credentials = {
+            name: getattr(self, name) for name in SESSION_FIELDS if name not in deferred
+        }
+
+    def credentials_changed(self, update_fields=None):
+        """
+        Whether saving `update_fields`, or every loaded field, changed the
+        password or privileges remembered. Values never remembered count as
+        changed.
+        """
+        remembered = getattr(self, "_credentials", {})
+        deferred = self.get_deferred_fields()
+        return any(
+            name not in remembered or remembered[name] != getattr(self, name)
+            for name in SESSION_FIELDS
+            if name not in deferred and (not update_fields or name in update_fields)
+        )
+
+
+class RefreshToken(models.Model):
+    """
+    A session started by signing in for signed access tokens. Only a hash of
+    the refresh token is stored; access tokens carry the session id so
+    revoking the session cuts them off too.
+    """
+
+    user = models.ForeignKey(
+        settings.AUTH_USER_MODEL,
+        related_name="refresh_tokens",
+        on_delete=models.CASCADE,
+    )
+    token_hash = models.CharField(max_length=64, unique=True)
+    created = models.DateTimeField(auto_now_add=True)
+    expires = models.DateTimeField()
+    revoked = models.DateTimeField(null=True, blank=True, db_index=True)
@@ -28,3 +28,29 @@ class CustomUserSerializer(serializers.HyperlinkedModelSerializer):
             password=validated_data["password"],
         )
         return user
+
+
+class CustomUserSnippetCountSerializer(CustomUserSerializer):
+    """
+    Renders `snippets` as the number of snippets a user owns, which needs the
+    queryset to be annotated with `snippet_count`.
+    """
+
+    snippets = serializers.IntegerField(source="snippet_count", read_only=True)
+
+
+class CustomUserBulkSerializer(CustomUserSerializer):
+    """
+    Validates one item of a bulk create. Username uniqueness is checked by
+    the view for the whole batch in one query instead of one per item.
+    """
+
+    class Meta(CustomUserSerializer.Meta):
+        extra_kwargs = {
+            "password": {"write_only": True},
+            "username": {"validators": [CustomUser.username_validator]},
+        }
+
+
+class RefreshTokenSerializer(serializers.Serializer):
+    refresh = serializers.CharField()
@@ -1,16 +1,37 @@
-from django.contrib.auth.hashers import make_password
-from django.test import TestCase
+from io import StringIO
+from unittest import mock
+
+from django.contrib.auth.hashers import identify_hasher, make_password
+from django.core.management import call_command
+from django.db import connection
+from django.test import TestCase, override_settings
+from django.test.utils import CaptureQueriesContext
 from django.urls import reverse
+from django.utils import timezone
 from rest_framework import status
+from rest_framework.authtoken.models import Token
 from rest_framework.test import APITestCase
 
+from accounts import hashing
+from accounts.authentication import get_token_cache
+from accounts.hashing import HashingPool
 from accounts.models import CustomUser
+from accounts.tokens import (
+    InvalidToken,
+    decode_access_token,
+    encode_access_token,
+    revocations,
+)
+from history.models import AuditLog
+from tutorial.responsecache import get_response_cache
 
 
 class AuthTestCaseBase(APITestCase):
     fixtures = ["accounts_users"]
 
     def setUp(self):
+        # Test rollbacks undo writes without bumping the cache generations.
+        get_response_cache().clear()
         for user in CustomUser.objects.all():
             user.password = make_password(user.password)
             user.save()
@@ -57,3 +78,253 @@ class AuthTests(AuthTestCaseBase):
     # def test_unauthenticated_user_cannot_access(self):
     #     response = self.client.get(reverse("customuser-list"))
     #     self.assertEqual(status.HTTP_401_UNAUTHORIZED, response.status_code)
+
+
+class CachedTokenAuthenticationTests(AuthTestCaseBase):
+    def setUp(self):
+        super().setUp()
+        get_token_cache().clear()
+        self.addCleanup(get_token_cache().clear)
+
+        self.token = Token.objects.create(user=self.non_staff_user)
+        self.client.credentials(HTTP_AUTHORIZATION="Token " + self.token.key)
+
+    def get_status(self):
+        return self.client.get(reverse("customuser-detail", args=[1])).status_code
+
+    def token_queries(self):
+        with CaptureQueriesContext(connection) as queries:
+            self.assertEqual(status.HTTP_200_OK, self.get_status())
+        return [q for q in queries.captured_queries if "authtoken_token" in q["sql"]]
+
+    def test_repeat_requests_skip_the_token_lookup(self):
+        self.assertEqual(1, len(self.token_queries()))
+        self.assertEqual([], self.token_queries())
+
+    def test_soft_deleted_user_is_rejected_once_cached(self):
+        self.assertEqual(status.HTTP_200_OK, self.get_status())
+
+        self.non_staff_user.soft_deleted = True
+        self.non_staff_user.save(update_fields=["soft_deleted"])
+
+        self.assertEqual(status.HTTP_401_UNAUTHORIZED, self.get_status())
+
+    def test_bulk_soft_delete_invalidates_cached_users(self):
+        self.assertEqual(status.HTTP_200_OK, self.get_status())
+
+        CustomUser.objects.filter(pk=self.non_staff_user.pk).soft_delete()
+
+        self.assertEqual(status.HTTP_401_UNAUTHORIZED, self.get_status())
+
+    def test_deactivated_user_is_rejected_once_cached(self):
+        self.assertEqual(status.HTTP_200_OK, self.get_status())
+
+        self.non_staff_user.is_active = False
+        self.non_staff_user.save()
+
+        self.assertEqual(status.HTTP_401_UNAUTHORIZED, self.get_status())
+
+    def test_rotated_token_stops_working(self):
+        self.assertEqual(status.HTTP_200_OK, self.get_status())
+
+        self.token.delete()
+        Token.objects.create(user=self.non_staff_user)
+
+        self.assertEqual(status.HTTP_401_UNAUTHORIZED, self.get_status())
+
+
+class SignedTokenTests(AuthTestCaseBase):
+    def setUp(self):
+        super().setUp()
+        revocations.clear()
+        self.addCleanup(revocations.clear)
+
+    def obtain(self, username="regular-schmo", password="password1234!"):
+        response = self.client.post(
+            reverse("api-token-access"), {"username": username, "password": password}
+        )
+        self.assertEqual(status.HTTP_200_OK, response.status_code)
+        return response.data
+
+    def get_status(self, access):
+        self.client.credentials(HTTP_AUTHORIZATION="Bearer " + access)
+        response = self.client.get(reverse("customuser-list"), {"include_all": "true"})
+        return response.status_code
+
+    def test_access_token_is_checked_without_queries(self):
+        access = self.obtain()["access"]
+        self.assertEqual(status.HTTP_200_OK, self.get_status(access))
+
+        self.client.credentials(HTTP_AUTHORIZATION="Bearer " + access)
+        with CaptureQueriesContext(connection) as queries:
+            response = self.client.get("/")
+
+        self.assertEqual(status.HTTP_200_OK, response.status_code)
+        self.assertEqual([], queries.captured_queries)
+
+    def test_claims_carry_staff_status(self):
+        access = self.obtain("rubindamian-staff")["access"]
+        self.client.credentials(HTTP_AUTHORIZATION="Bearer " + access)
+
+        response = self.client.get(reverse("customuser-list"), {"include_all": "true"})
+
+        self.assertEqual(4, response.data["count"])
+
+    def test_tampered_and_expired_tokens_are_rejected(self):
+        access = encode_access_token(self.non_staff_user, 1, now=0)
+        with self.assertRaises(InvalidToken):
+            decode_access_token(access)
+        self.assertEqual(status.HTTP_401_UNAUTHORIZED, self.get_status(access))
+
+        header, payload, signature = self.obtain()["access"].split(".")
+        forged = encode_access_token(self.staff_user, 1).split(".")[1]
+        self.assertEqual(
+            status.HTTP_401_UNAUTHORIZED,
+            self.get_status(f"{header}.{forged}.{signature}"),
+        )
+
+    def test_refresh_rotates_the_refresh_token(self):
+        tokens = self.obtain()
+
+        response = self.client.post(
+            reverse("api-token-refresh"), {"refresh": tokens["refresh"]}
+        )
+
+        self.assertEqual(status.HTTP_200_OK, response.status_code)
+        self.assertEqual(status.HTTP_200_OK, self.get_status(response.data["access"]))
+        self.client.credentials()
+        response = self.client.post(
+            reverse("api-token-refresh"), {"refresh": tokens["refresh"]}
+        )
+        self.assertEqual(status.HTTP_401_UNAUTHORIZED, response.status_code)
+
+    def test_revoked_session_loses_access(self):
+        tokens = self.obtain()
+
+        response = self.client.post(
+            reverse("api-token-revoke"), {"refresh": tokens["refresh"]}
+        )
+
+        self.assertEqual(status.HTTP_204_NO_CONTENT, response.status_code)
+        self.assertEqual(
+            status.HTTP_401_UNAUTHORIZED, self.get_status(tokens["access"])
+        )
+
+    def test_soft_delete_revokes_access_promptly(self):
+        tokens = self.obtain()
+        self.client.force_authenticate(user=self.staff_user)
+        response = self.client.delete(
+            reverse("customuser-delete", args=[self.non_staff_user.pk])
+        )
+        self.assertEqual(status.HTTP_200_OK, response.status_code)
+        self.client.force_authenticate(user=None)
+
+        self.assertEqual(
+            status.HTTP_401_UNAUTHORIZED, self.get_status(tokens["access"])
+        )
+        response = self.client.post(
+            reverse("api-token-refresh"), {"refresh": tokens["refresh"]}
+        )
+        self.assertEqual(status.HTTP_401_UNAUTHORIZED, response.status_code)
+
+    def test_password_and_privilege_changes_revoke_access(self):
+        # The password goes last, since every round signs in with it.
+        changes = [
+            ("is_staff", True),
+            ("is_superuser", True),
+            ("password", make_password("another password")),
+        ]
+        for field, value in changes:
+            with self.subTest(field=field):
+                self.client.credentials()
+                tokens = self.obtain()
+                user = CustomUser.objects.get(pk=self.non_staff_user.pk)
+                setattr(user, field, value)
+                user.save()
+
+                self.assertEqual(
+                    status.HTTP_401_UNAUTHORIZED, self.get_status(tokens["access"])
+                )
+
+    def test_other_changes_and_rehashes_keep_access(self):
+        tokens = self.obtain()
+        CustomUser.objects.filter(pk=self.non_staff_user.pk).update(
+            password=make_password("password1234!", hasher="pbkdf2_sha256")
+        )
+        # Signing in again upgrades the outdated hash.
+        self.obtain()
+        user = CustomUser.objects.get(pk=self.non_staff_user.pk)
+        self.assertEqual("scrypt", identify_hasher(user.password).algorithm)
+        user.email = "renamed@example.com"
+        user.save()
+
+        self.assertEqual(status.HTTP_200_OK, self.get_status(tokens["access"]))
+
+    @override_settings(ACCOUNTS_SIGNED_TOKENS={"REVOCATION_SYNC_INTERVAL": 0})
+    def test_revocations_from_other_processes_are_synced(self):
+        tokens = self.obtain()
+        CustomUser.objects.get(pk=self.non_staff_user.pk).refresh_tokens.update(
+            revoked=timezone.now()
+        )
+
+        self.assertEqual(
+            status.HTTP_401_UNAUTHORIZED, self.get_status(tokens["access"])
+        )
+
+
+class PasswordHashingTests(AuthTestCaseBase):
+    def test_login_upgrades_outdated_hashes(self):
+        self.active_user.password = make_password("password", hasher="pbkdf2_sha256")
+        self.active_user.save()
+
+        with self.captureOnCommitCallbacks(execute=True):
+            response = self.client.post(
+                reverse("api-token-auth"),
+                {"username": self.active_user.username, "password": "password"},
+            )
+
+        self.assertEqual(status.HTTP_200_OK, response.status_code)
+        self.active_user.refresh_from_db()
+        self.assertEqual("scrypt", identify_hasher(self.active_user.password).algorithm)
+        self.assertTrue(self.active_user.check_password("password"))
+        self.assertFalse(AuditLog.objects.exists())
+
+    def test_wrong_password_is_rejected(self):
+        response = self.client.post(
+            reverse("api-token-auth"),
+            {"username": self.active_user.username, "password": "wrong"},
+        )
+        self.assertEqual(status.HTTP_400_BAD_REQUEST, response.status_code)
+
+    def test_full_pool_is_reported_by_the_api(self):
+        with mock.patch.object(hashing, "_hashing_pool", HashingPool(1, 0, 0)):
+            response = self.client.post(
+                reverse("api-token-auth"),
+                {"username": self.active_user.username, "password": "password"},
+            )
+
+        self.assertEqual(status.HTTP_503_SERVICE_UNAVAILABLE, response.status_code)
+
+    def test_full_pool_fails_django_logins_cleanly(self):
+        with mock.patch.object(hashing, "_hashing_pool", HashingPool(1, 0, 0)):
+            response = self.client.post(
+                reverse("admin:login"),
+                {"username": self.staff_user.username, "password": "password1234!"},
+            )
+
+        self.assertEqual(status.HTTP_200_OK, response.status_code)
+        self.assertTrue(response.context["form"].errors)
+
+    def test_benchmark_command_reports_each_hasher(self):
+        out = StringIO()
+        call_command(
+            "benchmark_hashers",
+            "--hasher=django.contrib.auth.hashers.MD5PasswordHasher",
+            "--scrypt-work-factor=1024",
+            "--workers=1,2",
+            "--logins=2",
+            stdout=out,
+        )
+        self.assertIn("MD5PasswordHasher", out.getvalue())
+        self.assertIn("TunableScryptPasswordHasher(n=1024)", out.getvalue())
+        self.assertEqual(4, out.getvalue().count("logins/sec"))
@@ -1,16 +1,26 @@
+import json
+
 from django.contrib.auth.hashers import make_password
-from django.test import TestCase
+from django.db import connection
+from django.test import TestCase, override_settings
+from django.test.utils import CaptureQueriesContext
 from django.urls import reverse
 from rest_framework import status
 from rest_framework.test import APITestCase
 
+from accounts.hashing import hash_passwords
 from accounts.models import CustomUser
+from history.models import AuditLog
+from snippets.models import Snippet
+from tutorial.responsecache import get_response_cache
 
 
 class CustomUserTestCaseBase(APITestCase):
     fixtures = ["accounts_users"]
 
     def setUp(self):
+        # Test rollbacks undo writes without bumping the cache generations.
+        get_response_cache().clear()
         for user in CustomUser.objects.all():
             user.password = make_password(user.password)
             user.save()
@@ -44,6 +54,96 @@ class CustomUserListViewTests(CustomUserTestCaseBase):
         response = self.client.get(reverse("customuser-list"))
         self.assertEqual(status.HTTP_401_UNAUTHORIZED, response.status_code)
 
+    def test_list_loads_only_rendered_columns(self):
+        self.client.force_authenticate(user=self.staff_user)
+        with CaptureQueriesContext(connection) as queries:
+            response = self.client.get(
+                reverse("customuser-list"), {"include_all": "true"}
+            )
+
+        self.assertEqual(status.HTTP_200_OK, response.status_code)
+        for query in queries.captured_queries:
+            self.assertNotIn('"password"', query["sql"])
+            self.assertNotIn('"code"', query["sql"])
+
+    def test_snippet_links_are_loaded_in_one_query_per_page(self):
+        for user in CustomUser.objects.all():
+            for _ in range(3):
+                Snippet.objects.create(owner=user, code="pass")
+        self.client.force_authenticate(user=self.staff_user)
+
+        # Page count, users and every user's snippet ids.
+        with self.assertNumQueries(3):
+            response = self.client.get(
+                reverse("customuser-list"), {"include_all": "true"}
+            )
+
+        self.assertEqual(status.HTTP_200_OK, response.status_code)
+        for user in response.data["results"]:
+            self.assertEqual(3, len(user["snippets"]))
+
+    def test_users_can_be_paged_with_cursor(self):
+        self.client.force_authenticate(user=self.staff_user)
+
+        response = self.client.get(
+            reverse("customuser-list"),
+            {"include_all": "true", "pagination": "cursor", "page_size": 3},
+        )
+        self.assertEqual(status.HTTP_200_OK, response.status_code)
+        self.assertEqual([1, 2, 3], [user["id"] for user in response.data["results"]])
+
+        response = self.client.get(response.data["next"])
+        self.assertEqual([4], [user["id"] for user in response.data["results"]])
+        self.assertIsNone(response.data["next"])
+
+    def test_snippets_can_be_rendered_as_count(self):
+        Snippet.objects.create(owner=self.non_staff_user, code="pass")
+        self.client.force_authenticate(user=self.staff_user)
+
+        response = self.client.get(
+            reverse("customuser-list"), {"include_all": "true", "snippets": "count"}
+        )
+
+        self.assertEqual(status.HTTP_200_OK, response.status_code)
+        counts = {user["id"]: user["snippets"] for user in response.data["results"]}
+        self.assertEqual({1: 0, 2: 1, 3: 0, 4: 0}, counts)
+
+
+class CustomUserListCacheTests(CustomUserTestCaseBase):
+    def test_repeat_requests_are_served_from_cache(self):
+        self.client.force_authenticate(user=self.non_staff_user)
+        first = self.client.get(reverse("customuser-list"))
+
+        with self.assertNumQueries(0):
+            second = self.client.get(reverse("customuser-list"))
+
+        self.assertEqual(status.HTTP_200_OK, second.status_code)
+        self.assertEqual(first.content, second.content)
+
+    def test_soft_deleted_users_are_not_served_to_non_staff(self):
+        self.client.force_authenticate(user=self.staff_user)
+        response = self.client.get(reverse("customuser-list"), {"include_all": "true"})
+        self.assertEqual(4, response.data["count"])
+
+        # Same query string, but not allowed to see everyone.
+        self.client.force_authenticate(user=self.non_staff_user)
+        response = self.client.get(reverse("customuser-list"), {"include_all": "true"})
+        self.assertEqual(3, json.loads(response.content)["count"])
+
+        with self.captureOnCommitCallbacks(execute=True):
+            CustomUser.objects.filter(pk=self.active_user.pk).soft_delete()
+        response = self.client.get(reverse("customuser-list"), {"include_all": "true"})
+        self.assertEqual(2, json.loads(response.content)["count"])
+
+    def test_logins_keep_the_cache(self):
+        self.client.force_authenticate(user=self.non_staff_user)
+        self.client.get(reverse("customuser-list"))
+        self.client.login(username="rubindamian-staff", password="password1234!")
+
+        self.client.force_authenticate(user=self.non_staff_user)
+        with self.assertNumQueries(0):
+            self.client.get(reverse("customuser-list"))
+
 
 class CustomUserDetailViewTests(CustomUserTestCaseBase):
     def test_staff_user_can_see_user(self):
@@ -52,6 +152,15 @@ class CustomUserDetailViewTests(CustomUserTestCaseBase):
         self.assertEqual(status.HTTP_200_OK, response.status_code)
         self.assertEqual(2, response.data["id"])
 
+    def test_detail_snippets_can_be_rendered_as_count(self):
+        Snippet.objects.create(owner=self.active_user, code="pass")
+        self.client.force_authenticate(user=self.staff_user)
+        response = self.client.get(
+            reverse("customuser-detail", kwargs={"pk": 3}), {"snippets": "count"}
+        )
+        self.assertEqual(status.HTTP_200_OK, response.status_code)
+        self.assertEqual(1, response.data["snippets"])
+
     def test_non_staff_user_can_see_active_users(self):
         self.client.force_authenticate(user=self.non_staff_user)
 
@@ -142,3 +251,133 @@ class CustomUserDeleteViewTests(CustomUserTestCaseBase):
         self.assertEqual(status.HTTP_200_OK, response.status_code)
         self.assertEqual(3, response.data["id"])
         self.assertEqual("User successfully soft deleted", response.data["message"])
+
+
+class CustomUserBulkCreateViewTests(CustomUserTestCaseBase):
+    def test_staff_user_can_create_users_in_bulk(self):
+        self.client.force_authenticate(user=self.staff_user)
+        with self.captureOnCommitCallbacks(execute=True):
+            response = self.client.post(
+                reverse("customuser-bulk-create"),
+                [
+                    {
+                        "username": "new-one",
+                        "email": "one@EXAMPLE.com",
+                        "password": "pw1",
+                    },
+                    {
+                        "username": "new-two",
+                        "email": "two@example.com",
+                        "password": "pw2",
+                    },
+                ],
+                format="json",
+            )
+
+        self.assertEqual(status.HTTP_201_CREATED, response.status_code)
+        self.assertEqual(["new-one", "new-two"], [u["username"] for u in response.data])
+        one = CustomUser.objects.get(username="new-one")
+        self.assertEqual("one@example.com", one.email)
+        self.assertTrue(one.check_password("pw1"))
+        self.assertEqual(
+            2, AuditLog.objects.filter(model_name="CustomUser", action="create").count()
+        )
+
+    def test_errors_are_reported_per_item(self):
+        self.client.force_authenticate(user=self.staff_user)
+        response = self.client.post(
+            reverse("customuser-bulk-create"),
+            [
+                {"username": "fresh", "password": "pw"},
+                {"username": "regular-schmo", "password": "pw"},
+                {"username": "twice", "password": "pw"},
+                {"username": "twice", "password": "pw"},
+                {"username": "no-password"},
+            ],
+            format="json",
+        )
+
+        self.assertEqual(status.HTTP_400_BAD_REQUEST, response.status_code)
+        self.assertEqual({}, response.data[0])
+        self.assertIn("username", response.data[1])
+        self.assertEqual({}, response.data[2])
+        self.assertIn("username", response.data[3])
+        self.assertIn("password", response.data[4])
+        self.assertFalse(CustomUser.objects.filter(username="fresh").exists())
+
+    def test_non_staff_user_cannot_create_users_in_bulk(self):
+        self.client.force_authenticate(user=self.non_staff_user)
+        response = self.client.post(
+            reverse("customuser-bulk-create"),
+            [{"username": "new-one", "password": "pw"}],
+            format="json",
+        )
+        self.assertEqual(status.HTTP_403_FORBIDDEN, response.status_code)
+
+
+class HashPasswordsTests(TestCase):
+    @override_settings(ACCOUNTS_BULK={"PARALLEL_THRESHOLD": 2, "HASH_PROCESSES": 2})
+    def test_passwords_are_hashed_in_worker_processes(self):
+        encoded = hash_passwords(["first", "second"])
+
+        user = CustomUser(username="check")
+        user.password = encoded[1]
+        self.assertTrue(user.check_password("second"))
+        self.assertNotEqual(encoded[0], encoded[1])
+
+
+class CustomUserBulkSoftDeleteViewTests(CustomUserTestCaseBase):
+    def test_staff_user_can_soft_delete_and_restore_in_bulk(self):
+        self.client.force_authenticate(user=self.staff_user)
+        ids = [self.non_staff_user.pk, self.active_user.pk]
+
+        with CaptureQueriesContext(connection) as queries:
+            with self.captureOnCommitCallbacks(execute=True):
+                response = self.client.post(
+                    reverse("customuser-bulk-delete"), {"ids": ids}, format="json"
+                )
+
+        self.assertEqual(status.HTTP_200_OK, response.status_code)
+        self.assertEqual(2, response.data["updated"])
+        self.assertEqual(
+            1,
+            sum(q["sql"].startswith("UPDATE") for q in queries.captured_queries),
+        )
+        self.assertEqual(3, CustomUser.objects.filter(soft_deleted=True).count())
+        self.assertEqual(
+            set(ids),
+            set(
+                AuditLog.objects.filter(action="soft-delete").values_list(
+                    "object_id", flat=True
+                )
+            ),
+        )
+
+        with self.captureOnCommitCallbacks(execute=True):
+            response = self.client.post(
+                reverse("customuser-bulk-restore"), {"ids": ids}, format="json"
+            )
+
+        self.assertEqual(status.HTTP_200_OK, response.status_code)
+        self.assertEqual(1, CustomUser.objects.filter(soft_deleted=True).count())
+        self.assertEqual(2, AuditLog.objects.filter(action="restore").count())
+
+    def test_unknown_ids_fail_the_request(self):
+        self.client.force_authenticate(user=self.staff_user)
+        response = self.client.post(
+            reverse("customuser-bulk-delete"),
+            {"ids": [self.active_user.pk, 999]},
+            format="json",
+        )
+
+        self.assertEqual(status.HTTP_400_BAD_REQUEST, response.status_code)
+        self.assertFalse(CustomUser.objects.get(pk=self.active_user.pk).soft_deleted)
+
+    def test_non_staff_user_cannot_soft_delete_in_bulk(self):
+        self.client.force_authenticate(user=self.non_staff_user)
+        response = self.client.post(
+            reverse("customuser-bulk-delete"),
+            {"ids": [self.active_user.pk]},
+            format="json",
+        )
+        self.assertEqual(status.HTTP_403_FORBIDDEN, response.status_code)
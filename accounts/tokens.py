@@ -0,0 +1,250 @@
+import base64
+import hashlib
+import json
+import secrets
+import threading
+import time
+from datetime import timedelta
+
+from django.conf import settings
+from django.utils import timezone
+from django.utils.crypto import constant_time_compare, salted_hmac
+
+from accounts.models import CustomUser, RefreshToken
+
+ACCESS_TOKEN_HEADER = {"alg": "HS256", "typ": "JWT"}
+
+# Claims copied onto the user built for a request; anything else on the
+# user is loaded from the database only if a view reads it.
+USER_CLAIMS = {
+    "sub": "id",
+    "username": "username",
+    "staff": "is_staff",
+    "superuser": "is_superuser",
+}
+
+
+class InvalidToken(Exception):
+    pass
+
+
+def token_options():
+    options = {
+        "ACCESS_TTL": 5 * 60,
+        "REFRESH_TTL": 14 * 24 * 60 * 60,
+        "REVOCATION_SYNC_INTERVAL": 10,
+    }
+    options.update(getattr(settings, "ACCOUNTS_SIGNED_TOKENS", {}))
+    return options
+
+
+def _b64encode(data):
+    return base64.urlsafe_b64encode(data).rstrip(b"=").decode("ascii")
+
+
+def _b64decode(data):
+    return base64.urlsafe_b64decode(data + "=" * (-len(data) % 4))
+
+
+def _signature(signing_input):
+    return salted_hmac(
+        "accounts.tokens.access", signing_input, algorithm="sha256"
+    ).digest()
+
+
+def encode_access_token(user, session_id, now=None):
+    """
+    A JWT-style access token (HS256 over SECRET_KEY) carrying everything
+    needed to authenticate `user` without touching the database.
+    """
+    issued = int(now if now is not None else time.time())
+    payload = {claim: getattr(user, field) for claim, field in USER_CLAIMS.items()}
+    payload.update(
+        sid=session_id, iat=issued, exp=issued + token_options()["ACCESS_TTL"]
+    )
+
+    signing_input = ".".join(
+        _b64encode(json.dumps(part, separators=(",", ":")).encode())
+        for part in (ACCESS_TOKEN_HEADER, payload)
+    )
+    return f"{signing_input}.{_b64encode(_signature(signing_input))}"
+
+
+def decode_access_token(token, now=None):
+    """
+    The claims of a valid, unexpired access token; raises InvalidToken
+    otherwise.
+    """
+    try:
+        signing_input, signature = token.rsplit(".", 1)
+        header, payload = signing_input.split(".")
+        expected = _b64encode(_signature(signing_input))
+        if not constant_time_compare(signature, expected):
+            raise InvalidToken("Bad signature.")
+        if json.loads(_b64decode(header)) != ACCESS_TOKEN_HEADER:
+            raise InvalidToken("Unsupported token type.")
+        claims = json.loads(_b64decode(payload))
+        expired = claims["exp"] <= (now if now is not None else time.time())
+    except (ValueError, TypeError, KeyError) as error:
+        raise InvalidToken("Malformed token.") from error
+
+    if expired:
+        raise InvalidToken("Token has expired.")
+    return claims
+
+
+def user_from_claims(claims):
+    known = {field: claims[claim] for claim, field in USER_CLAIMS.items()}
+    known.update(is_active=True, soft_deleted=False)
+    # `from_db` takes the loaded values in model field order.
+    fields = [
+        field.attname
+        for field in CustomUser._meta.concrete_fields
+        if field.attname in known
+    ]
+    return CustomUser.from_db(None, fields, [known[name] for name in fields])
+
+
+class RevocationList:
+    """
+    Sessions revoked within the last access token lifetime, held in memory so
+    checking a token costs no query. Revocations made by this process apply
+    at once; those made elsewhere are picked up by re-reading the recently
+    revoked sessions every REVOCATION_SYNC_INTERVAL seconds.
+    """
+
+    def __init__(self):
+        self._revoked = {}
+        self._synced = None
+        self._lock = threading.Lock()
+
+    def revoke(self, session_ids):
+        now = time.monotonic()
+        with self._lock:
+            for session_id in session_ids:
+                self._revoked[session_id] = now
+
+    def is_revoked(self, session_id):
+        options = token_options()
+        interval = options["REVOCATION_SYNC_INTERVAL"]
+        if interval is not None and (
+            self._synced is None or time.monotonic() - self._synced >= interval
+        ):
+            self.sync()
+
+        with self._lock:
+            return session_id in self._revoked
+
+    def sync(self):
+        ttl = token_options()["ACCESS_TTL"]
+        cutoff = timezone.now() - timedelta(seconds=ttl)
+        revoked = RefreshToken.objects.filter(revoked__gte=cutoff).values_list(
+            "pk", flat=True
+        )
+
+        now = time.monotonic()
+        with self._lock:
+            # Access tokens from sessions revoked longer ago have expired.
+            self._revoked = {
+                session_id: at
+                for session_id, at in self._revoked.items()
+                if now - at < ttl
+            }
+            for session_id in revoked:
+                self._revoked.setdefault(session_id, now)
+            self._synced = now
+
+    def clear(self):
+        with self._lock:
+            self._revoked.clear()
+            self._synced = None
+
+
+revocations = RevocationList()
+
+
+def _hash(refresh_token):
+    return hashlib.sha256(refresh_token.encode()).hexdigest()
+
+
+def issue_tokens(user):
+    """
+    Start a session for `user`: a refresh token, of which only a hash is
+    stored, and a first access token.
+    """
+    refresh_token = secrets.token_urlsafe(32)
+    session = RefreshToken.objects.create(
+        user=user,
+        token_hash=_hash(refresh_token),
+        expires=timezone.now() + timedelta(seconds=token_options()["REFRESH_TTL"]),
+    )
+    return _token_response(user, session, refresh_token)
+
+
+def _token_response(user, session, refresh_token):
+    return {
+        "access": encode_access_token(user, session.pk),
+        "refresh": refresh_token,
+        "token_type": "Bearer",
+        "expires_in": token_options()["ACCESS_TTL"],
+    }
+
+
+def refresh_tokens(refresh_token):
+    """
+    Exchange a refresh token for a new access token and a new refresh token;
+    the old refresh token stops working.
+    """
+    session = (
+        RefreshToken.objects.select_related("user")
+        .filter(token_hash=_hash(refresh_token), revoked__isnull=True)
+        .first()
+    )
+    user = session.user if session is not None else None
+    if (
+        session is None
+        or session.expires <= timezone.now()
+        or not user.is_active
+        or user.soft_deleted
+    ):
+        raise InvalidToken("Invalid or expired refresh token.")
+
+    new_refresh_token = secrets.token_urlsafe(32)
+    rotated = RefreshToken.objects.filter(
+        pk=session.pk, token_hash=session.token_hash, revoked__isnull=True
+    ).update(
+        token_hash=_hash(new_refresh_token),
+        expires=timezone.now() + timedelta(seconds=token_options()["REFRESH_TTL"]),
+    )
+    if not rotated:
+        # Another request rotated or revoked it first.
+        raise InvalidToken("Invalid or expired refresh token.")
+    return _token_response(user, session, new_refresh_token)
+
+
+def revoke_refresh_token(refresh_token):
+    sessions = RefreshToken.objects.filter(
+        token_hash=_hash(refresh_token), revoked__isnull=True
+    )
+    revoke_sessions(sessions)
+
+
+def revoke_sessions(sessions):
+    """
+    Revoke every open session in the `RefreshToken` queryset, along with the
+    access tokens issued from them.
+    """
+    session_ids = list(
+        sessions.filter(revoked__isnull=True).values_list("pk", flat=True)
+    )
+    if session_ids:
+        RefreshToken.objects.filter(pk__in=session_ids).update(revoked=timezone.now())
+        revocations.revoke(session_ids)
+    return len(session_ids)
+
+
+def revoke_user_sessions(users):
+    """
+    Revoke every session of the users in `users`, a queryset or a list of ids.
+    """
+    return revoke_sessions(RefreshToken.objects.filter(user__in=users))
@@ -11,6 +11,21 @@ urlpatterns = [
     path(
         "create-user/", views.CustomUserCreateView.as_view(), name="customuser-create"
     ),
+    path(
+        "bulk-create-users/",
+        views.CustomUserBulkCreateView.as_view(),
+        name="customuser-bulk-create",
+    ),
+    path(
+        "bulk-delete-users/",
+        views.CustomUserBulkSoftDeleteView.as_view(),
+        name="customuser-bulk-delete",
+    ),
+    path(
+        "bulk-restore-users/",
+        views.CustomUserBulkRestoreView.as_view(),
+        name="customuser-bulk-restore",
+    ),
     path(
         "update-user/<int:pk>/",
         views.CustomUserUpdateView.as_view(),
@@ -22,6 +37,21 @@ urlpatterns = [
         name="customuser-delete",
     ),
     path("token/", obtain_auth_token, name="api-token-auth"),
+    path(
+        "token/access/",
+        views.SignedTokenObtainView.as_view(),
+        name="api-token-access",
+    ),
+    path(
+        "token/refresh/",
+        views.SignedTokenRefreshView.as_view(),
+        name="api-token-refresh",
+    ),
+    path(
+        "token/revoke/",
+        views.SignedTokenRevokeView.as_view(),
+        name="api-token-revoke",
+    ),
     path("login/", auth_views.LoginView.as_view(), name="login"),
     path("logout/", auth_views.LogoutView.as_view(), name="logout"),
 ]
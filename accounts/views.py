@@ -1,26 +1,84 @@
-from django.apps import apps
+from django.conf import settings
 from django.contrib.auth import get_user_model
-from rest_framework import generics, status
-from rest_framework.permissions import IsAdminUser, IsAuthenticated
+from django.db import transaction
+from django.db.models import Count, prefetch_related_objects
+from rest_framework import exceptions, generics, status
+from rest_framework.authtoken.serializers import AuthTokenSerializer
+from rest_framework.exceptions import ValidationError
+from rest_framework.permissions import AllowAny, IsAdminUser, IsAuthenticated
 from rest_framework.response import Response
+from rest_framework.views import APIView
 
+from accounts.hashing import hash_passwords
 from accounts.models import CustomUser
-from accounts.serializers import CustomUserSerializer
+from accounts.serializers import (
+    CustomUserBulkSerializer,
+    CustomUserSerializer,
+    CustomUserSnippetCountSerializer,
+    RefreshTokenSerializer,
+)
+from accounts.tokens import (
+    InvalidToken,
+    issue_tokens,
+    refresh_tokens,
+    revoke_refresh_token,
+)
+from tutorial.bulk import check_item_list
+from tutorial.pagination import CursorPaginationMixin
+from tutorial.queryshaping import ShapedQuerysetMixin
+from tutorial.responsecache import CachedResponseMixin
 
 User = get_user_model()
 
 
-class CustomUserListView(generics.ListAPIView):
+def bulk_max_items():
+    return getattr(settings, "ACCOUNTS_BULK", {}).get("MAX_ITEMS", 1000)
+
+
+class SnippetCountMixin:
+    """
+    `?snippets=count` replaces the list of snippet links with a count, for
+    users who own more snippets than is useful to link individually.
+    """
+
+    def snippets_as_count(self):
+        return self.request.query_params.get("snippets", "").lower() == "count"
+
+    def get_serializer_class(self):
+        if self.snippets_as_count():
+            return CustomUserSnippetCountSerializer
+        return super().get_serializer_class()
+
+    def filter_queryset(self, queryset):
+        if self.snippets_as_count():
+            queryset = queryset.annotate(snippet_count=Count("snippets"))
+        return super().filter_queryset(queryset)
+
+
+class CustomUserListView(
+    CachedResponseMixin,
+    CursorPaginationMixin,
+    SnippetCountMixin,
+    ShapedQuerysetMixin,
+    generics.ListAPIView,
+):
     serializer_class = CustomUserSerializer
     permission_classes = [IsAuthenticated]
+    cursor_ordering = ("id",)
+    cache_scopes = ("users", "snippets")
 
-    def get_queryset(self):
-        include_all = (
-            self.request.query_params.get("include_all", "false").lower() == "true"
-        )
+    def include_all(self):
+        return self.request.query_params.get("include_all", "false").lower() == "true"
+
+    def get_cache_visibility(self):
+        # Only staff asking for everyone may see soft deleted users.
+        if self.request.user.is_staff and self.include_all():
+            return "all-users"
+        return "active-users"
 
+    def get_queryset(self):
         return CustomUser.filtered_objects.specific_to_user(
-            self.request.user, include_all
+            self.request.user, self.include_all()
         )
 
 
@@ -29,19 +87,73 @@ class CustomUserCreateView(generics.CreateAPIView):
     serializer_class = CustomUserSerializer
     permission_classes = [IsAdminUser]
 
-    def perform_create(self, serializer):
-        audit_log_model = apps.get_model("history", "AuditLog")
-        user = serializer.save()
 
-        audit_log_model.objects.create(
-            action="create",
-            user=self.request.user,
-            model_name=user.__class__.__name__,
-            object_id=user.id,
+class CustomUserBulkCreateView(generics.GenericAPIView):
+    """
+    Create a list of users in one transaction, hashing their passwords in
+    parallel. Nothing is created unless every item is valid; errors are
+    listed per item.
+    """
+
+    queryset = CustomUser.objects.all()
+    serializer_class = CustomUserBulkSerializer
+    permission_classes = [IsAdminUser]
+
+    def post(self, request, *args, **kwargs):
+        check_item_list(request.data, bulk_max_items())
+        serializer = self.get_serializer(data=request.data, many=True)
+        valid = serializer.is_valid()
+        errors = [dict(error) for error in serializer.errors] if not valid else None
+        items = serializer.validated_data if valid else []
+
+        usernames = [
+            item.get("username") if isinstance(item, dict) else None
+            for item in request.data
+        ]
+        usernames = [
+            CustomUser.normalize_username(username.strip())
+            if isinstance(username, str)
+            else ""
+            for username in usernames
+        ]
+        taken = set(
+            CustomUser.objects.filter(username__in=usernames).values_list(
+                "username", flat=True
+            )
         )
+        seen = set()
+        for position, username in enumerate(usernames):
+            if username and (username in taken or username in seen):
+                errors = errors or [{} for _ in usernames]
+                errors[position]["username"] = [
+                    "A user with that username already exists."
+                ]
+            seen.add(username)
+        if errors:
+            raise ValidationError(errors)
 
+        passwords = hash_passwords([item["password"] for item in items])
+        users = [
+            CustomUser(
+                username=CustomUser.normalize_username(item["username"]),
+                email=CustomUser.objects.normalize_email(item.get("email", "")),
+                password=password,
+            )
+            for item, password in zip(items, passwords)
+        ]
+        with transaction.atomic():
+            CustomUser.objects.bulk_create(users)
+        prefetch_related_objects(users, "snippets")
 
-class CustomUserDetailView(generics.RetrieveAPIView):
+        data = CustomUserSerializer(
+            users, many=True, context=self.get_serializer_context()
+        ).data
+        return Response(data, status=status.HTTP_201_CREATED)
+
+
+class CustomUserDetailView(
+    SnippetCountMixin, ShapedQuerysetMixin, generics.RetrieveAPIView
+):
     serializer_class = CustomUserSerializer
     lookup_field = "pk"
     permission_classes = [IsAuthenticated]
@@ -55,17 +167,6 @@ class CustomUserUpdateView(generics.UpdateAPIView):
     serializer_class = CustomUserSerializer
     permission_classes = [IsAdminUser]
 
-    def perform_update(self, serializer):
-        user = serializer.save()
-
-        audit_log_model = apps.get_model("history", "AuditLog")
-        audit_log_model.objects.create(
-            action="update",
-            user=self.request.user,
-            model_name=user.__class__.__name__,
-            object_id=user.id,
-        )
-
 
 class CustomUserDeleteView(generics.DestroyAPIView):
     queryset = CustomUser.objects.all()
@@ -73,15 +174,8 @@ class CustomUserDeleteView(generics.DestroyAPIView):
     permission_classes = [IsAdminUser]
 
     def perform_destroy(self, instance):
-        audit_log_model = apps.get_model("history", "AuditLog")
-        audit_log_model.objects.create(
-            action="soft-delete",
-            user=self.request.user,
-            model_name=instance.__class__.__name__,
-            object_id=instance.id,
-        )
         instance.soft_deleted = True
-        instance.save()
+        instance.save(update_fields=["soft_deleted"])
 
     def destroy(self, request, *args, **kwargs):
         # Perform the deletion
@@ -96,3 +190,99 @@ class CustomUserDeleteView(generics.DestroyAPIView):
             },
             status=status.HTTP_200_OK,
         )
+
+
+class CustomUserBulkSoftDeleteView(generics.GenericAPIView):
+    """
+    Soft delete the users listed in `{"ids": [...]}` with a single UPDATE.
+    Unknown ids fail the whole request.
+    """
+
+    queryset = CustomUser.objects.all()
+    permission_classes = [IsAdminUser]
+    operation = "soft_delete"
+    message = "Users successfully soft deleted"
+
+    def post(self, request, *args, **kwargs):
+        ids = request.data.get("ids") if isinstance(request.data, dict) else None
+        check_item_list(ids, bulk_max_items())
+        if not all(type(user_id) is int for user_id in ids):
+            raise ValidationError({"ids": ["Expected a list of integer ids."]})
+
+        queryset = self.get_queryset().filter(pk__in=ids)
+        unknown = set(ids) - set(queryset.values_list("pk", flat=True))
+        if unknown:
+            raise ValidationError(
+                {"ids": [f"Unknown user ids: {', '.join(map(str, sorted(unknown)))}."]}
+            )
+
+        with transaction.atomic():
+            updated = getattr(queryset, self.operation)()
+
+        return Response(
+            {"message": self.message, "ids": ids, "updated": updated},
+            status=status.HTTP_200_OK,
+        )
+
+
+class CustomUserBulkRestoreView(CustomUserBulkSoftDeleteView):
+    """
+    Undo soft deletes for the users listed in `{"ids": [...]}`.
+    """
+
+    operation = "restore"
+    message = "Users successfully restored"
+
+
+class SignedTokenObtainView(APIView):
+    """
+    Exchange a username and password for a short-lived signed access token
+    and a refresh token. Send the access token as `Authorization: Bearer`.
+    """
+
+    authentication_classes = []
+    permission_classes = [AllowAny]
+
+    def post(self, request, *args, **kwargs):
+        serializer = AuthTokenSerializer(
+            data=request.data, context={"request": request}
+        )
+        serializer.is_valid(raise_exception=True)
+        user = serializer.validated_data["user"]
+        if user.soft_deleted:
+            raise exceptions.AuthenticationFailed("User inactive or deleted.")
+        return Response(issue_tokens(user))
+
+
+class SignedTokenRefreshView(APIView):
+    """
+    Exchange a refresh token for a new access token. The refresh token is
+    rotated: the response carries its replacement.
+    """
+
+    authentication_classes = []
+    permission_classes = [AllowAny]
+
+    def post(self, request, *args, **kwargs):
+        serializer = RefreshTokenSerializer(data=request.data)
+        serializer.is_valid(raise_exception=True)
+        try:
+            tokens = refresh_tokens(serializer.validated_data["refresh"])
+        except InvalidToken as error:
+            return Response({"detail": str(error)}, status=status.HTTP_401_UNAUTHORIZED)
+        return Response(tokens)
+
+
+class SignedTokenRevokeView(APIView):
+    """
+    Sign out: revoke a refresh token and the access tokens issued from it.
+    """
+
+    authentication_classes = []
+    permission_classes = [AllowAny]
+
+    def post(self, request, *args, **kwargs):
+        serializer = RefreshTokenSerializer(data=request.data)
+        serializer.is_valid(raise_exception=True)
+        revoke_refresh_token(serializer.validated_data["refresh"])
+        return Response(status=status.HTTP_204_NO_CONTENT)
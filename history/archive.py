@@ -0,0 +1,415 @@
+import copy
+import gzip
+import json
+import os
+from collections import Counter
+from datetime import datetime, timedelta
+from pathlib import Path
+
+from django.conf import settings
+from django.db import transaction
+from django.db.models import prefetch_related_objects
+from django.utils.dateparse import parse_datetime
+
+from history.models import AuditLog
+from history.partitions import period_bounds, period_of
+
+COLUMNS = ("id", "timestamp", "action", "model_name", "object_id", "user_id")
+# The resolution of timestamps: `timestamp > t` is `timestamp >= t + TICK`.
+TICK = timedelta(microseconds=1)
+# Filters common enough, and with few enough values, to count per block.
+COUNTED_COLUMNS = ("action", "model_name")
+
+
+def archive_options():
+    options = {
+        "DIRECTORY": settings.BASE_DIR / "audit_archive",
+        "RETENTION_DAYS": 90,
+        "BLOCK_ROWS": 5000,
+        "DELETE_CHUNK": 500,
+    }
+    options.update(getattr(settings, "HISTORY_AUDIT_ARCHIVE", {}))
+    return options
+
+
+def archive_directory():
+    return Path(archive_options()["DIRECTORY"])
+
+
+def summarize(columns):
+    """
+    What a block holds for each filterable column, so queries can skip or
+    count blocks without decompressing them: the number of rows per action
+    and per model name, and the range of object and user ids.
+    """
+    summary = {name: dict(Counter(columns[name])) for name in COUNTED_COLUMNS}
+    for name in ("object_id", "user_id"):
+        values = [value for value in columns[name] if value is not None]
+        summary[name] = [min(values), max(values)] if values else None
+    return summary
+
+
+class PartitionArchive:
+    """
+    Append-only archive of one monthly partition. `<period>.blocks.gz` is a
+    sequence of independently gzipped blocks, each holding its rows column by
+    column; `<period>.index.json` records every block's offset, size, row
+    count, time and id range, and a summary of its filterable columns so
+    readers only decompress the blocks they need.
+    """
+
+    def __init__(self, directory, period):
+        self.period = period
+        self.data_path = Path(directory) / f"{period}.blocks.gz"
+        self.index_path = Path(directory) / f"{period}.index.json"
+
+    def read_index(self):
+        try:
+            with open(self.index_path) as index_file:
+                return json.load(index_file)["blocks"]
+        except FileNotFoundError:
+            return []
+
+    def append_block(self, rows):
+        """
+        Append `rows` as a new block, unless an earlier run whose transaction
+        rolled back already did: a block holding the same id range and
+        number of rows. Returns whether the block was written.
+        """
+        ids = [row["id"] for row in rows]
+        id_range = [min(ids), max(ids)]
+        blocks = self.read_index()
+        if any(
+            block.get("ids") == id_range and block["rows"] == len(rows)
+            for block in blocks
+        ):
+            return False
+
+        columns = {name: [row[name] for row in rows] for name in COLUMNS}
+        columns["timestamp"] = [
+            timestamp.isoformat() for timestamp in columns["timestamp"]
+        ]
+        payload = gzip.compress(json.dumps(columns, separators=(",", ":")).encode())
+
+        self.data_path.parent.mkdir(parents=True, exist_ok=True)
+        with open(self.data_path, "ab") as data_file:
+            offset = data_file.tell()
+            data_file.write(payload)
+            data_file.flush()
+            os.fsync(data_file.fileno())
+
+        timestamps = [row["timestamp"] for row in rows]
+        blocks.append(
+            {
+                "offset": offset,
+                "length": len(payload),
+                "rows": len(rows),
+                "first": min(timestamps).isoformat(),
+                "last": max(timestamps).isoformat(),
+                "ids": id_range,
+                "summary": summarize(columns),
+            }
+        )
+
+        # Readers always see either the old or the new index, never a partial one.
+        temporary_path = self.index_path.with_suffix(".tmp")
+        with open(temporary_path, "w") as index_file:
+            json.dump({"period": self.period, "blocks": blocks}, index_file)
+            index_file.flush()
+            os.fsync(index_file.fileno())
+        os.replace(temporary_path, self.index_path)
+        return True
+
+    def read_block(self, block):
+        with open(self.data_path, "rb") as data_file:
+            data_file.seek(block["offset"])
+            payload = data_file.read(block["length"])
+        return json.loads(gzip.decompress(payload))
+
+
+def archive_entries(before, directory=None, block_rows=None, delete_chunk=None):
+    """
+    Move audit entries recorded before `before` out of the database into the
+    partition archives, one block per transaction. Returns the number of
+    entries moved.
+    """
+    options = archive_options()
+    directory = directory or archive_directory()
+    block_rows = block_rows or options["BLOCK_ROWS"]
+    delete_chunk = delete_chunk or options["DELETE_CHUNK"]
+
+    archived = 0
+    while True:
+        with transaction.atomic():
+            rows = list(
+                AuditLog.objects.filter(timestamp__lt=before)
+                .order_by("timestamp", "id")
+                .values(*COLUMNS)[:block_rows]
+            )
+            if not rows:
+                break
+
+            ids = [row["id"] for row in rows]
+            for position in range(0, len(ids), delete_chunk):
+                AuditLog.objects.filter(
+                    pk__in=ids[position : position + delete_chunk]
+                ).delete()
+
+            # Written last: if appending fails the deletes are rolled back,
+            # and blocks already appended for other periods are skipped when
+            # the same rows are archived again.
+            by_period = {}
+            for row in rows:
+                by_period.setdefault(period_of(row["timestamp"]), []).append(row)
+            for period, period_rows in by_period.items():
+                PartitionArchive(directory, period).append_block(period_rows)
+
+        archived += len(rows)
+    return archived
+
+
+class ArchiveQuery:
+    """
+    Archived audit entries in [start, end] matching exact `filters` on
+    `action`, `model_name`, `object_id` or `user`. Supports `count()` and
+    slicing so it can be paginated like a queryset; slices are AuditLog
+    instances in time order.
+    """
+
+    filter_columns = {
+        "action": "action",
+        "model_name": "model_name",
+        "object_id": "object_id",
+        "user": "user_id",
+    }
+
+    def __init__(self, start=None, end=None, filters=None, directory=None):
+        self.start = start
+        self.end = end
+        self.filters = {
+            self.filter_columns[name]: value for name, value in (filters or {}).items()
+        }
+        self.directory = Path(directory or archive_directory())
+        self._blocks = None
+        self._counts = {}
+
+    def blocks(self):
+        if self._blocks is None:
+            first_period, last_period = period_bounds(self.start, self.end)
+            blocks = []
+            for index_path in self.directory.glob("*.index.json"):
+                period = int(index_path.name.split(".")[0])
+                if first_period is not None and period < first_period:
+                    continue
+                if last_period is not None and period > last_period:
+                    continue
+
+                partition = PartitionArchive(self.directory, period)
+                for block in partition.read_index():
+                    first = parse_datetime(block["first"])
+                    last = parse_datetime(block["last"])
+                    if self.start is not None and last < self.start:
+                        continue
+                    if self.end is not None and first > self.end:
+                        continue
+                    if not self._may_match(block.get("summary")):
+                        continue
+                    blocks.append((first, partition, block, last))
+
+            blocks.sort(key=lambda item: (item[0], item[1].period, item[2]["offset"]))
+            self._blocks = blocks
+        return self._blocks
+
+    def exists(self):
+        return bool(self.blocks())
+
+    def narrowed(self, start=None, end=None):
+        """
+        This query further limited to entries in [start, end].
+        """
+        query = copy.copy(self)
+        if start is not None and (self.start is None or start > self.start):
+            query.start = start
+        if end is not None and (self.end is None or end < self.end):
+            query.end = end
+        query._blocks = None
+        query._counts = {}
+        return query
+
+    def _may_match(self, summary):
+        """
+        Whether a block with this summary can hold rows matching the
+        filters. Blocks archived without a summary always can.
+        """
+        if summary is None:
+            return True
+        for name, value in self.filters.items():
+            if name in ("object_id", "user_id"):
+                if summary[name] is None:
+                    return False
+                low, high = summary[name]
+                try:
+                    if not low <= int(value) <= high:
+                        return False
+                except (TypeError, ValueError):
+                    continue
+            elif str(value) not in summary[name]:
+                return False
+        return True
+
+    def _indexed_count(self, first, block, last):
+        """
+        The number of matching rows in a block when the index alone tells,
+        else None.
+        """
+        if (self.start is not None and first < self.start) or (
+            self.end is not None and last > self.end
+        ):
+            return None
+        if not self.filters:
+            return block["rows"]
+        summary = block.get("summary")
+        if summary is not None and len(self.filters) == 1:
+            [(name, value)] = self.filters.items()
+            if name in COUNTED_COLUMNS:
+                return summary[name].get(str(value), 0)
+        return None
+
+    def _read_rows(self, partition, block):
+        columns = partition.read_block(block)
+        for position in range(block["rows"]):
+            row = {name: columns[name][position] for name in COLUMNS}
+            row["timestamp"] = parse_datetime(row["timestamp"])
+            if self.start is not None and row["timestamp"] < self.start:
+                continue
+            if self.end is not None and row["timestamp"] > self.end:
+                continue
+            if any(
+                str(row[name]) != str(value) for name, value in self.filters.items()
+            ):
+                continue
+            yield row
+
+    def rows(self):
+        """
+        Matching entries as dicts in time order, one block in memory at a time.
+        """
+        for _, partition, block, _ in self.blocks():
+            yield from self._read_rows(partition, block)
+
+    def _block_count(self, first, partition, block, last):
+        # Only counts are kept, so memory doesn't grow with the archive.
+        key = (partition.period, block["offset"])
+        if key not in self._counts:
+            count = self._indexed_count(first, block, last)
+            if count is None:
+                count = sum(1 for _ in self._read_rows(partition, block))
+            self._counts[key] = count
+        return self._counts[key]
+
+    def count(self):
+        return sum(self._block_count(*item) for item in self.blocks())
+
+    def __len__(self):
+        return self.count()
+
+    def __getitem__(self, index):
+        if not isinstance(index, slice) or index.step not in (None, 1):
+            raise TypeError("Archived entries only support contiguous slices.")
+
+        start = index.start or 0
+        stop = index.stop if index.stop is not None else self.count()
+
+        rows = []
+        position = 0
+        for first, partition, block, last in self.blocks():
+            if position >= stop:
+                break
+            size = self._block_count(first, partition, block, last)
+            if size and position + size > start:
+                block_rows = list(self._read_rows(partition, block))
+                rows.extend(block_rows[max(start - position, 0) : stop - position])
+            position += size
+
+        entries = [AuditLog(**row) for row in rows]
+        prefetch_related_objects(entries, "user")
+        return entries
+
+
+class ArchivedAndLiveEntries:
+    """
+    Archived entries followed by those still in the database, as one
+    sequence in (timestamp, id) order; everything archived is older than
+    what is left behind. Supports what both paginators need: `count()` and
+    slicing, plus `order_by()` on that ordering or its reverse and
+    `filter()` on a `timestamp__gt` or `timestamp__lt` cursor position.
+    """
+
+    def __init__(self, archived, queryset, reverse=False):
+        self.archived = archived
+        self.queryset = queryset
+        self.reverse = reverse
+
+    def order_by(self, *ordering):
+        return ArchivedAndLiveEntries(
+            self.archived,
+            self.queryset.order_by(*ordering),
+            reverse=ordering[0].startswith("-"),
+        )
+
+    def filter(self, **kwargs):
+        [(lookup, value)] = kwargs.items()
+        position = value if isinstance(value, datetime) else parse_datetime(value)
+        if lookup == "timestamp__gt":
+            archived = self.archived.narrowed(start=position + TICK)
+        elif lookup == "timestamp__lt":
+            archived = self.archived.narrowed(end=position - TICK)
+        else:
+            raise TypeError(f"Audit entries can't be filtered on {lookup}.")
+        return ArchivedAndLiveEntries(
+            archived, self.queryset.filter(**kwargs), reverse=self.reverse
+        )
+
+    def count(self):
+        return self.archived.count() + self.queryset.count()
+
+    def __len__(self):
+        return self.count()
+
+    def _archived_reversed(self, start, stop):
+        count = self.archived.count()
+        entries = self.archived[max(count - stop, 0) : max(count - start, 0)]
+        return entries[::-1]
+
+    def _live(self, start, stop):
+        return list(self.queryset[start:stop])
+
+    def __getitem__(self, index):
+        if not isinstance(index, slice) or index.step not in (None, 1):
+            raise TypeError("Audit entries only support contiguous slices.")
+
+        start = index.start or 0
+        stop = index.stop if index.stop is not None else self.count()
+        if self.reverse:
+            first, first_count, second = (
+                self._live,
+                self.queryset.count,
+                self._archived_reversed,
+            )
+        else:
+            first, first_count, second = (
+                lambda start, stop: self.archived[start:stop],
+                self.archived.count,
+                self._live,
+            )
+
+        # The first part is only counted when the slice starts past its end,
+        # so pages that stay within it cost no COUNT.
+        entries = first(start, stop)
+        if len(entries) < stop - start:
+            if entries or not start:
+                skipped = start + len(entries)
+            else:
+                skipped = first_count()
+            entries.extend(second(max(start - skipped, 0), stop - skipped))
+        return entries
@@ -0,0 +1,36 @@
+import contextvars
+from contextlib import contextmanager
+from types import SimpleNamespace
+
+# The request (or anything else with a `user` attribute) whose changes are
+# being audited. Model changes made outside of an audit context, such as
+# fixture loading, migrations or background workers, are not recorded.
+_audit_source = contextvars.ContextVar("audit_source", default=None)
+
+
+@contextmanager
+def audit_context(source):
+    token = _audit_source.set(source)
+    try:
+        yield
+    finally:
+        _audit_source.reset(token)
+
+
+def audit_as(user):
+    """
+    Audit changes made inside the block as `user`, e.g. from a management
+    command.
+    """
+    return audit_context(SimpleNamespace(user=user))
+
+
+def is_auditing():
+    return _audit_source.get() is not None
+
+
+def current_user():
+    # Resolved lazily: DRF authenticates inside the view, after the
+    # middleware has opened the context, and updates the request's user.
+    source = _audit_source.get()
+    return getattr(source, "user", None) if source is not None else None
@@ -0,0 +1,45 @@
+import time
+from datetime import timedelta
+
+from django.core.management.base import BaseCommand
+from django.utils import timezone
+
+from history.archive import archive_entries, archive_options
+
+
+class Command(BaseCommand):
+    help = "Move audit log entries past the retention window into archive files."
+
+    def add_arguments(self, parser):
+        parser.add_argument(
+            "--retention-days",
+            type=int,
+            default=None,
+            help="Keep this many days of entries in the database.",
+        )
+        parser.add_argument(
+            "--loop",
+            action="store_true",
+            help="Keep archiving on a schedule instead of exiting after one pass.",
+        )
+        parser.add_argument(
+            "--interval",
+            type=float,
+            default=3600.0,
+            help="Seconds to sleep between passes in --loop mode.",
+        )
+
+    def handle(self, *args, **options):
+        retention_days = options["retention_days"]
+        if retention_days is None:
+            retention_days = archive_options()["RETENTION_DAYS"]
+
+        while True:
+            before = timezone.now() - timedelta(days=retention_days)
+            archived = archive_entries(before)
+            if archived or options["verbosity"] > 1:
+                self.stdout.write(f"Archived {archived} audit log entries.")
+
+            if not options["loop"]:
+                break
+            time.sleep(options["interval"])
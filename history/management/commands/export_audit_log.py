@@ -0,0 +1,40 @@
+from argparse import ArgumentTypeError
+
+from django.core.management.base import BaseCommand
+
+from history.partitions import parse_timestamp
+from history.views import EXPORT_COLUMNS, export_rows
+from tutorial.streaming import EXPORT_CONTENT_TYPES, write_export
+
+
+def datetime_argument(value):
+    parsed = parse_timestamp(value)
+    if parsed is None:
+        raise ArgumentTypeError(
+            f"Expected an ISO 8601 date or date and time, got {value!r}."
+        )
+    return parsed
+
+
+class Command(BaseCommand):
+    help = "Dump the audit log, archived entries included, as NDJSON or CSV."
+
+    def add_arguments(self, parser):
+        parser.add_argument(
+            "--format", choices=sorted(EXPORT_CONTENT_TYPES), default="ndjson"
+        )
+        parser.add_argument(
+            "--output", default="-", help="File to write to; defaults to stdout."
+        )
+        parser.add_argument("--gzip", action="store_true", help="Gzip the output.")
+        parser.add_argument("--since", type=datetime_argument, default=None)
+        parser.add_argument("--until", type=datetime_argument, default=None)
+
+    def handle(self, *args, **options):
+        write_export(
+            export_rows(options["since"], options["until"]),
+            EXPORT_COLUMNS,
+            options["format"],
+            options["output"],
+            compress=options["gzip"],
+        )
@@ -0,0 +1,24 @@
+from django.conf import settings
+
+from history.context import audit_context
+from history.writer import audit_writer
+
+
+class AuditMiddleware:
+    """
+    Audit model changes made while handling a request as the request's user.
+    Entries for changes made in a transaction are written when it commits;
+    the rest are written together once the response is ready.
+    """
+
+    def __init__(self, get_response):
+        self.get_response = get_response
+
+    def __call__(self, request):
+        try:
+            with audit_context(request):
+                return self.get_response(request)
+        finally:
+            options = getattr(settings, "HISTORY_AUDIT_WRITER", {})
+            if options.get("FLUSH_ON_REQUEST_END", True):
+                audit_writer.flush()
@@ -0,0 +1,40 @@
+from django.db import migrations, models
+from django.db.models.functions import ExtractMonth, ExtractYear
+
+
+def backfill_period(apps, schema_editor):
+    AuditLog = apps.get_model("history", "AuditLog")
+    AuditLog.objects.update(
+        period=ExtractYear("timestamp") * 100 + ExtractMonth("timestamp")
+    )
+
+
+class Migration(migrations.Migration):
+    dependencies = [
+        ("history", "0003_audit_log_timestamp_default"),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name="auditlog",
+            name="period",
+            field=models.PositiveIntegerField(default=0, editable=False),
+            preserve_default=False,
+        ),
+        migrations.RunPython(backfill_period, migrations.RunPython.noop),
+        migrations.AddIndex(
+            model_name="auditlog",
+            index=models.Index(
+                fields=["period", "timestamp", "id"], name="auditlog_period_idx"
+            ),
+        ),
+        # Per-object history is read in time order.
+        migrations.RemoveIndex(model_name="auditlog", name="auditlog_object_idx"),
+        migrations.AddIndex(
+            model_name="auditlog",
+            index=models.Index(
+                fields=["model_name", "object_id", "timestamp"],
+                name="auditlog_object_time_idx",
+            ),
+        ),
+    ]
@@ -0,0 +1,20 @@
+# Generated by Django 5.0.6 on 2026-10-18 13:10
+
+from django.db import migrations
+
+
+class Migration(migrations.Migration):
+    dependencies = [
+        ("history", "0004_partition_audit_log_by_month"),
+    ]
+
+    operations = [
+        migrations.RemoveIndex(
+            model_name="auditlog",
+            name="auditlog_period_idx",
+        ),
+        migrations.RemoveField(
+            model_name="auditlog",
+            name="period",
+        ),
+    ]
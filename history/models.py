@@ -1,13 +1,17 @@
 from django.conf import settings
 from django.contrib.contenttypes.models import ContentType
 from django.db import models
+from django.utils import timezone
+
+from history.querysets import AuditLogQuerySet
 
 
 class AuditLog(models.Model):
     model_name = models.CharField(max_length=255)
     object_id = models.PositiveIntegerField()
     action = models.CharField(max_length=255)
-    timestamp = models.DateTimeField(auto_now_add=True)
+    # Set when the entry is recorded, not when the buffered batch is written.
+    timestamp = models.DateTimeField(default=timezone.now, editable=False)
     user = models.ForeignKey(
         settings.AUTH_USER_MODEL,
         related_name="audit_logs",
@@ -15,3 +19,14 @@ class AuditLog(models.Model):
         blank=True,
         null=True,
     )
+
+    objects = AuditLogQuerySet.as_manager()
+
+    class Meta:
+        indexes = [
+            models.Index(
+                fields=["model_name", "object_id", "timestamp"],
+                name="auditlog_object_time_idx",
+            ),
+            models.Index(fields=["timestamp", "id"], name="auditlog_timestamp_id_idx"),
+        ]
@@ -0,0 +1,44 @@
+from datetime import datetime, time
+from datetime import timezone as dt_timezone
+
+from django.utils import timezone
+from django.utils.dateparse import parse_date, parse_datetime
+
+
+def parse_timestamp(value):
+    """
+    An aware datetime from an ISO 8601 date and time, or from a date for
+    its midnight, or None if `value` is neither. Values without an offset
+    are in the current time zone.
+    """
+    try:
+        parsed = parse_datetime(value)
+        if parsed is None:
+            day = parse_date(value)
+            if day is None:
+                return None
+            parsed = datetime.combine(day, time())
+    except ValueError:
+        # Well formed, but out of range, like month 13.
+        return None
+    if timezone.is_naive(parsed):
+        parsed = timezone.make_aware(parsed)
+    return parsed
+
+
+def period_of(timestamp):
+    """
+    Monthly partition key of a timestamp, e.g. 202409 for September 2024.
+    """
+    timestamp = timezone.localtime(timestamp, dt_timezone.utc)
+    return timestamp.year * 100 + timestamp.month
+
+
+def period_bounds(start, end):
+    """
+    First and last partition overlapping [start, end]; open ends are None.
+    """
+    return (
+        period_of(start) if start is not None else None,
+        period_of(end) if end is not None else None,
+    )
@@ -0,0 +1,54 @@
+from django.db import models
+
+from history.registry import audit_registry
+from history.signals import bulk_operation
+
+
+class AuditLogQuerySet(models.QuerySet):
+    def between(self, start=None, end=None):
+        """
+        Entries recorded in [start, end]; open ends are None.
+        """
+        queryset = self
+        if start is not None:
+            queryset = queryset.filter(timestamp__gte=start)
+        if end is not None:
+            queryset = queryset.filter(timestamp__lte=end)
+        return queryset
+
+
+class AuditedQuerySet(models.QuerySet):
+    """
+    Reports bulk writes, which never send `post_save`, through the
+    `bulk_operation` signal so they can be audited as one batch.
+    """
+
+    def _send_bulk_operation(self, action, object_ids):
+        bulk_operation.send(
+            sender=self.model, action=action, object_ids=object_ids, using=self.db
+        )
+
+    def bulk_create(self, objs, *args, **kwargs):
+        objs = super().bulk_create(objs, *args, **kwargs)
+        self._send_bulk_operation("create", [obj.pk for obj in objs])
+        return objs
+
+    def bulk_update(self, objs, fields, *args, **kwargs):
+        objs = list(objs)
+        updated = super().bulk_update(objs, fields, *args, **kwargs)
+        self._send_bulk_operation("update", [obj.pk for obj in objs])
+        return updated
+
+    def update(self, **kwargs):
+        return self._audited_update("update", **kwargs)
+
+    def _audited_update(self, action, **kwargs):
+        # The affected rows may stop matching the filter once updated, so
+        # their ids have to be read first, but only when they are audited.
+        object_ids = None
+        if audit_registry.is_capturing(self.model):
+            object_ids = list(self.values_list("pk", flat=True))
+
+        updated = super().update(**kwargs)
+        self._send_bulk_operation(action, object_ids)
+        return updated
@@ -0,0 +1,72 @@
+from collections import namedtuple
+
+from django.db.models.signals import post_delete, post_save
+
+from history.context import current_user, is_auditing
+from history.signals import bulk_operation
+from history.writer import audit_writer
+
+AuditOptions = namedtuple("AuditOptions", "ignore_fields soft_delete_field")
+
+
+class AuditRegistry:
+    """
+    Models whose changes are written to the audit log. Saves and deletes are
+    captured from the model signals, bulk writes from `AuditedQuerySet`.
+    """
+
+    def __init__(self):
+        self._models = {}
+
+    def register(self, model, ignore_fields=(), soft_delete_field=None):
+        """
+        `ignore_fields` lists fields whose updates alone are not worth an
+        entry (e.g. `last_login`). Saving only `soft_delete_field` records a
+        "soft-delete" or "restore" instead of an "update".
+        """
+        self._models[model] = AuditOptions(frozenset(ignore_fields), soft_delete_field)
+
+        uid = f"history.audit.{model._meta.label_lower}"
+        post_save.connect(self._post_save, sender=model, dispatch_uid=uid)
+        post_delete.connect(self._post_delete, sender=model, dispatch_uid=uid)
+        bulk_operation.connect(self._bulk_operation, sender=model, dispatch_uid=uid)
+
+    def is_registered(self, model):
+        return model in self._models
+
+    def is_capturing(self, model):
+        return self.is_registered(model) and is_auditing()
+
+    def save_action(self, options, instance, created, update_fields):
+        if created:
+            return "create"
+
+        field = options.soft_delete_field
+        if field and update_fields and set(update_fields) == {field}:
+            return "soft-delete" if getattr(instance, field) else "restore"
+        return "update"
+
+    def _post_save(self, sender, instance, created, raw, update_fields, **kwargs):
+        if raw or not is_auditing():
+            return
+
+        options = self._models[sender]
+        if update_fields and set(update_fields) <= options.ignore_fields:
+            return
+
+        action = self.save_action(options, instance, created, update_fields)
+        audit_writer.record(action, instance, current_user())
+
+    def _post_delete(self, sender, instance, **kwargs):
+        if is_auditing():
+            audit_writer.record("delete", instance, current_user())
+
+    def _bulk_operation(self, sender, action, object_ids, **kwargs):
+        if object_ids is not None and is_auditing():
+            audit_writer.record_keys(
+                action, sender.__name__, object_ids, current_user()
+            )
+
+
+audit_registry = AuditRegistry()
+register = audit_registry.register
@@ -0,0 +1,20 @@
+from rest_framework import serializers
+
+from history.models import AuditLog
+
+
+class AuditLogSerializer(serializers.ModelSerializer):
+    username = serializers.ReadOnlyField(source="user.username")
+
+    class Meta:
+        model = AuditLog
+        fields = (
+            "id",
+            "timestamp",
+            "action",
+            "model_name",
+            "object_id",
+            "user",
+            "username",
+        )
+        read_only_fields = fields
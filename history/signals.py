@@ -0,0 +1,7 @@
+from django.dispatch import Signal
+
+# Sent by `AuditedQuerySet` after a bulk operation that bypasses the model
+# signals. Arguments: `action` ("create", "update" or "delete"),
+# `object_ids`, which is None when nothing asked for the affected ids, and
+# `using`, the database alias written to.
+bulk_operation = Signal()
@@ -0,0 +1,275 @@
+import json
+import tempfile
+from datetime import datetime, timezone
+from io import StringIO
+from unittest import mock
+
+from django.core.management import CommandError, call_command
+from django.db import connection
+from django.test import override_settings
+from django.test.utils import CaptureQueriesContext
+from django.urls import reverse
+from rest_framework import status
+
+from history.archive import ArchiveQuery, PartitionArchive, archive_entries
+from history.models import AuditLog
+from history.tests.test_audit_log import AuditLogTestCaseBase
+from history.tests.test_views import entry
+
+
+class AuditLogArchiveTests(AuditLogTestCaseBase):
+    def setUp(self):
+        super().setUp()
+        directory = tempfile.TemporaryDirectory()
+        self.addCleanup(directory.cleanup)
+        self.directory = directory.name
+
+        settings_override = override_settings(
+            HISTORY_AUDIT_ARCHIVE={"DIRECTORY": self.directory, "BLOCK_ROWS": 2}
+        )
+        settings_override.enable()
+        self.addCleanup(settings_override.disable)
+
+        self.entries = [
+            entry(
+                "create",
+                "Snippet",
+                1,
+                self.active_user,
+                datetime(2024, 8, 1, tzinfo=timezone.utc),
+            ),
+            entry(
+                "update",
+                "Snippet",
+                1,
+                self.active_user,
+                datetime(2024, 8, 20, tzinfo=timezone.utc),
+            ),
+            entry(
+                "update",
+                "Snippet",
+                2,
+                self.staff_user,
+                datetime(2024, 9, 3, tzinfo=timezone.utc),
+            ),
+            entry(
+                "create",
+                "CustomUser",
+                3,
+                self.staff_user,
+                datetime(2024, 9, 4, tzinfo=timezone.utc),
+            ),
+            entry(
+                "delete",
+                "Snippet",
+                1,
+                self.active_user,
+                datetime(2024, 10, 1, tzinfo=timezone.utc),
+            ),
+        ]
+        self.cutoff = datetime(2024, 9, 30, tzinfo=timezone.utc)
+
+    def get_ids(self, params=None):
+        self.client.force_authenticate(user=self.staff_user)
+        response = self.client.get(reverse("auditlog-list"), params or {})
+        self.assertEqual(status.HTTP_200_OK, response.status_code)
+        return [item["id"] for item in response.data["results"]]
+
+    def test_old_entries_move_to_monthly_block_files(self):
+        self.assertEqual(4, archive_entries(self.cutoff))
+
+        self.assertEqual(
+            [self.entries[4].pk], list(AuditLog.objects.values_list("pk", flat=True))
+        )
+        august = PartitionArchive(self.directory, 202408).read_index()
+        september = PartitionArchive(self.directory, 202409).read_index()
+        self.assertEqual([2], [block["rows"] for block in august])
+        self.assertEqual([2], [block["rows"] for block in september])
+
+        self.assertEqual(0, archive_entries(self.cutoff))
+
+    def test_archives_are_appended_to(self):
+        archive_entries(datetime(2024, 9, 3, 12, tzinfo=timezone.utc))
+        archive_entries(self.cutoff)
+
+        blocks = PartitionArchive(self.directory, 202409).read_index()
+        self.assertEqual([1, 1], [block["rows"] for block in blocks])
+        self.assertEqual(blocks[0]["length"], blocks[1]["offset"])
+
+    def test_rerun_after_a_failed_append_does_not_duplicate_blocks(self):
+        append_block = PartitionArchive.append_block
+
+        def fail_for_september(partition, rows):
+            if partition.period == 202409:
+                raise OSError("disk full")
+            return append_block(partition, rows)
+
+        with mock.patch.object(PartitionArchive, "append_block", fail_for_september):
+            with self.assertRaises(OSError):
+                archive_entries(self.cutoff, block_rows=4)
+        self.assertEqual(5, AuditLog.objects.count())
+
+        self.assertEqual(4, archive_entries(self.cutoff, block_rows=4))
+
+        august = PartitionArchive(self.directory, 202408).read_index()
+        self.assertEqual([2], [block["rows"] for block in august])
+        self.assertEqual(
+            [self.entries[0].pk, self.entries[1].pk],
+            [e.pk for e in ArchiveQuery()[0:2]],
+        )
+        self.assertEqual(4, ArchiveQuery().count())
+
+    def test_filtered_queries_skip_blocks_that_cannot_match(self):
+        archive_entries(self.cutoff)
+
+        with mock.patch.object(
+            PartitionArchive,
+            "read_block",
+            autospec=True,
+            wraps=PartitionArchive.read_block,
+        ) as read_block:
+            self.assertEqual(1, ArchiveQuery(filters={"object_id": "2"}).count())
+            self.assertEqual(
+                1, ArchiveQuery(filters={"model_name": "CustomUser"}).count()
+            )
+            self.assertEqual(0, ArchiveQuery(filters={"action": "delete"}).count())
+
+        self.assertEqual(
+            [202409], [call.args[0].period for call in read_block.call_args_list]
+        )
+
+    def test_counts_come_from_the_index_and_pages_read_only_their_blocks(self):
+        archive_entries(self.cutoff)
+
+        with mock.patch.object(
+            PartitionArchive,
+            "read_block",
+            autospec=True,
+            wraps=PartitionArchive.read_block,
+        ) as read_block:
+            archived = ArchiveQuery(filters={"model_name": "Snippet"})
+            self.assertEqual(3, archived.count())
+            self.assertEqual([], read_block.call_args_list)
+
+            self.assertEqual([self.entries[2].pk], [e.pk for e in archived[2:3]])
+        self.assertEqual(
+            [202409], [call.args[0].period for call in read_block.call_args_list]
+        )
+
+    def test_archived_entries_can_be_queried(self):
+        archive_entries(self.cutoff)
+
+        archived = ArchiveQuery(
+            start=datetime(2024, 8, 10, tzinfo=timezone.utc),
+            filters={"model_name": "Snippet"},
+        )
+        self.assertEqual(2, archived.count())
+
+        found = archived[0:2]
+        self.assertEqual(
+            [self.entries[1].pk, self.entries[2].pk], [e.pk for e in found]
+        )
+        self.assertEqual(self.active_user, found[0].user)
+        self.assertEqual(self.entries[2].timestamp, found[1].timestamp)
+
+    def test_api_merges_archived_and_live_entries(self):
+        archive_entries(self.cutoff)
+
+        self.assertEqual([e.pk for e in self.entries], self.get_ids())
+        self.assertEqual(
+            [self.entries[0].pk, self.entries[1].pk, self.entries[4].pk],
+            self.get_ids({"user": self.active_user.pk}),
+        )
+        self.assertEqual(
+            [self.entries[2].pk, self.entries[3].pk],
+            self.get_ids(
+                {"since": "2024-09-01T00:00:00Z", "until": "2024-09-30T00:00:00Z"}
+            ),
+        )
+
+    def test_api_pages_across_the_archive_boundary(self):
+        archive_entries(self.cutoff)
+
+        self.assertEqual(
+            [self.entries[3].pk, self.entries[4].pk],
+            self.get_ids({"page": 2, "page_size": 3}),
+        )
+
+    def test_cursor_pages_across_the_archive_boundary(self):
+        archive_entries(self.cutoff)
+        self.client.force_authenticate(user=self.staff_user)
+
+        pages = []
+        url = reverse("auditlog-list")
+        params = {"pagination": "cursor", "page_size": 2}
+        while url:
+            with CaptureQueriesContext(connection) as queries:
+                response = self.client.get(url, params)
+            self.assertEqual(status.HTTP_200_OK, response.status_code)
+            self.assertFalse(
+                [q for q in queries.captured_queries if "COUNT(" in q["sql"]]
+            )
+            pages.append([item["id"] for item in response.data["results"]])
+            url, params = response.data["next"], None
+
+        self.assertEqual(
+            [e.pk for e in self.entries], [pk for page in pages for pk in page]
+        )
+
+        previous = self.client.get(response.data["previous"])
+        self.assertEqual(pages[-2], [item["id"] for item in previous.data["results"]])
+        previous = self.client.get(previous.data["previous"])
+        self.assertEqual(pages[-3], [item["id"] for item in previous.data["results"]])
+
+    def test_export_streams_archived_and_live_entries(self):
+        archive_entries(self.cutoff)
+        self.client.force_authenticate(user=self.staff_user)
+
+        response = self.client.get(
+            reverse("auditlog-export", args=["ndjson"]), {"model_name": "Snippet"}
+        )
+
+        self.assertEqual(status.HTTP_200_OK, response.status_code)
+        rows = [json.loads(line) for line in b"".join(response).splitlines()]
+        self.assertEqual(
+            [
+                self.entries[0].pk,
+                self.entries[1].pk,
+                self.entries[2].pk,
+                self.entries[4].pk,
+            ],
+            [row["id"] for row in rows],
+        )
+        self.assertEqual(self.active_user.pk, rows[0]["user"])
+
+    def test_export_is_staff_only(self):
+        self.client.force_authenticate(user=self.non_staff_user)
+        response = self.client.get(reverse("auditlog-export", args=["csv"]))
+        self.assertEqual(status.HTTP_403_FORBIDDEN, response.status_code)
+
+    def test_command_archives_past_retention(self):
+        out = StringIO()
+        call_command("archive_audit_log", "--retention-days", "30", stdout=out)
+
+        self.assertEqual(0, AuditLog.objects.count())
+        self.assertIn("Archived 5 audit log entries.", out.getvalue())
+
+    def test_export_command_takes_dates(self):
+        archive_entries(datetime(2024, 9, 1, tzinfo=timezone.utc))
+        output = f"{self.directory}/export.ndjson"
+        call_command(
+            "export_audit_log",
+            "--since",
+            "2024-08-15",
+            "--until",
+            "2024-09-03T12:00",
+            "--output",
+            output,
+        )
+
+        with open(output) as stream:
+            ids = [json.loads(line)["id"] for line in stream]
+        self.assertEqual([self.entries[1].pk, self.entries[2].pk], ids)
+
+        with self.assertRaises(CommandError):
+            call_command("export_audit_log", "--since", "2024-13-01T00:00:00Z")
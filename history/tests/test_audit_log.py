@@ -6,12 +6,15 @@ from rest_framework import status
 from rest_framework.test import APITestCase
 
 from accounts.models import CustomUser
+from tutorial.responsecache import get_response_cache
 
 
 class AuditLogTestCaseBase(APITestCase):
     fixtures = ["accounts_users", "snippets_snippets"]
 
     def setUp(self):
+        # Test rollbacks undo writes without bumping the cache generations.
+        get_response_cache().clear()
         self.audit_log_model = apps.get_model("history", "AuditLog")
 
         for user in CustomUser.objects.all():
@@ -39,9 +42,10 @@ class CustomUserAuditLogListViewTests(AuditLogTestCaseBase):
             "email": "newuser@example.com",
             "password": "password123",
         }
-        response = self.client.post(
-            reverse("customuser-create"), data=user_data, format="json"
-        )
+        with self.captureOnCommitCallbacks(execute=True):
+            response = self.client.post(
+                reverse("customuser-create"), data=user_data, format="json"
+            )
 
         self.assertEqual(status.HTTP_201_CREATED, response.status_code)
         self.assertEqual(1, self.audit_log_model.objects.count())
@@ -57,11 +61,12 @@ class CustomUserAuditLogListViewTests(AuditLogTestCaseBase):
             "email": "updated@example.com",
         }
 
-        response = self.client.patch(
-            reverse("customuser-update", kwargs={"pk": 3}),
-            data=user_data,
-            format="json",
-        )
+        with self.captureOnCommitCallbacks(execute=True):
+            response = self.client.patch(
+                reverse("customuser-update", kwargs={"pk": 3}),
+                data=user_data,
+                format="json",
+            )
 
         self.assertEqual(status.HTTP_200_OK, response.status_code)
         self.assertEqual(1, self.audit_log_model.objects.count())
@@ -71,7 +76,10 @@ class CustomUserAuditLogListViewTests(AuditLogTestCaseBase):
     def test_staff_user_can_delete_user(self):
         self.client.force_authenticate(user=self.staff_user)
 
-        response = self.client.delete(reverse("customuser-delete", kwargs={"pk": 3}))
+        with self.captureOnCommitCallbacks(execute=True):
+            response = self.client.delete(
+                reverse("customuser-delete", kwargs={"pk": 3})
+            )
 
         self.assertEqual(status.HTTP_200_OK, response.status_code)
         self.assertEqual(1, self.audit_log_model.objects.count())
@@ -98,9 +106,10 @@ class SnippetAuditLogDeleteViewTests(AuditLogTestCaseBase):
             "owner": self.staff_user.pk,
         }
 
-        response = self.client.post(
-            reverse("snippet-list"), data=snippet_data, format="json"
-        )
+        with self.captureOnCommitCallbacks(execute=True):
+            response = self.client.post(
+                reverse("snippet-list"), data=snippet_data, format="json"
+            )
 
         self.assertEqual(status.HTTP_201_CREATED, response.status_code)
         self.assertEqual(1, self.audit_log_model.objects.count())
@@ -114,11 +123,12 @@ class SnippetAuditLogDeleteViewTests(AuditLogTestCaseBase):
 
         snippet_data = {"linenos": False}
 
-        response = self.client.patch(
-            reverse("snippet-detail", kwargs={"pk": 1}),
-            data=snippet_data,
-            format="json",
-        )
+        with self.captureOnCommitCallbacks(execute=True):
+            response = self.client.patch(
+                reverse("snippet-detail", kwargs={"pk": 1}),
+                data=snippet_data,
+                format="json",
+            )
 
         self.assertEqual(status.HTTP_200_OK, response.status_code)
         self.assertEqual(1, self.audit_log_model.objects.count())
@@ -128,7 +138,8 @@ class SnippetAuditLogDeleteViewTests(AuditLogTestCaseBase):
     def test_owner_can_delete_snippet(self):
         self.client.force_authenticate(user=self.active_user)
 
-        response = self.client.delete(reverse("snippet-detail", kwargs={"pk": 1}))
+        with self.captureOnCommitCallbacks(execute=True):
+            response = self.client.delete(reverse("snippet-detail", kwargs={"pk": 1}))
 
         self.assertEqual(status.HTTP_204_NO_CONTENT, response.status_code)
         self.assertEqual(1, self.audit_log_model.objects.count())
@@ -0,0 +1,114 @@
+from contextlib import contextmanager
+
+from django.db import transaction
+from django.test import TestCase
+
+from accounts.models import CustomUser
+from history.context import audit_as
+from history.models import AuditLog
+from snippets.models import Snippet
+
+
+class AuditCaptureTests(TestCase):
+    fixtures = ["accounts_users", "snippets_snippets"]
+
+    def setUp(self):
+        self.staff_user = CustomUser.objects.get(pk=1)
+
+    @contextmanager
+    def committed_as(self, user):
+        """Audit as `user`, committing what the block recorded at its end."""
+        with self.captureOnCommitCallbacks(execute=True), audit_as(user):
+            yield
+
+    def recorded(self):
+        return list(
+            AuditLog.objects.order_by("pk").values_list(
+                "action", "model_name", "object_id"
+            )
+        )
+
+    def test_changes_outside_an_audit_context_are_not_recorded(self):
+        with self.captureOnCommitCallbacks(execute=True):
+            Snippet.objects.create(owner=self.staff_user, code="pass")
+            CustomUser.objects.filter(pk=2).update(email="x@example.com")
+
+        self.assertEqual([], self.recorded())
+
+    def test_save_and_delete_are_recorded(self):
+        with self.committed_as(self.staff_user):
+            snippet = Snippet.objects.create(owner=self.staff_user, code="pass")
+            snippet.title = "renamed"
+            snippet.save()
+            snippet_id = snippet.pk
+            snippet.delete()
+
+        self.assertEqual(
+            [
+                ("create", "Snippet", snippet_id),
+                ("update", "Snippet", snippet_id),
+                ("delete", "Snippet", snippet_id),
+            ],
+            self.recorded(),
+        )
+        self.assertEqual(
+            {self.staff_user.pk}, set(AuditLog.objects.values_list("user", flat=True))
+        )
+
+    def test_ignored_fields_and_soft_delete_actions(self):
+        user = CustomUser.objects.get(pk=3)
+        with self.committed_as(self.staff_user):
+            user.save(update_fields=["last_login"])
+            user.soft_deleted = True
+            user.save(update_fields=["soft_deleted"])
+            user.soft_deleted = False
+            user.save(update_fields=["soft_deleted"])
+
+        self.assertEqual(
+            [("soft-delete", "CustomUser", 3), ("restore", "CustomUser", 3)],
+            self.recorded(),
+        )
+
+    def test_queryset_update_is_recorded_with_one_insert(self):
+        for _ in range(3):
+            Snippet.objects.create(owner=self.staff_user, code="pass")
+
+        with audit_as(self.staff_user):
+            # Affected ids, the UPDATE itself and a single audit INSERT.
+            with self.assertNumQueries(3):
+                with self.captureOnCommitCallbacks(execute=True):
+                    Snippet.objects.filter(owner=self.staff_user).update(title="bulk")
+
+        self.assertEqual(3, AuditLog.objects.filter(action="update").count())
+
+    def test_bulk_create_is_recorded(self):
+        with self.committed_as(self.staff_user):
+            snippets = Snippet.objects.bulk_create(
+                [
+                    Snippet(owner=self.staff_user, code="pass", highlighted="")
+                    for _ in range(2)
+                ]
+            )
+
+        self.assertEqual(
+            [("create", "Snippet", snippet.pk) for snippet in snippets],
+            self.recorded(),
+        )
+
+    def test_queryset_delete_is_recorded(self):
+        with self.committed_as(self.staff_user):
+            Snippet.objects.all().delete()
+
+        self.assertEqual([("delete", "Snippet", 1)], self.recorded())
+
+    def test_rolled_back_changes_are_not_recorded(self):
+        with self.committed_as(self.staff_user):
+            try:
+                with transaction.atomic():
+                    Snippet.objects.create(owner=self.staff_user, code="pass")
+                    raise RuntimeError
+            except RuntimeError:
+                pass
+            Snippet.objects.filter(pk=1).update(title="kept")
+
+        self.assertEqual([("update", "Snippet", 1)], self.recorded())
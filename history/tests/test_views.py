@@ -0,0 +1,102 @@
+from datetime import datetime, timezone
+
+from django.urls import reverse
+from rest_framework import status
+
+from history.models import AuditLog
+from history.tests.test_audit_log import AuditLogTestCaseBase
+
+
+def entry(action, model_name, object_id, user, timestamp):
+    return AuditLog.objects.create(
+        action=action,
+        model_name=model_name,
+        object_id=object_id,
+        user=user,
+        timestamp=timestamp,
+    )
+
+
+class AuditLogListViewTests(AuditLogTestCaseBase):
+    def setUp(self):
+        super().setUp()
+        self.august = entry(
+            "create",
+            "Snippet",
+            1,
+            self.active_user,
+            datetime(2024, 8, 31, 23, 0, tzinfo=timezone.utc),
+        )
+        self.september = entry(
+            "update",
+            "Snippet",
+            1,
+            self.active_user,
+            datetime(2024, 9, 2, tzinfo=timezone.utc),
+        )
+        self.october = entry(
+            "soft-delete",
+            "CustomUser",
+            3,
+            self.staff_user,
+            datetime(2024, 10, 5, tzinfo=timezone.utc),
+        )
+
+    def get_ids(self, params=None):
+        self.client.force_authenticate(user=self.staff_user)
+        response = self.client.get(reverse("auditlog-list"), params or {})
+        self.assertEqual(status.HTTP_200_OK, response.status_code)
+        return [item["id"] for item in response.data["results"]]
+
+    def test_staff_user_can_list_entries_in_time_order(self):
+        self.assertEqual(
+            [self.august.pk, self.september.pk, self.october.pk], self.get_ids()
+        )
+
+    def test_non_staff_user_cannot_list_entries(self):
+        self.client.force_authenticate(user=self.non_staff_user)
+        response = self.client.get(reverse("auditlog-list"))
+        self.assertEqual(status.HTTP_403_FORBIDDEN, response.status_code)
+
+    def test_entries_cannot_be_created_through_the_api(self):
+        self.client.force_authenticate(user=self.staff_user)
+        response = self.client.post(
+            reverse("auditlog-list"),
+            {"action": "create", "model_name": "Snippet", "object_id": 1},
+            format="json",
+        )
+        self.assertEqual(status.HTTP_405_METHOD_NOT_ALLOWED, response.status_code)
+
+    def test_filter_by_fields(self):
+        self.assertEqual([self.october.pk], self.get_ids({"user": self.staff_user.pk}))
+        self.assertEqual(
+            [self.august.pk, self.september.pk],
+            self.get_ids({"model_name": "Snippet", "object_id": 1}),
+        )
+        self.assertEqual([self.september.pk], self.get_ids({"action": "update"}))
+
+    def test_filter_by_time_range(self):
+        ids = self.get_ids(
+            {"since": "2024-09-01T00:00:00Z", "until": "2024-09-30T23:59:59Z"}
+        )
+        self.assertEqual([self.september.pk], ids)
+
+        self.assertEqual(
+            [self.september.pk, self.october.pk],
+            self.get_ids({"since": "2024-09-01T00:00:00Z"}),
+        )
+
+    def test_time_range_in_local_time_and_dates(self):
+        ids = self.get_ids({"since": "2024-09-01", "until": "2024-09-30T23:59"})
+        self.assertEqual([self.september.pk], ids)
+
+    def test_invalid_filters_are_rejected(self):
+        self.client.force_authenticate(user=self.staff_user)
+        for params in (
+            {"since": "yesterday"},
+            {"until": "2024-13-01T00:00:00Z"},
+            {"since": "2024-02-30"},
+            {"object_id": "one"},
+        ):
+            response = self.client.get(reverse("auditlog-list"), params)
+            self.assertEqual(status.HTTP_400_BAD_REQUEST, response.status_code)
@@ -0,0 +1,101 @@
+from datetime import timedelta
+
+from django.contrib.auth.models import AnonymousUser
+from django.db import connection, transaction
+from django.test import TestCase, TransactionTestCase
+from django.test.utils import CaptureQueriesContext
+from django.utils import timezone
+
+from accounts.models import CustomUser
+from history.models import AuditLog
+from history.writer import AuditWriter
+
+
+class AuditWriterTests(TransactionTestCase):
+    """Entries recorded in autocommit mode, for changes already committed."""
+
+    fixtures = ["accounts_users"]
+
+    def setUp(self):
+        self.writer = AuditWriter(max_batch=5, max_delay=None)
+        self.users = list(CustomUser.objects.order_by("pk"))
+
+    def test_entries_are_buffered_until_flushed(self):
+        for user in self.users:
+            self.writer.record("update", user, self.users[0])
+
+        self.assertEqual(0, AuditLog.objects.count())
+        self.assertEqual(4, self.writer.pending())
+
+        with CaptureQueriesContext(connection) as queries:
+            self.assertEqual(4, self.writer.flush())
+        inserts = [query for query in queries if query["sql"].startswith("INSERT")]
+        self.assertEqual(1, len(inserts))
+
+        self.assertEqual(4, AuditLog.objects.count())
+        self.assertEqual(0, self.writer.pending())
+
+    def test_full_buffer_is_flushed(self):
+        self.writer.record_many("update", self.users, self.users[0])
+        self.assertEqual(0, AuditLog.objects.count())
+
+        self.writer.record("update", self.users[0], self.users[0])
+
+        self.assertEqual(5, AuditLog.objects.count())
+        self.assertEqual(0, self.writer.pending())
+
+    def test_timestamp_is_taken_when_recorded(self):
+        self.writer.record("create", self.users[1], self.users[0])
+        recorded = timezone.now()
+
+        self.writer.flush()
+
+        entry = AuditLog.objects.get()
+        self.assertLessEqual(entry.timestamp, recorded)
+        self.assertGreater(entry.timestamp, recorded - timedelta(seconds=5))
+        self.assertEqual("CustomUser", entry.model_name)
+        self.assertEqual(self.users[1].pk, entry.object_id)
+
+    def test_anonymous_user_is_not_attached(self):
+        self.writer.record("create", self.users[1], AnonymousUser())
+        self.writer.flush()
+
+        self.assertIsNone(AuditLog.objects.get().user)
+
+
+class AuditWriterTransactionTests(TestCase):
+    fixtures = ["accounts_users"]
+
+    def setUp(self):
+        self.writer = AuditWriter(max_batch=5, max_delay=None)
+        self.users = list(CustomUser.objects.order_by("pk"))
+
+    def test_entries_are_written_once_committed(self):
+        with self.captureOnCommitCallbacks() as callbacks:
+            for user in self.users:
+                self.writer.record("update", user, self.users[0])
+
+        self.assertEqual(0, AuditLog.objects.count())
+        self.assertEqual(0, self.writer.pending())
+        self.assertEqual(1, len(callbacks))
+
+        with self.assertNumQueries(1):
+            callbacks[0]()
+        self.assertEqual(4, AuditLog.objects.count())
+
+    def test_rolled_back_entries_are_dropped(self):
+        with self.captureOnCommitCallbacks(execute=True):
+            self.writer.record("create", self.users[0], self.users[0])
+            try:
+                with transaction.atomic():
+                    self.writer.record("delete", self.users[1], self.users[0])
+                    raise RuntimeError
+            except RuntimeError:
+                pass
+            self.writer.record("update", self.users[2], self.users[0])
+
+        self.assertEqual(
+            [("create", self.users[0].pk), ("update", self.users[2].pk)],
+            list(AuditLog.objects.order_by("pk").values_list("action", "object_id")),
+        )
+        self.assertEqual(0, self.writer.pending())
@@ -0,0 +1,16 @@
+from django.urls import path
+from rest_framework.urlpatterns import format_suffix_patterns
+
+from history import views
+
+urlpatterns = [
+    path("", views.AuditLogListView.as_view(), name="auditlog-list"),
+]
+
+urlpatterns = format_suffix_patterns(urlpatterns) + [
+    path(
+        "export.<str:export_format>",
+        views.AuditLogExportView.as_view(),
+        name="auditlog-export",
+    ),
+]
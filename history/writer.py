@@ -0,0 +1,163 @@
+import atexit
+import logging
+import threading
+
+from django.apps import apps
+from django.conf import settings
+from django.db import connections, transaction
+from django.utils import timezone
+
+
+logger = logging.getLogger(__name__)
+
+
+class PendingEntries:
+    """
+    Entries recorded inside a transaction, registered with
+    `transaction.on_commit` to be written when it commits. Django drops the
+    callback, and the entries with it, if the transaction or the savepoint
+    they were recorded in rolls back.
+    """
+
+    def __init__(self, writer):
+        self.writer = writer
+        self.entries = []
+
+    def __call__(self):
+        self.writer.write(self.entries)
+
+
+class AuditWriter:
+    """
+    Writes audit entries in batches with `bulk_create`.
+
+    Entries recorded inside a transaction are kept with it and written in
+    one INSERT once it commits. Those recorded in autocommit mode describe
+    changes already committed, and are buffered in memory until the buffer
+    reaches `max_batch` entries, `max_delay` seconds after the first one,
+    the end of each request (see `AuditMiddleware`) or the process exits.
+    """
+
+    def __init__(self, max_batch=100, max_delay=1.0):
+        self.max_batch = max_batch
+        self.max_delay = max_delay
+        self._buffer = []
+        self._lock = threading.Lock()
+        self._timer = None
+        self._model = None
+
+    def record(self, action, instance, user=None):
+        self.record_keys(action, instance.__class__.__name__, [instance.pk], user)
+
+    def record_many(self, action, instances, user=None):
+        for model_name, object_ids in self._group_by_model(instances).items():
+            self.record_keys(action, model_name, object_ids, user)
+
+    def record_keys(self, action, model_name, object_ids, user=None):
+        if user is not None and not user.is_authenticated:
+            user = None
+
+        audit_log_model = self.model
+        timestamp = timezone.now()
+        entries = [
+            audit_log_model(
+                action=action,
+                model_name=model_name,
+                object_id=object_id,
+                user=user,
+                timestamp=timestamp,
+            )
+            for object_id in object_ids
+        ]
+        if not entries:
+            return
+
+        connection = transaction.get_connection()
+        if connection.in_atomic_block:
+            self._pending_entries(connection).extend(entries)
+            return
+
+        with self._lock:
+            self._buffer.extend(entries)
+            full = len(self._buffer) >= self.max_batch
+            if not full and self._timer is None and self.max_delay is not None:
+                self._timer = threading.Timer(self.max_delay, self._flush_from_timer)
+                self._timer.daemon = True
+                self._timer.start()
+
+        if full:
+            self.flush()
+
+    def _pending_entries(self, connection):
+        """
+        The entries waiting for the current transaction to commit. The last
+        batch registered is reused while no savepoint has been entered or
+        left since, so a rollback drops exactly what it undid.
+        """
+        savepoints = set(connection.savepoint_ids)
+        for sids, callback, _ in reversed(connection.run_on_commit):
+            if isinstance(callback, PendingEntries) and callback.writer is self:
+                if sids == savepoints:
+                    return callback.entries
+                break
+        pending = PendingEntries(self)
+        transaction.on_commit(pending)
+        return pending.entries
+
+    @staticmethod
+    def _group_by_model(instances):
+        grouped = {}
+        for instance in instances:
+            grouped.setdefault(instance.__class__.__name__, []).append(instance.pk)
+        return grouped
+
+    @property
+    def model(self):
+        if self._model is None:
+            self._model = apps.get_model("history", "AuditLog")
+        return self._model
+
+    def write(self, entries):
+        if entries:
+            self.model.objects.bulk_create(entries, batch_size=self.max_batch)
+        return len(entries)
+
+    def flush(self):
+        with self._lock:
+            entries, self._buffer = self._buffer, []
+            if self._timer is not None:
+                self._timer.cancel()
+                self._timer = None
+
+        return self.write(entries)
+
+    def _flush_from_timer(self):
+        try:
+            self.flush()
+        except Exception:
+            logger.exception("Could not write buffered audit log entries")
+        finally:
+            connections.close_all()
+
+    def pending(self):
+        with self._lock:
+            return len(self._buffer)
+
+
+def _build_writer():
+    options = getattr(settings, "HISTORY_AUDIT_WRITER", {})
+    return AuditWriter(
+        max_batch=options.get("MAX_BATCH", 100),
+        max_delay=options.get("MAX_DELAY", 1.0),
+    )
+
+
+audit_writer = _build_writer()
+
+
+@atexit.register
+def _flush_on_exit():
+    try:
+        audit_writer.flush()
+    except Exception:
+        logger.exception("Could not write buffered audit log entries on exit")
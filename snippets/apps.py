@@ -4,3 +4,17 @@ from django.apps import AppConfig
 class SnippetsConfig(AppConfig):
     default_auto_field = "django.db.models.BigAutoField"
     name = "snippets"
+
+    def ready(self):
+        from django.db.models.signals import post_delete
+
+        from history.registry import register
+        from snippets.highlight_store import snippet_deleted
+        from tutorial.responsecache import invalidate_scope_on_write
+
+        snippet = self.get_model("Snippet")
+        register(snippet)
+        invalidate_scope_on_write(snippet, "snippets")
+        post_delete.connect(
+            snippet_deleted, sender=snippet, dispatch_uid="snippets.highlight_store"
+        )
@@ -0,0 +1,123 @@
+import functools
+import json
+import logging
+from pathlib import Path
+
+import pygments
+from django.core.exceptions import ValidationError
+
+logger = logging.getLogger(__name__)
+
+MANIFEST_PATH = Path(__file__).resolve().parent / "pygments_manifest.json"
+MANIFEST_FORMAT = 1
+
+
+def build_manifest():
+    """
+    Enumerate every installed lexer and style, plugins included. This imports
+    Pygments' lexer and style registries and scans the installed packages for
+    plugins, which is what the manifest saves each process from doing.
+    """
+    from pygments.lexers import get_all_lexers
+    from pygments.styles import get_all_styles
+
+    return {
+        "format": MANIFEST_FORMAT,
+        "pygments": pygments.__version__,
+        "languages": sorted(
+            [aliases[0], name] for name, aliases, *_ in get_all_lexers() if aliases
+        ),
+        "styles": sorted(get_all_styles()),
+    }
+
+
+def write_manifest(path=MANIFEST_PATH):
+    manifest = build_manifest()
+    # One language or style per line, so Pygments upgrades diff readably.
+    lines = []
+    for key, value in manifest.items():
+        if isinstance(value, list):
+            items = ",\n".join(f"  {json.dumps(item)}" for item in value)
+            lines.append(f" {json.dumps(key)}: [\n{items}\n ]")
+        else:
+            lines.append(f" {json.dumps(key)}: {json.dumps(value)}")
+    with open(path, "w") as stream:
+        stream.write("{\n" + ",\n".join(lines) + "\n}\n")
+    return manifest
+
+
+@functools.cache
+def load_manifest(path=MANIFEST_PATH):
+    """
+    The manifest generated by `manage.py build_pygments_manifest`, or a fresh
+    enumeration if it is missing or was built for another Pygments version.
+    """
+    try:
+        with open(path) as stream:
+            manifest = json.load(stream)
+    except (OSError, ValueError):
+        manifest = None
+
+    if (
+        manifest is None
+        or manifest.get("format") != MANIFEST_FORMAT
+        or manifest.get("pygments") != pygments.__version__
+    ):
+        logger.warning(
+            "%s is missing or out of date for Pygments %s; enumerating lexers "
+            "and styles instead. Run `manage.py build_pygments_manifest`.",
+            path,
+            pygments.__version__,
+        )
+        manifest = build_manifest()
+    return manifest
+
+
+@functools.cache
+def language_names():
+    return frozenset(alias for alias, _ in load_manifest()["languages"])
+
+
+@functools.cache
+def style_names():
+    return frozenset(load_manifest()["styles"])
+
+
+def _check_choice(value, names):
+    if value not in names():
+        raise ValidationError(
+            '"%(value)s" is not a valid choice.',
+            code="invalid_choice",
+            params={"value": value},
+        )
+
+
+def validate_language(value):
+    _check_choice(value, language_names)
+
+
+def validate_style(value):
+    _check_choice(value, style_names)
+
+
+@functools.cache
+def catalog_json():
+    """
+    The languages and styles snippets accept, encoded once per process.
+    """
+    manifest = load_manifest()
+    return json.dumps(
+        {
+            "pygments": manifest["pygments"],
+            "languages": [
+                {"alias": alias, "name": name} for alias, name in manifest["languages"]
+            ],
+            "styles": manifest["styles"],
+        },
+        separators=(",", ":"),
+    )
+
+
+def catalog_etag():
+    manifest = load_manifest()
+    return f'"{manifest["format"]}-{manifest["pygments"]}"'
@@ -0,0 +1,107 @@
+import os
+import re
+import uuid
+from contextlib import contextmanager
+from pathlib import Path
+
+from django.conf import settings
+from django.db import transaction
+
+
+def size_limits():
+    options = {
+        "MAX_CODE_SIZE": 4 * 1024 * 1024,
+        "STREAM_THRESHOLD": 256 * 1024,
+        "DIRECTORY": settings.BASE_DIR / "highlight_store",
+    }
+    options.update(getattr(settings, "SNIPPETS_SIZE_LIMITS", {}))
+    return options
+
+
+def store_directory():
+    return Path(size_limits()["DIRECTORY"])
+
+
+def code_size(code):
+    return len(code.encode("utf-8"))
+
+
+def is_large(code):
+    """
+    Whether `code` is highlighted into the file store instead of the
+    database. Characters are at most 4 bytes, so most pastes are decided
+    without encoding them.
+    """
+    threshold = size_limits()["STREAM_THRESHOLD"]
+    if threshold is None or len(code) * 4 <= threshold:
+        return False
+    return len(code) > threshold or code_size(code) > threshold
+
+
+# The names `write_highlight_file` generates; nothing else is read or deleted.
+STORE_NAME = re.compile(r"[0-9a-f]{32}\.html")
+
+
+def highlight_path(name):
+    if not STORE_NAME.fullmatch(name):
+        raise ValueError(f"{name!r} is not a highlight store file name.")
+    return store_directory() / name
+
+
+def write_highlight_file(write):
+    """
+    Create a new file in the store, let `write(stream)` fill it and return
+    its name. The file only appears under that name once it is complete.
+    """
+    directory = store_directory()
+    directory.mkdir(parents=True, exist_ok=True)
+    name = f"{uuid.uuid4().hex}.html"
+    partial = directory / f"{name}.partial"
+    try:
+        with open(partial, "w", encoding="utf-8") as stream:
+            write(stream)
+        os.replace(partial, directory / name)
+    except BaseException:
+        partial.unlink(missing_ok=True)
+        raise
+    return name
+
+
+def delete_highlight_files(names):
+    for name in names:
+        if name and STORE_NAME.fullmatch(name):
+            highlight_path(name).unlink(missing_ok=True)
+
+
+@contextmanager
+def new_highlight_files(snippets):
+    """
+    Guard rendering `snippets` again and writing them: if anything fails,
+    delete the highlight files the renders wrote, since no row refers to
+    them. Files left by a transaction rolled back further out are removed
+    by `manage.py sweep_highlight_store`.
+    """
+    replaced = {snippet.highlight_file for snippet in snippets}
+    try:
+        yield
+    except BaseException:
+        delete_highlight_files(
+            snippet.highlight_file
+            for snippet in snippets
+            if snippet.highlight_file not in replaced
+        )
+        raise
+
+
+def discard_highlight_files(names):
+    """
+    Delete replaced highlight files once the transaction replacing them has
+    committed.
+    """
+    names = [name for name in names if name]
+    if names:
+        transaction.on_commit(lambda: delete_highlight_files(names))
+
+
+def snippet_deleted(sender, instance, **kwargs):
+    discard_highlight_files([instance.highlight_file])
@@ -0,0 +1,341 @@
+import gzip
+import hashlib
+import threading
+from concurrent.futures import ProcessPoolExecutor
+
+from django.conf import settings
+from django.core.cache import caches
+from django.utils.html import escape
+from pygments import highlight
+from pygments.formatters.html import (
+    CSSFILE_TEMPLATE,
+    DOC_FOOTER,
+    DOC_HEADER_EXTERNALCSS,
+    HtmlFormatter,
+)
+from pygments.lexers import get_lexer_by_name
+
+from tutorial.caching import LRUCache
+
+
+def highlight_key(code, language, style, linenos):
+    """
+    Content address of a rendered snippet: every input that changes the
+    generated HTML is part of the digest, so identical pastes share an entry.
+    """
+    digest = hashlib.sha256()
+    for part in (language, style, "1" if linenos else "0", code):
+        digest.update(part.encode("utf-8"))
+        digest.update(b"\0")
+    return digest.hexdigest()
+
+
+class HighlightCache:
+    """
+    Two tier cache for rendered snippets: a bounded in-process LRU in front
+    of an optional shared Django cache backend.
+    """
+
+    def __init__(
+        self,
+        max_entries=256,
+        max_entry_size=512 * 1024,
+        backend=None,
+        timeout=None,
+        key_prefix="snippets:highlight:",
+    ):
+        self.local = LRUCache(max_entries)
+        self.max_entry_size = max_entry_size
+        self.backend = backend
+        self.timeout = timeout
+        self.key_prefix = key_prefix
+
+    def get(self, key):
+        value = self.local.get(key)
+        if value is None and self.backend is not None:
+            value = self.backend.get(self.key_prefix + key)
+            if value is not None:
+                self.local.set(key, value)
+        return value
+
+    def set(self, key, value):
+        # Very large renders would evict most of the LRU on their own.
+        if len(value) > self.max_entry_size:
+            return
+
+        self.local.set(key, value)
+        if self.backend is not None:
+            self.backend.set(self.key_prefix + key, value, self.timeout)
+
+    def clear(self):
+        self.local.clear()
+
+
+_cache = None
+
+
+def get_highlight_cache():
+    global _cache
+
+    if _cache is None:
+        options = getattr(settings, "SNIPPETS_HIGHLIGHT_CACHE", {})
+        backend = options.get("BACKEND")
+        _cache = HighlightCache(
+            max_entries=options.get("MAX_ENTRIES", 256),
+            max_entry_size=options.get("MAX_ENTRY_SIZE", 512 * 1024),
+            backend=caches[backend] if backend else None,
+            timeout=options.get("TIMEOUT"),
+        )
+    return _cache
+
+
+def cached_highlight(code, language, style, linenos):
+    """
+    Return a previous render of identical input, or None without lexing.
+    """
+    key = highlight_key(code, language, style, linenos)
+    return get_highlight_cache().get(key)
+
+
+def render_highlight(code, language, style, linenos):
+    """
+    Use the `pygments` library to create the highlighted HTML body of the
+    code, reusing a previous render of identical input when possible.
+
+    Only the `<div class="highlight">` fragment is produced; the stylesheet
+    and the surrounding document are added by `render_document`.
+    """
+    cache = get_highlight_cache()
+    key = highlight_key(code, language, style, linenos)
+
+    highlighted = cache.get(key)
+    if highlighted is None:
+        highlighted = _render(code, language, style, linenos)
+        cache.set(key, highlighted)
+    return highlighted
+
+
+class HitCounter:
+    def __init__(self):
+        self.hits = 0
+        self.misses = 0
+
+    def as_dict(self):
+        total = self.hits + self.misses
+        return {
+            "hits": self.hits,
+            "misses": self.misses,
+            "hit_rate": self.hits / total if total else None,
+        }
+
+
+class RenderEngine:
+    """
+    Keeps what Pygments would otherwise rebuild for every render: idle lexer
+    instances per language, one formatter per (style, linenos) and one style
+    sheet per style, so a render is just tokenizing and formatting.
+
+    Formatters are never modified after construction and are shared between
+    threads. A lexer is used by one render at a time; at most
+    `lexers_per_language` idle instances are kept.
+    """
+
+    def __init__(self, lexers_per_language=4):
+        self.lexers_per_language = lexers_per_language
+        self._lexers = {}
+        self._formatters = {}
+        self._style_sheets = {}
+        self._counters = {
+            "lexers": HitCounter(),
+            "formatters": HitCounter(),
+            "style_sheets": HitCounter(),
+        }
+        self._lock = threading.Lock()
+
+    def _count(self, name, hit):
+        counter = self._counters[name]
+        if hit:
+            counter.hits += 1
+        else:
+            counter.misses += 1
+
+    def acquire_lexer(self, language):
+        with self._lock:
+            idle = self._lexers.get(language)
+            lexer = idle.pop() if idle else None
+            self._count("lexers", lexer is not None)
+        return lexer if lexer is not None else get_lexer_by_name(language)
+
+    def release_lexer(self, language, lexer):
+        with self._lock:
+            idle = self._lexers.setdefault(language, [])
+            if len(idle) < self.lexers_per_language:
+                idle.append(lexer)
+
+    def formatter(self, style, linenos):
+        """
+        `linenos` is True for the usual table of line numbers, or
+        "inline" for numbers inside the code, which formats line by line.
+        """
+        mode = "table" if linenos is True else linenos or False
+        key = (style, mode)
+        with self._lock:
+            formatter = self._formatters.get(key)
+            self._count("formatters", formatter is not None)
+        if formatter is None:
+            formatter = HtmlFormatter(style=style, linenos=mode)
+            with self._lock:
+                formatter = self._formatters.setdefault(key, formatter)
+        return formatter
+
+    def style_css(self, style):
+        with self._lock:
+            css = self._style_sheets.get(style)
+            self._count("style_sheets", css is not None)
+        if css is None:
+            css = CSSFILE_TEMPLATE % {
+                "styledefs": HtmlFormatter(style=style).get_style_defs("body")
+            }
+            with self._lock:
+                css = self._style_sheets.setdefault(style, css)
+        return css
+
+    def render(self, code, language, style, linenos, outfile=None):
+        """
+        The highlighted HTML, or None after writing it to `outfile` as it is
+        produced.
+        """
+        formatter = self.formatter(style, linenos)
+        lexer = self.acquire_lexer(language)
+        try:
+            return highlight(code, lexer, formatter, outfile)
+        finally:
+            self.release_lexer(language, lexer)
+
+    def stats(self):
+        with self._lock:
+            stats = {
+                name: counter.as_dict() for name, counter in self._counters.items()
+            }
+            stats["lexers"]["idle"] = sum(len(idle) for idle in self._lexers.values())
+            stats["formatters"]["size"] = len(self._formatters)
+            stats["style_sheets"]["size"] = len(self._style_sheets)
+        return stats
+
+
+_engine = None
+_engine_lock = threading.Lock()
+
+
+def get_render_engine():
+    global _engine
+
+    with _engine_lock:
+        if _engine is None:
+            options = getattr(settings, "SNIPPETS_RENDER_ENGINE", {})
+            _engine = RenderEngine(
+                lexers_per_language=options.get("LEXERS_PER_LANGUAGE", 4)
+            )
+    return _engine
+
+
+def _render(code, language, style, linenos):
+    return get_render_engine().render(code, language, style, linenos)
+
+
+_pool = None
+_pool_lock = threading.Lock()
+
+
+def _bulk_options():
+    return getattr(settings, "SNIPPETS_BULK", {})
+
+
+def get_render_pool():
+    global _pool
+
+    with _pool_lock:
+        if _pool is None:
+            _pool = ProcessPoolExecutor(
+                max_workers=_bulk_options().get("HIGHLIGHT_PROCESSES")
+            )
+    return _pool
+
+
+def render_many(items):
+    """
+    Render a list of (code, language, style, linenos) tuples. Cache hits and
+    repeated inputs are rendered once; with enough misses left they are
+    spread over a process pool, since lexing holds the GIL.
+    """
+    cache = get_highlight_cache()
+    keys = [highlight_key(*item) for item in items]
+    rendered = {}
+    misses = {}
+    for key, item in zip(keys, items):
+        if key in rendered or key in misses:
+            continue
+        highlighted = cache.get(key)
+        if highlighted is None:
+            misses[key] = item
+        else:
+            rendered[key] = highlighted
+
+    if len(misses) >= _bulk_options().get("PARALLEL_THRESHOLD", 8):
+        results = get_render_pool().map(_render, *zip(*misses.values()))
+    else:
+        results = (_render(*item) for item in misses.values())
+
+    for key, highlighted in zip(misses, results):
+        cache.set(key, highlighted)
+        rendered[key] = highlighted
+    return [rendered[key] for key in keys]
+
+
+def plain_highlight(code):
+    """
+    `code` escaped but not highlighted, in the markup Pygments produces, for
+    snippets whose render keeps failing.
+    """
+    return f'<div class="highlight"><pre>{escape(code)}</pre></div>\n'
+
+
+def style_css(style):
+    return get_render_engine().style_css(style)
+
+
+def document_header(title, css_url):
+    return DOC_HEADER_EXTERNALCSS % {
+        "title": escape(title),
+        "cssfile": css_url,
+        "encoding": "utf-8",
+    }
+
+
+def render_document(body, title, css_url):
+    """
+    Wrap a highlighted body in the standalone page previously generated by
+    `HtmlFormatter(full=True)`, linking the style sheet instead of inlining it.
+    """
+    return document_header(title, css_url) + body + DOC_FOOTER
+
+
+def stream_document(stream, code, language, style, linenos, title, css_url):
+    """
+    Write the page `render_document` would build straight to `stream`,
+    formatting line by line so memory stays flat however large `code` is.
+    Line numbers are inline, since a table of them is built in memory.
+    """
+    stream.write(document_header(title, css_url))
+    get_render_engine().render(
+        code, language, style, "inline" if linenos else False, outfile=stream
+    )
+    stream.write(DOC_FOOTER)
+
+
+def compress_document(document):
+    """
+    Gzip a highlight page once, when it is rendered, for clients that accept
+    it. `mtime=0` keeps the bytes, and so the ETag, stable.
+    """
+    return gzip.compress(document.encode("utf-8"), compresslevel=9, mtime=0)
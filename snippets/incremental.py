@@ -0,0 +1,644 @@
+import bisect
+import functools
+import io
+import json
+import re
+from re import _parser as sre_parse
+
+import pygments
+from django.conf import settings
+from pygments.formatters.html import HtmlFormatter
+from pygments.lexer import RegexLexer
+from pygments.token import Error, Whitespace, _TokenType
+
+from snippets.highlighting import (
+    get_highlight_cache,
+    get_render_engine,
+    highlight_key,
+    render_highlight,
+)
+
+STATES_FORMAT = 2
+
+# Past this many open constructs a snippet is always rendered in full.
+MAX_OPENS = 1000
+
+
+def options():
+    options = {"ENABLED": True, "MIN_LINES": 500, "CHECKPOINT_INTERVAL": 32}
+    options.update(getattr(settings, "SNIPPETS_INCREMENTAL_HIGHLIGHT", {}))
+    return options
+
+
+class LineFormatter(HtmlFormatter):
+    """
+    An `HtmlFormatter` that formats tokens into a list of lines, and wraps a
+    list of formatted lines the way `highlight` would have wrapped them.
+
+    `HtmlFormatter` closes and reopens its spans at every line break, so the
+    HTML of a line only depends on the tokens on that line.
+    """
+
+    def format_lines(self, tokens):
+        return [line for _, line in HtmlFormatter._format_lines(self, tokens)]
+
+    def _format_lines(self, lines):
+        for line in lines:
+            yield 1, line
+
+    def wrap_lines(self, lines):
+        outfile = io.StringIO()
+        self.format(lines, outfile)
+        return outfile.getvalue()
+
+    def unwrap_lines(self, highlighted, count):
+        """
+        Split the output of `wrap_lines` for `count` lines back into lines,
+        or return None if `highlighted` was not wrapped that way.
+        """
+        marker = "\0"
+        wrapped = self.wrap_lines([marker] * count)
+        prefix = wrapped[: wrapped.index(marker)]
+        suffix = wrapped[wrapped.rindex(marker) + 1 :]
+        if not (
+            len(highlighted) >= len(prefix) + len(suffix)
+            and highlighted.startswith(prefix)
+            and highlighted.endswith(suffix)
+        ):
+            return None
+
+        body = highlighted[len(prefix) : len(highlighted) - len(suffix)]
+        if not body.endswith("\n") or body.count("\n") != count:
+            return None
+        return split_lines(body)
+
+
+@functools.cache
+def line_formatter(style, linenos):
+    return LineFormatter(style=style, linenos="table" if linenos else False)
+
+
+_CHARACTERS = (sre_parse.LITERAL, sre_parse.NOT_LITERAL, sre_parse.ANY, sre_parse.IN)
+_REPEATS = (sre_parse.MAX_REPEAT, sre_parse.MIN_REPEAT, sre_parse.POSSESSIVE_REPEAT)
+_NEWLINE_CATEGORIES = {
+    sre_parse.CATEGORY_SPACE,
+    sre_parse.CATEGORY_NOT_DIGIT,
+    sre_parse.CATEGORY_NOT_WORD,
+    sre_parse.CATEGORY_LINEBREAK,
+}
+_CATEGORY_SOURCE = {
+    sre_parse.CATEGORY_DIGIT: r"\d",
+    sre_parse.CATEGORY_NOT_DIGIT: r"\D",
+    sre_parse.CATEGORY_SPACE: r"\s",
+    sre_parse.CATEGORY_NOT_SPACE: r"\S",
+    sre_parse.CATEGORY_WORD: r"\w",
+    sre_parse.CATEGORY_NOT_WORD: r"\W",
+}
+_AT_SOURCE = {
+    sre_parse.AT_BEGINNING: "^",
+    sre_parse.AT_BEGINNING_STRING: r"\A",
+    sre_parse.AT_END: "$",
+    sre_parse.AT_END_STRING: r"\Z",
+    sre_parse.AT_BOUNDARY: r"\b",
+    sre_parse.AT_NON_BOUNDARY: r"\B",
+}
+_FLAG_SOURCE = {re.IGNORECASE: "i", re.MULTILINE: "m", re.DOTALL: "s", re.VERBOSE: "x"}
+
+
+def _matches_newline(op, av, flags):
+    if op is sre_parse.LITERAL:
+        return av == 10
+    if op is sre_parse.NOT_LITERAL:
+        return av != 10
+    if op is sre_parse.ANY:
+        return bool(flags & re.DOTALL)
+    negate = False
+    found = False
+    for item_op, item in av:
+        if item_op is sre_parse.NEGATE:
+            negate = True
+        elif item_op is sre_parse.LITERAL:
+            found = found or item == 10
+        elif item_op is sre_parse.RANGE:
+            found = found or item[0] <= 10 <= item[1]
+        elif item_op is sre_parse.CATEGORY:
+            found = found or item in _NEWLINE_CATEGORIES
+        else:
+            found = True
+    return found != negate
+
+
+def _scan(nodes, flags):
+    """
+    Whether a parsed pattern can run on over any number of lines, and how
+    many line breaks it reads otherwise, lookarounds included.
+    """
+    far = False
+    newlines = 0
+    for op, av in nodes:
+        if op in _CHARACTERS:
+            newlines += _matches_newline(op, av, flags)
+        elif op in _REPEATS:
+            low, high, item = av
+            item_far, item_newlines = _scan(item, flags)
+            far = far or item_far or (item_newlines and high == sre_parse.MAXREPEAT)
+            newlines += item_newlines * (0 if high == sre_parse.MAXREPEAT else high)
+        elif op is sre_parse.SUBPATTERN:
+            _, add_flags, del_flags, item = av
+            item_far, item_newlines = _scan(item, (flags | add_flags) & ~del_flags)
+            far = far or item_far
+            newlines += item_newlines
+        elif op is sre_parse.BRANCH:
+            scans = [_scan(item, flags) for item in av[1]]
+            far = far or any(item_far for item_far, _ in scans)
+            newlines += max(item_newlines for _, item_newlines in scans)
+        elif op in (sre_parse.ASSERT, sre_parse.ASSERT_NOT):
+            item_far, item_newlines = _scan(av[1], flags)
+            far = far or item_far
+            newlines += item_newlines
+        elif op is sre_parse.ATOMIC_GROUP:
+            item_far, item_newlines = _scan(av, flags)
+            far = far or item_far
+            newlines += item_newlines
+        elif op in (sre_parse.GROUPREF, sre_parse.GROUPREF_EXISTS):
+            far = True
+    return far, newlines
+
+
+def _flags_source(flags):
+    if flags & ~sum(_FLAG_SOURCE):
+        raise ValueError(f"Unsupported flags {flags}")
+    return "".join(letter for flag, letter in _FLAG_SOURCE.items() if flags & flag)
+
+
+def _character_source(op, av):
+    if op is sre_parse.LITERAL:
+        return re.escape(chr(av))
+    if op is sre_parse.NOT_LITERAL:
+        return f"[^{re.escape(chr(av))}]"
+    if op is sre_parse.ANY:
+        return "."
+    items = []
+    for item_op, item in av:
+        if item_op is sre_parse.NEGATE:
+            items.append("^")
+        elif item_op is sre_parse.LITERAL:
+            items.append(re.escape(chr(item)))
+        elif item_op is sre_parse.RANGE:
+            items.append(f"{re.escape(chr(item[0]))}-{re.escape(chr(item[1]))}")
+        else:
+            items.append(_CATEGORY_SOURCE[item])
+    return f"[{''.join(items)}]"
+
+
+def _source(nodes):
+    """Regular expression source for a parsed pattern, without its groups."""
+    source = []
+    for op, av in nodes:
+        if op in _CHARACTERS:
+            source.append(_character_source(op, av))
+        elif op is sre_parse.AT:
+            source.append(_AT_SOURCE[av])
+        elif op in _REPEATS:
+            low, high, item = av
+            high = "" if high == sre_parse.MAXREPEAT else high
+            suffix = {sre_parse.MIN_REPEAT: "?", sre_parse.POSSESSIVE_REPEAT: "+"}
+            source.append(f"(?:{_source(item)}){{{low},{high}}}{suffix.get(op, '')}")
+        elif op is sre_parse.SUBPATTERN:
+            _, add_flags, del_flags, item = av
+            flags = _flags_source(add_flags)
+            if del_flags:
+                flags += "-" + _flags_source(del_flags)
+            source.append(f"(?{flags}:{_source(item)})")
+        elif op is sre_parse.BRANCH:
+            source.append(f"(?:{'|'.join(_source(item) for item in av[1])})")
+        elif op in (sre_parse.ASSERT, sre_parse.ASSERT_NOT):
+            direction, item = av
+            kind = "=" if op is sre_parse.ASSERT else "!"
+            source.append(f"(?{'' if direction == 1 else '<'}{kind}{_source(item)})")
+        elif op is sre_parse.ATOMIC_GROUP:
+            source.append(f"(?>{_source(av)})")
+        else:
+            raise ValueError(f"Unsupported regular expression operator {op}")
+    return "".join(source)
+
+
+def _crossing(nodes, flags):
+    """
+    Regular expression source that matches where a parsed pattern could get
+    as far as a line break in one of its repeats, read by that repeat: the
+    start of an attempt that may only fail for want of text on later lines,
+    like an unclosed `/*` for `/\\*.*?\\*/`. Empty where that can't be told.
+    """
+    alternatives = []
+    for index, (op, av) in enumerate(nodes):
+        if not _scan([(op, av)], flags)[0]:
+            continue
+        if op in _REPEATS:
+            item = av[2]
+            repeat = f"(?:{_source(item)})*?"
+            if _scan(item, flags)[0]:
+                crossing = repeat + _crossing(item, flags)
+            else:
+                crossing = f"{repeat}(?:(?=\\n)(?:{_source(item)})|(?:{_source(item)})(?<=\\n))"
+        elif op is sre_parse.SUBPATTERN:
+            _, add_flags, del_flags, item = av
+            crossing = _crossing(item, (flags | add_flags) & ~del_flags)
+            inline = _flags_source(add_flags)
+            if del_flags:
+                inline += "-" + _flags_source(del_flags)
+            crossing = f"(?{inline}:{crossing})"
+        elif op is sre_parse.BRANCH:
+            crossing = "|".join(
+                f"(?:{_crossing(item, flags)})"
+                for item in av[1]
+                if _scan(item, flags)[0]
+            )
+        elif op is sre_parse.ATOMIC_GROUP:
+            crossing = _crossing(av, flags)
+        else:
+            crossing = ""
+        alternatives.append(f"{_source(nodes[:index])}(?:{crossing})")
+    return "|".join(f"(?:{alternative})" for alternative in alternatives)
+
+
+class LexerProfile:
+    """
+    A `RegexLexer`'s rules, each with a probe if it can run on over many
+    lines, and `reach`, the most line breaks any rule reads otherwise.
+    """
+
+    def __init__(self, tokendefs):
+        self.rules = {}
+        self.reach = 0
+        for state, rules in tokendefs.items():
+            profiled = []
+            for index, (rexmatch, action, new_state) in enumerate(rules):
+                pattern = rexmatch.__self__
+                nodes = sre_parse.parse(pattern.pattern, pattern.flags)
+                far, newlines = _scan(nodes, nodes.state.flags)
+                probe = None
+                if far:
+                    crossing = _crossing(nodes, nodes.state.flags)
+                    probe = (
+                        state,
+                        index,
+                        re.compile(crossing, pattern.flags).match,
+                    )
+                self.reach = max(self.reach, newlines)
+                profiled.append((rexmatch, action, new_state, probe))
+            self.rules[state] = profiled
+
+    def rule(self, state, index):
+        return self.rules[state][index][0]
+
+
+@functools.cache
+def lexer_profile(lexer_class):
+    try:
+        return LexerProfile(lexer_class._tokens)
+    except (AttributeError, KeyError, TypeError, ValueError, re.error):
+        return None
+
+
+def get_profile(lexer):
+    """
+    The profile of a lexer whose lexing can be resumed from a recorded state:
+    a plain `RegexLexer` only carries its state stack from one token to the
+    next.
+    """
+    if (
+        isinstance(lexer, RegexLexer)
+        and type(lexer).get_tokens_unprocessed is RegexLexer.get_tokens_unprocessed
+        and lexer.ensurenl
+        and not lexer.filters
+    ):
+        return lexer_profile(type(lexer))
+    return None
+
+
+def lex(profile, lexer, text, pos, stack, opens):
+    """
+    `RegexLexer.get_tokens_unprocessed` starting at `pos` of `text` rather
+    than at the start of a substring, so lookbehinds still see what precedes
+    it. Yields (token type, value) pairs, and (None, (pos, stack)) whenever a
+    token ends at the start of a line. Appends (pos, state, index) to `opens`
+    for every attempt of a rule that may be an unfinished construct.
+    """
+    rules = profile.rules
+    statestack = list(stack)
+    staterules = rules[statestack[-1]]
+    boundary = pos
+    while True:
+        for rexmatch, action, new_state, probe in staterules:
+            m = rexmatch(text, pos)
+            if m:
+                if action is not None:
+                    if type(action) is _TokenType:
+                        yield action, m.group()
+                    else:
+                        for _, ttype, value in action(lexer, m):
+                            yield ttype, value
+                pos = m.end()
+                if new_state is not None:
+                    if isinstance(new_state, tuple):
+                        for state in new_state:
+                            if state == "#pop":
+                                if len(statestack) > 1:
+                                    statestack.pop()
+                            elif state == "#push":
+                                statestack.append(statestack[-1])
+                            else:
+                                statestack.append(state)
+                    elif isinstance(new_state, int):
+                        if abs(new_state) >= len(statestack):
+                            del statestack[1:]
+                        else:
+                            del statestack[new_state:]
+                    elif new_state == "#push":
+                        statestack.append(statestack[-1])
+                    staterules = rules[statestack[-1]]
+                break
+            if probe is not None and probe[2](text, pos):
+                opens.append((pos, probe[0], probe[1]))
+        else:
+            if pos >= len(text):
+                break
+            if text[pos] == "\n":
+                statestack = ["root"]
+                staterules = rules["root"]
+                yield Whitespace, "\n"
+            else:
+                yield Error, text[pos]
+            pos += 1
+
+        # Zero width matches may change the state again at the same place;
+        # the first state seen there is the one lexing resumes from.
+        if pos > boundary and text[pos - 1] == "\n":
+            boundary = pos
+            yield None, (pos, tuple(statestack))
+
+
+def split_lines(text):
+    """Lines of preprocessed lexer input, which always ends with a newline."""
+    return [line + "\n" for line in text.split("\n")[:-1]]
+
+
+def line_offsets(lines):
+    offsets = [0]
+    for line in lines[:-1]:
+        offsets.append(offsets[-1] + len(line))
+    return offsets
+
+
+class Checkpoints:
+    """
+    Lexer states at the start of some lines, recorded at least `interval`
+    lines apart while lexing, and the open constructs seen on the way.
+    Stored as JSON alongside the render: {"format", "pygments",
+    "lines": [[line, stack index], ...], "stacks", "opens": [[pos, state,
+    rule index], ...]}.
+    """
+
+    def __init__(self, interval, lines=None, opens=None):
+        self.interval = interval
+        self.lines = dict(lines or ())
+        self.opens = list(opens or ())
+        self.next_line = 0
+
+    @classmethod
+    def from_json(cls, states, interval):
+        if (
+            not states
+            or states.get("format") != STATES_FORMAT
+            or states.get("pygments") != pygments.__version__
+        ):
+            return None
+        stacks = [tuple(stack) for stack in states["stacks"]]
+        return cls(
+            interval,
+            ((line, stacks[index]) for line, index in states["lines"]),
+            (tuple(opening) for opening in states["opens"]),
+        )
+
+    def to_json(self):
+        if len(self.opens) > MAX_OPENS:
+            return None
+        stacks = {}
+        lines = []
+        for line, stack in sorted(self.lines.items()):
+            lines.append([line, stacks.setdefault(stack, len(stacks))])
+        return {
+            "format": STATES_FORMAT,
+            "pygments": pygments.__version__,
+            "lines": lines,
+            "stacks": [list(stack) for stack in stacks],
+            "opens": [list(opening) for opening in self.opens],
+        }
+
+    def record(self, line, stack):
+        if line >= self.next_line:
+            self.lines[line] = stack
+            self.next_line = line + self.interval
+
+    def before(self, line):
+        """The last checkpoint before `line`."""
+        candidates = [checkpoint for checkpoint in self.lines if checkpoint < line]
+        return max(candidates, default=0 if 0 in self.lines else None)
+
+
+def run_lexer(profile, lexer, text, offsets, start, stack, checkpoints, resync=None):
+    """
+    Lex `text` from line `start` in state `stack`, recording checkpoints.
+    Returns the tokens and the line lexing stopped at: the end, or the first
+    line for which `resync(line, stack)` is true.
+    """
+    tokens = []
+    checkpoints.next_line = start
+    checkpoints.record(start, stack)
+    for ttype, value in lex(
+        profile, lexer, text, offsets[start], stack, checkpoints.opens
+    ):
+        if ttype is not None:
+            tokens.append((ttype, value))
+            continue
+        pos, stack = value
+        if pos >= len(text):
+            break
+        line = bisect.bisect_right(offsets, pos) - 1
+        if resync is not None and resync(line, stack):
+            return tokens, line
+        checkpoints.record(line, stack)
+    return tokens, len(offsets)
+
+
+def states_key(key, interval):
+    """
+    Cache key of the lexer states, checkpointed every `interval` lines, of
+    the render cached under `key`.
+    """
+    return f"states:{STATES_FORMAT}:{interval}:{key}"
+
+
+def highlight_tracked(code, language, style, linenos):
+    """
+    Render `code` like `render_highlight`, also returning the lexer states
+    `rehighlight` resumes from, or None for snippets too short to need them
+    and lexers that can't be resumed. The states are cached next to the
+    render, so identical pastes are not lexed again.
+    """
+    incremental = options()
+    if not incremental["ENABLED"] or code.count("\n") + 1 < incremental["MIN_LINES"]:
+        return render_highlight(code, language, style, linenos), None
+
+    cache = get_highlight_cache()
+    key = highlight_key(code, language, style, linenos)
+    highlighted = cache.get(key)
+    interval = incremental["CHECKPOINT_INTERVAL"]
+    states = cache.get(states_key(key, interval))
+    if highlighted is not None and states is not None:
+        return highlighted, json.loads(states)
+
+    engine = get_render_engine()
+    lexer = engine.acquire_lexer(language)
+    try:
+        profile = get_profile(lexer)
+        if profile is None:
+            return render_highlight(code, language, style, linenos), None
+
+        text = lexer._preprocess_lexer_input(code)
+        offsets = line_offsets(split_lines(text))
+        checkpoints = Checkpoints(interval)
+        tokens, _ = run_lexer(profile, lexer, text, offsets, 0, ("root",), checkpoints)
+    finally:
+        engine.release_lexer(language, lexer)
+
+    formatter = line_formatter(style, linenos)
+    highlighted = formatter.wrap_lines(formatter.format_lines(tokens))
+    states = checkpoints.to_json()
+    cache.set(key, highlighted)
+    cache.set(states_key(key, interval), json.dumps(states))
+    return highlighted, states
+
+
+def rehighlight(previous, code, language, style, linenos):
+    """
+    Update a previous render after an edit instead of lexing all of `code`.
+
+    `previous` is the (code, language, style, linenos, highlighted, states)
+    of the last render. Lexing resumes from the last checkpoint before the
+    first changed line, or before the first construct left open earlier
+    that the new text closes (a `/*` that now has its `*/`), and stops at
+    a checkpoint after the last changed line once it reaches the state
+    recorded there; every line past that point tokenizes exactly as before,
+    so its HTML is kept.
+
+    Returns (highlighted, states), or None when a full render is needed.
+    The result isn't cached: a full render is the reference for identical
+    pastes.
+    """
+    incremental = options()
+    if previous is None or not incremental["ENABLED"]:
+        return None
+    old_code, old_language, old_style, old_linenos, old_highlighted, states = previous
+    if (old_language, old_style, bool(old_linenos)) != (language, style, bool(linenos)):
+        return None
+    checkpoints = Checkpoints.from_json(states, incremental["CHECKPOINT_INTERVAL"])
+    if checkpoints is None or not old_highlighted:
+        return None
+    if old_code == code:
+        return old_highlighted, states
+
+    engine = get_render_engine()
+    lexer = engine.acquire_lexer(language)
+    try:
+        profile = get_profile(lexer)
+        if profile is None:
+            return None
+        old_text = lexer._preprocess_lexer_input(old_code)
+        old_lines = split_lines(old_text)
+        text = lexer._preprocess_lexer_input(code)
+        lines = split_lines(text)
+        if lines == old_lines:
+            return old_highlighted, states
+
+        # The changed lines are old_lines[first:old_end] and lines[first:end].
+        limit = min(len(old_lines), len(lines))
+        first = 0
+        while first < limit and old_lines[first] == lines[first]:
+            first += 1
+        unchanged = 0
+        while (
+            unchanged < limit - first
+            and old_lines[-1 - unchanged] == lines[-1 - unchanged]
+        ):
+            unchanged += 1
+        end = len(lines) - unchanged
+        shift = len(lines) - len(old_lines)
+
+        formatter = line_formatter(style, linenos)
+        old_html = formatter.unwrap_lines(old_highlighted, len(old_lines))
+        if old_html is None:
+            return None
+
+        # Keep clear of the lines that rules read past their own line.
+        margin = max(1, profile.reach)
+        offsets = line_offsets(lines)
+        start = checkpoints.before(first - margin + 1)
+        if start is None:
+            return None
+        try:
+            closed = [
+                pos
+                for pos, state, index in checkpoints.opens
+                if pos < offsets[start] and profile.rule(state, index)(text, pos)
+            ]
+        except (KeyError, IndexError):
+            return None
+        if closed:
+            start = checkpoints.before(bisect.bisect_right(offsets, min(closed)))
+            if start is None:
+                return None
+
+        def resync(line, stack):
+            return line >= end + margin and checkpoints.lines.get(line - shift) == stack
+
+        relexed = Checkpoints(checkpoints.interval)
+        tokens, stop = run_lexer(
+            profile,
+            lexer,
+            text,
+            offsets,
+            start,
+            checkpoints.lines[start],
+            relexed,
+            resync,
+        )
+    finally:
+        engine.release_lexer(language, lexer)
+
+    html = formatter.format_lines(tokens)
+    if len(html) != stop - start:
+        return None
+    html = old_html[:start] + html + old_html[stop - shift :]
+
+    updated = Checkpoints(checkpoints.interval)
+    for line, stack in checkpoints.lines.items():
+        if line < start:
+            updated.lines[line] = stack
+        elif line >= stop - shift:
+            updated.lines[line + shift] = stack
+    updated.lines.update(relexed.lines)
+
+    resumed = line_offsets(old_lines)[stop - shift] if stop < len(lines) else None
+    moved = len(text) - len(old_text)
+    for pos, state, index in checkpoints.opens:
+        if pos < offsets[start]:
+            updated.opens.append((pos, state, index))
+    updated.opens.extend(relexed.opens)
+    if resumed is not None:
+        for pos, state, index in checkpoints.opens:
+            if pos >= resumed:
+                updated.opens.append((pos + moved, state, index))
+
+    return formatter.wrap_lines(html), updated.to_json()
@@ -0,0 +1,155 @@
+import logging
+import threading
+from concurrent.futures import ThreadPoolExecutor
+from datetime import timedelta
+
+from django.conf import settings
+from django.db import connections, transaction
+from django.db.models import F, Q
+from django.utils import timezone
+
+from snippets.highlight_store import (
+    delete_highlight_files,
+    is_large,
+    new_highlight_files,
+)
+from snippets.highlighting import plain_highlight
+from snippets.incremental import highlight_tracked
+from snippets.models import HighlightJob, Snippet
+
+logger = logging.getLogger(__name__)
+
+_executor = None
+_executor_lock = threading.Lock()
+
+
+def _options():
+    return getattr(settings, "SNIPPETS_ASYNC_HIGHLIGHT", {})
+
+
+def get_executor():
+    global _executor
+
+    with _executor_lock:
+        if _executor is None:
+            _executor = ThreadPoolExecutor(
+                max_workers=_options().get("WORKERS", 2),
+                thread_name_prefix="snippet-highlight",
+            )
+    return _executor
+
+
+def submit(job_id):
+    get_executor().submit(_run_in_worker, job_id)
+
+
+def _run_in_worker(job_id):
+    try:
+        process_job(job_id)
+    except Exception:
+        logger.exception("Highlight job %s failed", job_id)
+    finally:
+        # Worker threads own their connections; don't leave them open.
+        connections.close_all()
+
+
+def retry_later(job_id, attempts):
+    """
+    Submit a failed job again after RETRY_DELAY seconds, doubled for every
+    attempt. Retries pending when the process stops are left to
+    `manage.py process_highlight_jobs`.
+    """
+    delay = _options().get("RETRY_DELAY", 5) * 2 ** (attempts - 1)
+    timer = threading.Timer(delay, submit, [job_id])
+    timer.daemon = True
+    timer.start()
+
+
+def claimable_jobs():
+    stale = timezone.now() - timedelta(seconds=_options().get("CLAIM_TIMEOUT", 300))
+    return HighlightJob.objects.filter(Q(claimed__isnull=True) | Q(claimed__lt=stale))
+
+
+def store_render(job, snippet):
+    """
+    Store the render on `snippet` and finish its job, unless a newer save
+    replaced the job meanwhile. Returns whether the render was stored.
+    """
+    with transaction.atomic():
+        deleted, _ = HighlightJob.objects.filter(pk=job.pk, token=job.token).delete()
+        if not deleted:
+            delete_highlight_files([snippet.highlight_file])
+            return False
+
+        Snippet.objects.filter(pk=snippet.pk).update(
+            highlighted=snippet.highlighted,
+            highlight_pending=False,
+            highlighted_gzip=snippet.highlighted_gzip,
+            highlight_file=snippet.highlight_file,
+            highlight_states=snippet.highlight_states,
+        )
+    return True
+
+
+def process_job(job_id):
+    """
+    Render the snippet behind a job. Returns True when the render was stored,
+    False when the job was claimed elsewhere or superseded by a newer save.
+    """
+    claimed = (
+        claimable_jobs()
+        .filter(pk=job_id)
+        .update(claimed=timezone.now(), attempts=F("attempts") + 1)
+    )
+    if not claimed:
+        return False
+
+    job = HighlightJob.objects.select_related("snippet").get(pk=job_id)
+    snippet = job.snippet
+    max_attempts = _options().get("MAX_ATTEMPTS", 3)
+    if job.attempts > max_attempts:
+        # The last attempt died with its process; don't try again.
+        snippet.store_highlight(plain_highlight(snippet.code))
+        return store_render(job, snippet)
+
+    with new_highlight_files([snippet]):
+        try:
+            if is_large(snippet.code):
+                snippet.store_highlight_file()
+            else:
+                snippet.store_highlight(
+                    *highlight_tracked(
+                        snippet.code,
+                        snippet.language,
+                        snippet.style,
+                        snippet.linenos,
+                    )
+                )
+        except Exception as exc:
+            if job.attempts < max_attempts:
+                HighlightJob.objects.filter(pk=job_id, token=job.token).update(
+                    claimed=None, last_error=repr(exc)
+                )
+                retry_later(job_id, job.attempts)
+            else:
+                # Serve the code unhighlighted rather than leave clients
+                # polling for a render that will never come.
+                snippet.store_highlight(plain_highlight(snippet.code))
+                store_render(job, snippet)
+            raise
+
+        return store_render(job, snippet)
+
+
+def process_pending_jobs(limit=None):
+    job_ids = claimable_jobs().values_list("pk", flat=True)
+    if limit is not None:
+        job_ids = job_ids[:limit]
+
+    processed = 0
+    for job_id in list(job_ids):
+        try:
+            processed += process_job(job_id)
+        except Exception:
+            logger.exception("Highlight job %s failed", job_id)
+    return processed
@@ -0,0 +1,48 @@
+import json
+
+from django.core.management.base import BaseCommand, CommandError
+
+from snippets.catalog import (
+    MANIFEST_PATH,
+    build_manifest,
+    load_manifest,
+    write_manifest,
+)
+
+
+class Command(BaseCommand):
+    help = (
+        "Write the lexer and style manifest that snippet languages and styles "
+        "are read from, for the installed Pygments version."
+    )
+    # The model checks would read the very manifest being replaced.
+    requires_system_checks = []
+
+    def add_arguments(self, parser):
+        parser.add_argument(
+            "--check",
+            action="store_true",
+            help="Only check that the manifest matches the installed Pygments.",
+        )
+
+    def handle(self, *args, **options):
+        if options["check"]:
+            try:
+                with open(MANIFEST_PATH) as stream:
+                    current = json.load(stream)
+            except (OSError, ValueError):
+                current = None
+            if current != build_manifest():
+                raise CommandError(
+                    f"{MANIFEST_PATH} is out of date; run build_pygments_manifest."
+                )
+            self.stdout.write(f"{MANIFEST_PATH} is up to date.")
+            return
+
+        manifest = write_manifest()
+        load_manifest.cache_clear()
+        self.stdout.write(
+            f"Wrote {len(manifest['languages'])} languages and "
+            f"{len(manifest['styles'])} styles for Pygments {manifest['pygments']} "
+            f"to {MANIFEST_PATH}."
+        )
@@ -0,0 +1,106 @@
+from datetime import timedelta
+
+from django.core.management.base import BaseCommand, CommandError
+from django.utils import timezone
+from rest_framework.test import APIRequestFactory, force_authenticate
+
+from accounts.models import CustomUser
+from accounts.views import CustomUserListView
+from history.views import AuditLogListView
+from snippets.views import SnippetList
+
+
+def view_queryset(view_class, user, params):
+    """
+    The queryset a list view would page through for `user` and `params`,
+    limited to the first page the same way its paginator would.
+    """
+    request = APIRequestFactory().get("/", params)
+    force_authenticate(request, user=user)
+
+    view = view_class()
+    view.request = view.initialize_request(request)
+    view.args, view.kwargs, view.format_kwarg = (), {}, None
+
+    queryset = view.filter_queryset(view.get_queryset())
+    page_size = view.paginator.get_page_size(view.request)
+    if view.use_cursor_pagination():
+        queryset = queryset.order_by(*view.cursor_ordering)
+    return queryset[:page_size]
+
+
+def list_queries():
+    staff = CustomUser(pk=0, username="explain-staff", is_staff=True)
+    reader = CustomUser(pk=0, username="explain-reader")
+    since = (timezone.now() - timedelta(days=1)).isoformat()
+
+    return [
+        ("snippet-list", view_queryset(SnippetList, reader, {})),
+        (
+            "snippet-list (cursor)",
+            view_queryset(SnippetList, reader, {"pagination": "cursor"}),
+        ),
+        ("customuser-list (non-staff)", view_queryset(CustomUserListView, reader, {})),
+        (
+            "customuser-list (staff, include_all)",
+            view_queryset(CustomUserListView, staff, {"include_all": "true"}),
+        ),
+        (
+            "customuser-list (cursor)",
+            view_queryset(CustomUserListView, reader, {"pagination": "cursor"}),
+        ),
+        (
+            "auditlog-list by object",
+            view_queryset(
+                AuditLogListView, staff, {"model_name": "Snippet", "object_id": 1}
+            ),
+        ),
+        (
+            "auditlog-list by time range",
+            view_queryset(AuditLogListView, staff, {"since": since}),
+        ),
+    ]
+
+
+def full_scans(queryset, plan):
+    """
+    Plan lines that read or sort a whole table. SQLite reports a table scan
+    as "SCAN <table>" without an index clause; under a LIMIT that walks rows
+    in key order and stops after one page, so only unbounded ones count.
+    """
+    bounded = queryset.query.high_mark is not None
+    flagged = []
+    for line in plan.splitlines():
+        scan = line.partition("SCAN ")[2]
+        if "USE TEMP B-TREE" in line or (scan and "USING" not in scan and not bounded):
+            flagged.append(line)
+    return flagged
+
+
+class Command(BaseCommand):
+    help = "Print the query plan behind each list endpoint and flag full scans."
+
+    def add_arguments(self, parser):
+        parser.add_argument(
+            "--fail-on-scan",
+            action="store_true",
+            help="Exit with an error if any list query scans a whole table.",
+        )
+
+    def handle(self, *args, **options):
+        scans = []
+        for label, queryset in list_queries():
+            plan = queryset.explain()
+            flagged = full_scans(queryset, plan)
+            if flagged:
+                scans.append(label)
+
+            self.stdout.write(self.style.MIGRATE_HEADING(label))
+            for line in plan.splitlines():
+                if line in flagged:
+                    self.stdout.write(self.style.WARNING(f"  {line}  <- full scan"))
+                else:
+                    self.stdout.write(f"  {line}")
+
+        if scans and options["fail_on_scan"]:
+            raise CommandError(f"Full table scans in: {', '.join(scans)}")
@@ -0,0 +1,26 @@
+from django.core.management.base import BaseCommand
+
+from snippets.views import EXPORT_COLUMNS, export_rows
+from tutorial.streaming import EXPORT_CONTENT_TYPES, write_export
+
+
+class Command(BaseCommand):
+    help = "Dump every snippet as NDJSON or CSV."
+
+    def add_arguments(self, parser):
+        parser.add_argument(
+            "--format", choices=sorted(EXPORT_CONTENT_TYPES), default="ndjson"
+        )
+        parser.add_argument(
+            "--output", default="-", help="File to write to; defaults to stdout."
+        )
+        parser.add_argument("--gzip", action="store_true", help="Gzip the output.")
+
+    def handle(self, *args, **options):
+        write_export(
+            export_rows(),
+            EXPORT_COLUMNS,
+            options["format"],
+            options["output"],
+            compress=options["gzip"],
+        )
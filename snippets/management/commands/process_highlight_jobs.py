@@ -0,0 +1,35 @@
+import time
+
+from django.core.management.base import BaseCommand
+
+from snippets.jobs import process_pending_jobs
+
+
+class Command(BaseCommand):
+    help = "Render snippets whose highlighting is still queued."
+
+    def add_arguments(self, parser):
+        parser.add_argument(
+            "--limit", type=int, default=None, help="Process at most this many jobs."
+        )
+        parser.add_argument(
+            "--loop",
+            action="store_true",
+            help="Keep polling the queue instead of exiting once it is empty.",
+        )
+        parser.add_argument(
+            "--interval",
+            type=float,
+            default=2.0,
+            help="Seconds to sleep between polls in --loop mode.",
+        )
+
+    def handle(self, *args, **options):
+        while True:
+            processed = process_pending_jobs(limit=options["limit"])
+            if processed or options["verbosity"] > 1:
+                self.stdout.write(f"Rendered {processed} snippet(s).")
+
+            if not options["loop"]:
+                break
+            time.sleep(options["interval"])
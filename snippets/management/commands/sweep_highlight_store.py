@@ -0,0 +1,59 @@
+import time
+
+from django.core.management.base import BaseCommand
+
+from snippets.highlight_store import store_directory
+from snippets.models import Snippet
+
+
+class Command(BaseCommand):
+    help = (
+        "Delete highlight store files no snippet refers to, such as those "
+        "written by a save whose transaction was rolled back."
+    )
+
+    def add_arguments(self, parser):
+        parser.add_argument(
+            "--min-age",
+            type=float,
+            default=60 * 60,
+            help=(
+                "Only delete files last modified this many seconds ago, so "
+                "renders whose transaction is still open are kept."
+            ),
+        )
+        parser.add_argument(
+            "--dry-run",
+            action="store_true",
+            help="List the files that would be deleted without deleting them.",
+        )
+
+    def handle(self, *args, **options):
+        directory = store_directory()
+        if not directory.is_dir():
+            return
+
+        cutoff = time.time() - options["min_age"]
+        candidates = [
+            path
+            for path in directory.iterdir()
+            if path.is_file() and path.stat().st_mtime < cutoff
+        ]
+        referenced = set(
+            Snippet.objects.exclude(highlight_file="").values_list(
+                "highlight_file", flat=True
+            )
+        )
+
+        swept = 0
+        for path in candidates:
+            if path.name in referenced:
+                continue
+            if options["dry_run"]:
+                self.stdout.write(path.name)
+            else:
+                path.unlink(missing_ok=True)
+            swept += 1
+        if swept or options["verbosity"] > 1:
+            action = "Would delete" if options["dry_run"] else "Deleted"
+            self.stdout.write(f"{action} {swept} unreferenced highlight file(s).")
@@ -0,0 +1,15 @@
+from django.db.models import F
+from django.utils import timezone
+
+from history.querysets import AuditedQuerySet
+
+
+class SnippetQuerySet(AuditedQuerySet):
+    def update(self, **kwargs):
+        """
+        Bump `version` and `modified` like `Snippet.save()` does, so the
+        ETag and Last-Modified of updated snippets change too.
+        """
+        kwargs.setdefault("version", F("version") + 1)
+        kwargs.setdefault("modified", timezone.now())
+        return super().update(**kwargs)
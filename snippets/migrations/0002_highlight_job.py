@@ -0,0 +1,50 @@
+# Generated by Django 5.0.6 on 2026-10-18 10:43
+
+import uuid
+
+import django.db.models.deletion
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+    dependencies = [
+        ("snippets", "0001_create_snippet"),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name="snippet",
+            name="highlight_pending",
+            field=models.BooleanField(default=False),
+        ),
+        migrations.CreateModel(
+            name="HighlightJob",
+            fields=[
+                (
+                    "id",
+                    models.BigAutoField(
+                        auto_created=True,
+                        primary_key=True,
+                        serialize=False,
+                        verbose_name="ID",
+                    ),
+                ),
+                ("token", models.UUIDField(default=uuid.uuid4)),
+                ("enqueued", models.DateTimeField(auto_now=True)),
+                ("claimed", models.DateTimeField(blank=True, null=True)),
+                ("attempts", models.PositiveIntegerField(default=0)),
+                ("last_error", models.TextField(blank=True, default="")),
+                (
+                    "snippet",
+                    models.OneToOneField(
+                        on_delete=django.db.models.deletion.CASCADE,
+                        related_name="highlight_job",
+                        to="snippets.snippet",
+                    ),
+                ),
+            ],
+            options={
+                "ordering": ("enqueued",),
+            },
+        ),
+    ]
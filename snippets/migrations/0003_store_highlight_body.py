@@ -0,0 +1,38 @@
+from django.db import migrations
+from pygments import highlight
+from pygments.formatters.html import HtmlFormatter
+from pygments.lexers import get_lexer_by_name
+
+
+def rerender(apps, full):
+    Snippet = apps.get_model("snippets", "Snippet")
+    for snippet in Snippet.objects.filter(highlight_pending=False).iterator():
+        options = {"title": snippet.title} if full and snippet.title else {}
+        formatter = HtmlFormatter(
+            style=snippet.style,
+            linenos="table" if snippet.linenos else False,
+            full=full,
+            **options,
+        )
+        snippet.highlighted = highlight(
+            snippet.code, get_lexer_by_name(snippet.language), formatter
+        )
+        snippet.save(update_fields=["highlighted"])
+
+
+def store_body_only(apps, schema_editor):
+    rerender(apps, full=False)
+
+
+def store_full_document(apps, schema_editor):
+    rerender(apps, full=True)
+
+
+class Migration(migrations.Migration):
+    dependencies = [
+        ("snippets", "0002_highlight_job"),
+    ]
+
+    operations = [
+        migrations.RunPython(store_body_only, store_full_document),
+    ]
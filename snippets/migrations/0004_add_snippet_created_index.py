@@ -0,0 +1,18 @@
+# Generated by Django 5.0.6 on 2026-10-18 10:51
+
+from django.conf import settings
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+    dependencies = [
+        ("snippets", "0003_store_highlight_body"),
+        migrations.swappable_dependency(settings.AUTH_USER_MODEL),
+    ]
+
+    operations = [
+        migrations.AddIndex(
+            model_name="snippet",
+            index=models.Index(fields=["created", "id"], name="snippet_created_id_idx"),
+        ),
+    ]
@@ -0,0 +1,32 @@
+# Generated by Django 5.0.6 on 2026-10-18 16:02
+
+import django.utils.timezone
+from django.db import migrations, models
+
+
+def set_modified_from_created(apps, schema_editor):
+    Snippet = apps.get_model("snippets", "Snippet")
+    Snippet.objects.update(modified=models.F("created"))
+
+
+class Migration(migrations.Migration):
+    dependencies = [
+        ("snippets", "0004_add_snippet_created_index"),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name="snippet",
+            name="version",
+            field=models.PositiveIntegerField(default=1),
+        ),
+        migrations.AddField(
+            model_name="snippet",
+            name="modified",
+            field=models.DateTimeField(
+                auto_now=True, default=django.utils.timezone.now
+            ),
+            preserve_default=False,
+        ),
+        migrations.RunPython(set_modified_from_created, migrations.RunPython.noop),
+    ]
@@ -0,0 +1,22 @@
+# Generated by Django 5.0.6 on 2026-10-18 11:46
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+    dependencies = [
+        ("snippets", "0006_snippet_highlighted_gzip"),
+    ]
+
+    operations = [
+        migrations.AlterField(
+            model_name="snippet",
+            name="language",
+            field=models.CharField(default="python", max_length=100),
+        ),
+        migrations.AlterField(
+            model_name="snippet",
+            name="style",
+            field=models.CharField(default="friendly", max_length=100),
+        ),
+    ]
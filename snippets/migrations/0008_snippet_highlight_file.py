@@ -0,0 +1,17 @@
+# Generated by Django 5.0.6 on 2026-10-18 11:51
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+    dependencies = [
+        ("snippets", "0007_drop_language_style_choices"),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name="snippet",
+            name="highlight_file",
+            field=models.CharField(blank=True, default="", max_length=100),
+        ),
+    ]
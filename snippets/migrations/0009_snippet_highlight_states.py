@@ -0,0 +1,17 @@
+# Generated by Django 5.0.6 on 2026-10-18 11:57
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+    dependencies = [
+        ("snippets", "0008_snippet_highlight_file"),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name="snippet",
+            name="highlight_states",
+            field=models.JSONField(blank=True, editable=False, null=True),
+        ),
+    ]
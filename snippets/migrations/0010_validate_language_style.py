@@ -0,0 +1,31 @@
+# Generated by Django 5.0.6 on 2026-10-18 12:39
+
+import snippets.catalog
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+    dependencies = [
+        ("snippets", "0009_snippet_highlight_states"),
+    ]
+
+    operations = [
+        migrations.AlterField(
+            model_name="snippet",
+            name="language",
+            field=models.CharField(
+                default="python",
+                max_length=100,
+                validators=[snippets.catalog.validate_language],
+            ),
+        ),
+        migrations.AlterField(
+            model_name="snippet",
+            name="style",
+            field=models.CharField(
+                default="friendly",
+                max_length=100,
+                validators=[snippets.catalog.validate_style],
+            ),
+        ),
+    ]
@@ -0,0 +1,19 @@
+# Generated by Django 5.0.6 on 2026-10-18 13:06
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+    dependencies = [
+        ("snippets", "0010_validate_language_style"),
+    ]
+
+    operations = [
+        migrations.AlterField(
+            model_name="snippet",
+            name="highlight_file",
+            field=models.CharField(
+                blank=True, default="", editable=False, max_length=100
+            ),
+        ),
+    ]
@@ -0,0 +1,18 @@
+# Generated by Django 5.0.6 on 2026-10-18 13:09
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('snippets', '0011_highlight_file_not_editable'),
+    ]
+
+    operations = [
+        migrations.AlterField(
+            model_name='snippet',
+            name='version',
+            field=models.PositiveIntegerField(default=1, editable=False),
+        ),
+    ]
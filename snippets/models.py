@@ -1,13 +1,25 @@
+import uuid
+
 from django.conf import settings
-from django.db import models
-from pygments import highlight
-from pygments.formatters.html import HtmlFormatter
-from pygments.lexers import get_all_lexers, get_lexer_by_name
-from pygments.styles import get_all_styles
+from django.db import models, transaction
+from django.urls import reverse
 
-LEXERS = [item for item in get_all_lexers() if item[1]]
-LANGUAGE_CHOICES = sorted([(item[1][0], item[0]) for item in LEXERS])
-STYLE_CHOICES = sorted((item, item) for item in get_all_styles())
+from snippets.catalog import validate_language, validate_style
+from snippets.highlight_store import (
+    discard_highlight_files,
+    is_large,
+    new_highlight_files,
+    write_highlight_file,
+)
+from snippets.highlighting import (
+    cached_highlight,
+    compress_document,
+    render_document,
+    render_many,
+    stream_document,
+)
+from snippets.incremental import highlight_tracked, rehighlight
+from snippets.managers import SnippetQuerySet
 
 
 class Snippet(models.Model):
@@ -15,31 +27,261 @@ class Snippet(models.Model):
     title = models.CharField(max_length=100, blank=True, default="")
     code = models.TextField()
     linenos = models.BooleanField(default=False)
+    # Checked against the Pygments manifest rather than model choices, so
+    # Pygments upgrades don't touch the migrations.
     language = models.CharField(
-        choices=LANGUAGE_CHOICES, default="python", max_length=100
+        default="python", max_length=100, validators=[validate_language]
+    )
+    style = models.CharField(
+        default="friendly", max_length=100, validators=[validate_style]
     )
-    style = models.CharField(choices=STYLE_CHOICES, default="friendly", max_length=100)
     owner = models.ForeignKey(
         settings.AUTH_USER_MODEL, related_name="snippets", on_delete=models.CASCADE
     )
     highlighted = models.TextField()
+    highlight_pending = models.BooleanField(default=False)
+    # The whole `SnippetHighlight` page, gzipped when it was rendered.
+    highlighted_gzip = models.BinaryField(null=True, blank=True)
+    # Name of the page in the highlight store, for snippets too large to
+    # render in memory; `highlighted` is empty then.
+    highlight_file = models.CharField(
+        max_length=100, blank=True, default="", editable=False
+    )
+    # Lexer states at some line starts of `code`, for `rehighlight` to resume
+    # from after an edit; null for short snippets and unsupported lexers.
+    highlight_states = models.JSONField(null=True, blank=True, editable=False)
+    # Bumped by every write, for ETags; `modified` backs Last-Modified.
+    version = models.PositiveIntegerField(default=1, editable=False)
+    modified = models.DateTimeField(auto_now=True)
+
+    objects = SnippetQuerySet.as_manager()
 
     class Meta:
         ordering = ("created",)
+        indexes = [
+            models.Index(fields=["created", "id"], name="snippet_created_id_idx"),
+        ]
+
+    @classmethod
+    def from_db(cls, db, field_names, values):
+        instance = super().from_db(db, field_names, values)
+        instance.remember_render()
+        return instance
+
+    def remember_render(self):
+        """
+        Keep the loaded render, so saving an edit can update it instead of
+        highlighting the new code from scratch.
+        """
+        fields = ("code", "language", "style", "linenos", "highlighted")
+        if self.get_deferred_fields().intersection(fields + ("highlight_states",)):
+            self._rendered = None
+        else:
+            self._rendered = tuple(getattr(self, name) for name in fields) + (
+                self.highlight_states,
+            )
+
+    def rehighlight(self):
+        """
+        Update the remembered render for the current code, or return None
+        when it has to be rendered in full.
+        """
+        return rehighlight(
+            getattr(self, "_rendered", None),
+            self.code,
+            self.language,
+            self.style,
+            self.linenos,
+        )
 
     def save(self, *args, **kwargs):
         """
         Use the `pygments` library to create a highlighted HTML
-        representation of the code snippet.
+        representation of the code snippet. Only the highlighted body is
+        stored; `SnippetHighlight` wraps it in a page on request. Snippets
+        over the STREAM_THRESHOLD are written to the highlight store as a
+        whole page instead.
+
+        Edits to a snippet loaded from the database only lex the lines around
+        the change again. With SNIPPETS_ASYNC_HIGHLIGHT enabled, any other
+        render that is not already cached is queued for the background
+        workers instead.
+        """
+        # Fail with a ValidationError rather than inside Pygments.
+        self.clean_fields(
+            exclude=[
+                field.name
+                for field in self._meta.fields
+                if field.name not in ("language", "style")
+            ]
+        )
+        bump_version = not self._state.adding
+        if bump_version:
+            # Incremented in the database so concurrent saves can't both
+            # claim the same version.
+            self.version = models.F("version") + 1
+
+        if not async_highlight_enabled():
+            with new_highlight_files([self]):
+                self.render()
+                with transaction.atomic():
+                    replaced_file = self.stored_highlight_file()
+                    super(Snippet, self).save(*args, **kwargs)
+                    if bump_version:
+                        self.refresh_from_db(fields=["version"])
+                    discard_highlight_files([replaced_file])
+            self.remember_render()
+            return
+
+        rendered = None
+        if not is_large(self.code):
+            rendered = self.rehighlight()
+            if rendered is None:
+                highlighted = cached_highlight(
+                    self.code, self.language, self.style, self.linenos
+                )
+                rendered = None if highlighted is None else (highlighted, None)
+        if rendered is None:
+            self.highlighted = ""
+            self.highlight_pending = True
+            self.highlighted_gzip = None
+            self.highlight_file = ""
+            self.highlight_states = None
+        else:
+            self.store_highlight(*rendered)
+
+        with transaction.atomic():
+            replaced_file = self.stored_highlight_file()
+            super(Snippet, self).save(*args, **kwargs)
+            if bump_version:
+                self.refresh_from_db(fields=["version"])
+            if self.highlight_pending:
+                HighlightJob.enqueue(self)
+            discard_highlight_files([replaced_file])
+        self.remember_render()
+
+    def stored_highlight_file(self):
         """
-        lexer = get_lexer_by_name(self.language)
-        linenos = "table" if self.linenos else False
-        options = {"title": self.title} if self.title else {}
-        formatter = HtmlFormatter(
-            style=self.style, linenos=linenos, full=True, **options
+        The store file the saved row refers to, which this save replaces.
+        Read from the database so a name set on the instance is never deleted.
+        """
+        if self._state.adding:
+            return ""
+        return (
+            Snippet.objects.filter(pk=self.pk)
+            .values_list("highlight_file", flat=True)
+            .first()
+            or ""
         )
-        self.highlighted = highlight(self.code, lexer, formatter)
-        super(Snippet, self).save(*args, **kwargs)
+
+    def render(self):
+        if is_large(self.code):
+            self.store_highlight_file()
+        else:
+            rendered = self.rehighlight() or highlight_tracked(
+                self.code, self.language, self.style, self.linenos
+            )
+            self.store_highlight(*rendered)
+
+    def store_highlight(self, highlighted, states=None):
+        self.highlighted = highlighted
+        self.highlight_states = states
+        self.highlight_pending = False
+        self.highlight_file = ""
+        self.highlighted_gzip = compress_document(self.highlight_document())
+
+    def store_highlight_file(self):
+        css_url = reverse("snippet-style-css", kwargs={"style": self.style})
+        self.highlight_file = write_highlight_file(
+            lambda stream: stream_document(
+                stream,
+                self.code,
+                self.language,
+                self.style,
+                self.linenos,
+                self.title,
+                css_url,
+            )
+        )
+        self.highlighted = ""
+        self.highlight_states = None
+        self.highlight_pending = False
+        self.highlighted_gzip = None
+
+    def highlight_document(self):
+        css_url = reverse("snippet-style-css", kwargs={"style": self.style})
+        return render_document(self.highlighted, self.title, css_url)
 
     def __str__(self):
         return self.title
+
+
+class HighlightJob(models.Model):
+    """
+    A pending background render. There is at most one job per snippet; saving
+    the snippet again replaces the token so a stale render is discarded.
+    """
+
+    snippet = models.OneToOneField(
+        Snippet, related_name="highlight_job", on_delete=models.CASCADE
+    )
+    token = models.UUIDField(default=uuid.uuid4)
+    enqueued = models.DateTimeField(auto_now=True)
+    claimed = models.DateTimeField(null=True, blank=True)
+    attempts = models.PositiveIntegerField(default=0)
+    last_error = models.TextField(blank=True, default="")
+
+    class Meta:
+        ordering = ("enqueued",)
+
+    @classmethod
+    def enqueue(cls, snippet):
+        job, _ = cls.objects.update_or_create(
+            snippet=snippet,
+            defaults={
+                "token": uuid.uuid4(),
+                "claimed": None,
+                "attempts": 0,
+                "last_error": "",
+            },
+        )
+
+        from snippets.jobs import submit
+
+        transaction.on_commit(lambda: submit(job.pk))
+        return job
+
+
+def async_highlight_enabled():
+    return getattr(settings, "SNIPPETS_ASYNC_HIGHLIGHT", {}).get("ENABLED", False)
+
+
+def highlight_snippets(snippets):
+    """
+    Render `highlighted` for unsaved changes to many snippets at once, for
+    bulk writes that bypass `Snippet.save()`. Edited snippets are updated
+    like `save()` does; the rest are rendered together. Returns the highlight
+    store files the renders replace. Run it and the write under
+    `new_highlight_files(snippets)`.
+    """
+    replaced_files = [snippet.highlight_file for snippet in snippets]
+    small = []
+    for snippet in snippets:
+        if is_large(snippet.code):
+            snippet.store_highlight_file()
+            continue
+        rendered = snippet.rehighlight()
+        if rendered is None:
+            small.append(snippet)
+        else:
+            snippet.store_highlight(*rendered)
+
+    rendered = render_many(
+        [
+            (snippet.code, snippet.language, snippet.style, snippet.linenos)
+            for snippet in small
+        ]
+    )
+    for snippet, highlighted in zip(small, rendered):
+        snippet.store_highlight(highlighted)
+    return replaced_files
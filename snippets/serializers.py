@@ -1,5 +1,6 @@
 from rest_framework import serializers
 
+from snippets.highlight_store import code_size, size_limits
 from snippets.models import Snippet
 
 
@@ -22,3 +23,11 @@ class SnippetSerializer(serializers.HyperlinkedModelSerializer):
             "style",
             "owner",
         )
+
+    def validate_code(self, value):
+        max_size = size_limits()["MAX_CODE_SIZE"]
+        if max_size is not None and code_size(value) > max_size:
+            raise serializers.ValidationError(
+                f"Ensure this field has no more than {max_size} bytes."
+            )
+        return value
@@ -0,0 +1,72 @@
+import json
+import os
+import tempfile
+from io import StringIO
+
+from django.core.management import call_command
+from django.test import SimpleTestCase, TestCase
+
+from snippets.catalog import language_names, load_manifest, style_names
+
+
+class ExportSnippetsCommandTests(TestCase):
+    fixtures = ["accounts_users", "snippets_snippets"]
+
+    def test_export_to_file(self):
+        directory = tempfile.TemporaryDirectory()
+        self.addCleanup(directory.cleanup)
+        output = os.path.join(directory.name, "snippets.ndjson")
+
+        call_command("export_snippets", "--output", output)
+
+        with open(output) as export:
+            rows = [json.loads(line) for line in export]
+        self.assertEqual([1], [row["id"] for row in rows])
+
+
+class ExplainListQueriesCommandTests(TestCase):
+    def test_list_queries_use_indexes(self):
+        out = StringIO()
+
+        call_command("explain_list_queries", "--fail-on-scan", stdout=out)
+
+        output = out.getvalue()
+        self.assertIn("snippet_created_id_idx", output)
+        self.assertIn("customuser_not_deleted_idx", output)
+        self.assertIn("auditlog_object_time_idx", output)
+        self.assertIn("auditlog_timestamp_id_idx", output)
+
+
+class PygmentsManifestTests(SimpleTestCase):
+    def test_shipped_manifest_matches_installed_pygments(self):
+        out = StringIO()
+
+        call_command("build_pygments_manifest", "--check", stdout=out)
+
+        self.assertIn("up to date", out.getvalue())
+
+    def test_names_come_from_the_manifest(self):
+        self.assertIn("python", language_names())
+        self.assertIn("friendly", style_names())
+
+    def test_stale_manifest_falls_back_to_enumerating(self):
+        directory = tempfile.TemporaryDirectory()
+        self.addCleanup(directory.cleanup)
+        path = os.path.join(directory.name, "manifest.json")
+        with open(path, "w") as stream:
+            json.dump(
+                {"format": 1, "pygments": "0.1", "languages": [], "styles": []}, stream
+            )
+
+        with self.assertLogs("snippets.catalog", "WARNING"):
+            manifest = load_manifest(path)
+
+        self.assertIn(["python", "Python"], manifest["languages"])
+
+    def test_startup_benchmark_compares_both_strategies(self):
+        out = StringIO()
+
+        call_command("benchmark_startup", "--runs=1", stdout=out)
+
+        self.assertIn("manifest: median", out.getvalue())
+        self.assertIn("enumerate: median", out.getvalue())
@@ -0,0 +1,380 @@
+from concurrent.futures import ThreadPoolExecutor
+from re import _parser as sre_parse
+from unittest import mock
+
+from django.core.cache.backends.locmem import LocMemCache
+from django.test import SimpleTestCase, override_settings
+from pygments import highlight
+from pygments.formatters.html import HtmlFormatter
+from pygments.lexers import get_lexer_by_name
+
+from snippets import highlighting, incremental
+from snippets.highlighting import (
+    HighlightCache,
+    RenderEngine,
+    highlight_key,
+    render_highlight,
+    render_many,
+)
+from snippets.incremental import highlight_tracked, rehighlight
+
+LONG_MODULE = "".join(
+    f'''
+def function_{index}(value):
+    """
+    Docstring {index}, with "quotes" and a # hash.
+    """
+    # comment {index}
+    return value * {index} + len("{index}")
+'''
+    for index in range(40)
+)
+
+
+class HighlightCacheTests(SimpleTestCase):
+    def setUp(self):
+        patcher = mock.patch.object(highlighting, "_cache", HighlightCache())
+        patcher.start()
+        self.addCleanup(patcher.stop)
+
+    def test_identical_input_is_only_lexed_once(self):
+        with mock.patch.object(
+            highlighting, "highlight", wraps=highlighting.highlight
+        ) as highlight:
+            first = render_highlight("print(1)", "python", "friendly", True)
+            second = render_highlight("print(1)", "python", "friendly", True)
+
+        self.assertEqual(first, second)
+        self.assertEqual(1, highlight.call_count)
+
+    def test_every_render_input_is_part_of_the_key(self):
+        base = ("print(1)", "python", "friendly", False)
+        keys = {
+            highlight_key(*base),
+            highlight_key("print(2)", *base[1:]),
+            highlight_key(base[0], "ruby", *base[2:]),
+            highlight_key(*base[:2], "vim", base[3]),
+            highlight_key(*base[:3], True),
+        }
+
+        self.assertEqual(5, len(keys))
+
+    def test_least_recently_used_entry_is_evicted(self):
+        cache = HighlightCache(max_entries=2)
+        cache.set("a", "A")
+        cache.set("b", "B")
+        cache.get("a")
+        cache.set("c", "C")
+
+        self.assertEqual("A", cache.get("a"))
+        self.assertIsNone(cache.get("b"))
+        self.assertEqual("C", cache.get("c"))
+
+    def test_shared_backend_populates_local_tier(self):
+        backend = LocMemCache("highlight-tests", {})
+        HighlightCache(backend=backend).set("key", "<html></html>")
+
+        cache = HighlightCache(backend=backend)
+
+        self.assertEqual("<html></html>", cache.get("key"))
+        self.assertIn("key", cache.local)
+
+    def test_render_is_body_only(self):
+        body = render_highlight("print(1)", "python", "friendly", False)
+
+        self.assertTrue(body.startswith('<div class="highlight">'))
+        self.assertNotIn("<style", body)
+
+    def test_oversized_renders_are_not_cached(self):
+        cache = HighlightCache(max_entry_size=4)
+        cache.set("key", "too large")
+
+        self.assertIsNone(cache.get("key"))
+
+    @override_settings(SNIPPETS_BULK={"PARALLEL_THRESHOLD": 2})
+    def test_render_many_matches_single_renders(self):
+        items = [
+            ("print(1)", "python", "friendly", False),
+            ("puts 1", "ruby", "vim", True),
+            ("print(1)", "python", "friendly", False),
+        ]
+
+        rendered = render_many(items)
+
+        expected = [highlighting._render(*item) for item in items]
+        self.assertEqual(expected, rendered)
+        self.assertEqual(expected[1], render_highlight(*items[1]))
+
+
+class RenderEngineTests(SimpleTestCase):
+    def test_renders_match_fresh_pygments_objects(self):
+        engine = RenderEngine()
+        for linenos in (False, True, False, True):
+            expected = highlight(
+                "def f(a):\n    return a\n",
+                get_lexer_by_name("python"),
+                HtmlFormatter(style="vim", linenos="table" if linenos else False),
+            )
+            self.assertEqual(
+                expected,
+                engine.render("def f(a):\n    return a\n", "python", "vim", linenos),
+            )
+
+        stats = engine.stats()
+        self.assertEqual({"hits": 3, "misses": 1}, _counts(stats["lexers"]))
+        self.assertEqual({"hits": 2, "misses": 2}, _counts(stats["formatters"]))
+        self.assertEqual(0.75, stats["lexers"]["hit_rate"])
+        self.assertEqual(1, stats["lexers"]["idle"])
+
+    def test_concurrent_renders_use_separate_lexers(self):
+        engine = RenderEngine(lexers_per_language=2)
+        codes = [f"x{index} = {index}\n" * 50 for index in range(40)]
+
+        with ThreadPoolExecutor(max_workers=8) as executor:
+            rendered = list(
+                executor.map(
+                    lambda code: engine.render(code, "python", "friendly", True), codes
+                )
+            )
+
+        self.assertEqual(
+            [RenderEngine().render(code, "python", "friendly", True) for code in codes],
+            rendered,
+        )
+        self.assertLessEqual(engine.stats()["lexers"]["idle"], 2)
+
+    def test_style_sheets_are_built_once(self):
+        engine = RenderEngine()
+
+        first = engine.style_css("friendly")
+
+        self.assertIs(first, engine.style_css("friendly"))
+        self.assertEqual(
+            {"hits": 1, "misses": 1}, _counts(engine.stats()["style_sheets"])
+        )
+
+
+@override_settings(
+    SNIPPETS_INCREMENTAL_HIGHLIGHT={"MIN_LINES": 0, "CHECKPOINT_INTERVAL": 8}
+)
+class IncrementalHighlightTests(SimpleTestCase):
+    def setUp(self):
+        patcher = mock.patch.object(highlighting, "_cache", HighlightCache())
+        patcher.start()
+        self.addCleanup(patcher.stop)
+
+    def full_render(self, code, linenos, language="python"):
+        return highlight(
+            code,
+            get_lexer_by_name(language),
+            HtmlFormatter(style="friendly", linenos="table" if linenos else False),
+        )
+
+    def assertStatesMatchLexer(self, code, states):
+        with override_settings(
+            SNIPPETS_INCREMENTAL_HIGHLIGHT={"MIN_LINES": 0, "CHECKPOINT_INTERVAL": 1}
+        ):
+            every_line = highlight_tracked(code, "python", "friendly", False)[1]
+        expected = {
+            line: every_line["stacks"][index] for line, index in every_line["lines"]
+        }
+        for line, index in states["lines"]:
+            self.assertEqual(expected[line], states["stacks"][index])
+
+    def edit(self, code, line, replace=1, insert=()):
+        lines = code.split("\n")
+        lines[line : line + replace] = insert
+        return "\n".join(lines)
+
+    def test_tracked_render_matches_pygments(self):
+        for linenos in (False, True):
+            highlighted, states = highlight_tracked(
+                LONG_MODULE, "python", "friendly", linenos
+            )
+
+            self.assertEqual(self.full_render(LONG_MODULE, linenos), highlighted)
+            self.assertEqual([0, 0], states["lines"][0])
+            self.assertEqual(["root"], states["stacks"][0])
+
+    def test_edits_match_full_renders(self):
+        edits = [
+            (0, 1, ["import os"]),
+            (100, 1, ["    return value  # edited"]),
+            (100, 0, ["x = 1", "y = 2"]),
+            (101, 3, []),
+            # Opening and closing a docstring changes every line after it.
+            (150, 0, ['"""']),
+            (200, 0, ['"""']),
+            (len(LONG_MODULE.split("\n")) - 2, 1, ["last = True"]),
+        ]
+        for linenos in (False, True):
+            code = LONG_MODULE
+            highlighted, states = highlight_tracked(code, "python", "friendly", linenos)
+            for line, replace, insert in edits:
+                edited = self.edit(code, line, replace, insert)
+
+                highlighted, states = rehighlight(
+                    (code, "python", "friendly", linenos, highlighted, states),
+                    edited,
+                    "python",
+                    "friendly",
+                    linenos,
+                )
+
+                self.assertEqual(self.full_render(edited, linenos), highlighted)
+                self.assertStatesMatchLexer(edited, states)
+                code = edited
+
+    def test_closing_a_construct_opened_before_the_edit(self):
+        constructs = [
+            ("javascript", "var a = 1;", "/* open", "close */"),
+            ("sql", "SELECT a FROM t;", "SELECT 'open", "close';"),
+            ("html", "<p>text</p>", "<!-- open", "close -->"),
+            ("css", "a { color: red; }", "/* open", "close */"),
+            ("bash", "echo hi", "cat <<EOF", "EOF"),
+            ("python", "x = 1", 'y = """open', '"""'),
+        ]
+        for language, line, opener, closer in constructs:
+            with self.subTest(language=language):
+                lines = [line] * 600
+                lines[10] = opener
+                code = "\n".join(lines)
+                rendered = highlight_tracked(code, language, "friendly", False)
+                # Closing it changes every line back to the opener, and
+                # opening it again changes them back.
+                closed = self.edit(code, 300, 1, [closer])
+                spliced = rehighlight(
+                    (code, language, "friendly", False, *rendered),
+                    closed,
+                    language,
+                    "friendly",
+                    False,
+                )
+                self.assertEqual(self.full_render(closed, False, language), spliced[0])
+                spliced = rehighlight(
+                    (closed, language, "friendly", False, *spliced),
+                    code,
+                    language,
+                    "friendly",
+                    False,
+                )
+                self.assertEqual(self.full_render(code, False, language), spliced[0])
+
+    def test_spliced_renders_are_not_cached(self):
+        rendered = highlight_tracked(LONG_MODULE, "python", "friendly", False)
+        edited = self.edit(LONG_MODULE, 100, 1, ["x = 1"])
+
+        rehighlight(
+            (LONG_MODULE, "python", "friendly", False, *rendered),
+            edited,
+            "python",
+            "friendly",
+            False,
+        )
+
+        key = highlight_key(edited, "python", "friendly", False)
+        self.assertIsNone(highlighting.get_highlight_cache().get(key))
+
+    def test_identical_pastes_are_not_lexed_again(self):
+        rendered = highlight_tracked(LONG_MODULE, "python", "friendly", False)
+
+        with mock.patch.object(incremental, "lex") as lex:
+            self.assertEqual(
+                rendered, highlight_tracked(LONG_MODULE, "python", "friendly", False)
+            )
+        lex.assert_not_called()
+
+        # Cached states are only used with the interval they were taken at.
+        self.assertStatesMatchLexer(LONG_MODULE, rendered[1])
+
+    def test_pygments_internals_are_still_there(self):
+        # Resuming a lexer relies on these private APIs; if an upgrade moves
+        # them, every render silently becomes a full one.
+        self.assertTrue(callable(sre_parse.parse))
+        self.assertTrue(callable(HtmlFormatter._format_lines))
+        for language in ("python", "javascript", "sql", "html", "css", "bash"):
+            lexer = get_lexer_by_name(language)
+            self.assertTrue(callable(lexer._preprocess_lexer_input), language)
+            self.assertIn("root", type(lexer)._tokens, language)
+            self.assertIsNotNone(incremental.get_profile(lexer), language)
+
+    def test_only_lines_around_the_edit_are_lexed(self):
+        highlighted, states = highlight_tracked(
+            LONG_MODULE, "python", "friendly", False
+        )
+        line = LONG_MODULE.split("\n").index("    # comment 14")
+        edited = self.edit(LONG_MODULE, line, 1, ["    return value  # edited"])
+        lexed = []
+
+        def lex(profile, lexer, text, pos, stack, opens):
+            for ttype, value in incremental.lex.__wrapped__(
+                profile, lexer, text, pos, stack, opens
+            ):
+                if ttype is not None:
+                    lexed.append(value)
+                yield ttype, value
+
+        lex.__wrapped__ = incremental.lex
+        with mock.patch.object(incremental, "lex", lex):
+            rehighlight(
+                (LONG_MODULE, "python", "friendly", False, highlighted, states),
+                edited,
+                "python",
+                "friendly",
+                False,
+            )
+
+        self.assertLessEqual("".join(lexed).count("\n"), 3 * 8)
+        self.assertIn("# edited", "".join(lexed))
+
+    def test_unchanged_code_is_not_lexed(self):
+        rendered = highlight_tracked(LONG_MODULE, "python", "friendly", False)
+
+        with mock.patch.object(incremental, "lex") as lex:
+            result = rehighlight(
+                (LONG_MODULE, "python", "friendly", False, *rendered),
+                LONG_MODULE,
+                "python",
+                "friendly",
+                False,
+            )
+
+        self.assertEqual(rendered, result)
+        lex.assert_not_called()
+
+    def test_full_render_is_needed(self):
+        rendered = highlight_tracked(LONG_MODULE, "python", "friendly", False)
+        edited = self.edit(LONG_MODULE, 1, 1, ["x = 1"])
+
+        # Another style, or states from another Pygments version.
+        self.assertIsNone(
+            rehighlight(
+                (LONG_MODULE, "python", "friendly", False, *rendered),
+                edited,
+                "python",
+                "vim",
+                False,
+            )
+        )
+        self.assertIsNone(
+            rehighlight(
+                (LONG_MODULE, "python", "friendly", False, rendered[0], None),
+                edited,
+                "python",
+                "friendly",
+                False,
+            )
+        )
+        # The C lexer overrides the state machine it inherits.
+        self.assertIsNone(highlight_tracked("int x;\n", "c", "friendly", False)[1])
+
+    @override_settings(SNIPPETS_INCREMENTAL_HIGHLIGHT={"MIN_LINES": 500})
+    def test_short_snippets_keep_no_states(self):
+        highlighted, states = highlight_tracked("x = 1\n", "python", "friendly", False)
+
+        self.assertEqual(self.full_render("x = 1\n", False), highlighted)
+        self.assertIsNone(states)
+
+
+def _counts(counter):
+    return {"hits": counter["hits"], "misses": counter["misses"]}
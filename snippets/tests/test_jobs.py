@@ -0,0 +1,136 @@
+from unittest import mock
+
+from django.test import override_settings
+from django.urls import reverse
+from rest_framework import status
+
+from snippets import highlighting
+from snippets.highlighting import HighlightCache
+from snippets.jobs import process_job, process_pending_jobs
+from snippets.models import HighlightJob, Snippet
+from snippets.tests.test_views import SnippetsTestCaseBase
+
+ASYNC_HIGHLIGHT = {"ENABLED": True, "WORKERS": 1, "MAX_ATTEMPTS": 3}
+
+
+@override_settings(SNIPPETS_ASYNC_HIGHLIGHT=ASYNC_HIGHLIGHT)
+class AsyncHighlightTests(SnippetsTestCaseBase):
+    def setUp(self):
+        super().setUp()
+        patcher = mock.patch.object(highlighting, "_cache", HighlightCache())
+        patcher.start()
+        self.addCleanup(patcher.stop)
+
+    def create_snippet(self, code="print('queued')"):
+        self.client.force_authenticate(user=self.non_staff_user)
+        response = self.client.post(
+            reverse("snippet-list"),
+            data={"title": "Queued", "code": code, "language": "python"},
+            format="json",
+        )
+        self.assertEqual(status.HTTP_201_CREATED, response.status_code)
+        return Snippet.objects.get(pk=response.data["id"])
+
+    def test_create_queues_render_instead_of_highlighting(self):
+        snippet = self.create_snippet()
+
+        self.assertTrue(snippet.highlight_pending)
+        self.assertEqual("", snippet.highlighted)
+        self.assertTrue(HighlightJob.objects.filter(snippet=snippet).exists())
+
+    def test_highlight_is_accepted_until_job_is_processed(self):
+        snippet = self.create_snippet()
+        url = reverse("snippet-highlight", kwargs={"pk": snippet.pk})
+
+        response = self.client.get(url)
+        self.assertEqual(status.HTTP_202_ACCEPTED, response.status_code)
+        self.assertNotIn("ETag", response)
+
+        self.assertEqual(1, process_pending_jobs())
+
+        response = self.client.get(url)
+        self.assertEqual(status.HTTP_200_OK, response.status_code)
+        self.assertIn("queued", response.content.decode())
+        self.assertFalse(HighlightJob.objects.exists())
+        # The finished render is a new version of the page.
+        self.assertEqual(
+            snippet.version + 1, Snippet.objects.get(pk=snippet.pk).version
+        )
+
+    def test_superseded_job_does_not_overwrite_newer_code(self):
+        snippet = self.create_snippet()
+        job_id = snippet.highlight_job.pk
+
+        def save_during_render(*args):
+            newer = Snippet.objects.get(pk=snippet.pk)
+            newer.code = "print('newer')"
+            newer.save()
+            return "<html>stale</html>", None
+
+        with mock.patch("snippets.jobs.highlight_tracked", save_during_render):
+            self.assertFalse(process_job(job_id))
+
+        snippet.refresh_from_db()
+        self.assertTrue(snippet.highlight_pending)
+
+        self.assertEqual(1, process_pending_jobs())
+        snippet.refresh_from_db()
+        self.assertIn("newer", snippet.highlighted)
+
+    def test_cached_render_is_stored_synchronously(self):
+        self.create_snippet(code="print('same')")
+        process_pending_jobs()
+
+        snippet = self.create_snippet(code="print('same')")
+
+        self.assertFalse(snippet.highlight_pending)
+        self.assertIn("same", snippet.highlighted)
+
+    def test_failed_renders_are_retried_later(self):
+        snippet = self.create_snippet()
+        job_id = snippet.highlight_job.pk
+
+        with (
+            mock.patch("snippets.jobs.highlight_tracked", side_effect=ValueError),
+            mock.patch("snippets.jobs.retry_later") as retry_later,
+        ):
+            with self.assertRaises(ValueError):
+                process_job(job_id)
+
+        retry_later.assert_called_once_with(job_id, 1)
+        snippet.refresh_from_db()
+        self.assertTrue(snippet.highlight_pending)
+        self.assertIn("ValueError", HighlightJob.objects.get(pk=job_id).last_error)
+
+    def test_last_failed_attempt_serves_the_code_unhighlighted(self):
+        snippet = self.create_snippet(code="print('<b>')")
+        job_id = snippet.highlight_job.pk
+        HighlightJob.objects.filter(pk=job_id).update(attempts=2)
+
+        with (
+            mock.patch("snippets.jobs.highlight_tracked", side_effect=ValueError),
+            mock.patch("snippets.jobs.retry_later") as retry_later,
+        ):
+            with self.assertRaises(ValueError):
+                process_job(job_id)
+
+        retry_later.assert_not_called()
+        self.assertFalse(HighlightJob.objects.exists())
+        response = self.client.get(
+            reverse("snippet-highlight", kwargs={"pk": snippet.pk})
+        )
+        self.assertEqual(status.HTTP_200_OK, response.status_code)
+        self.assertIn("print(&#x27;&lt;b&gt;&#x27;)", response.content.decode())
+
+    def test_jobs_whose_last_attempt_died_are_not_rendered_again(self):
+        snippet = self.create_snippet()
+        job_id = snippet.highlight_job.pk
+        HighlightJob.objects.filter(pk=job_id).update(attempts=3)
+
+        with mock.patch("snippets.jobs.highlight_tracked") as highlight_tracked:
+            self.assertTrue(process_job(job_id))
+
+        highlight_tracked.assert_not_called()
+        snippet.refresh_from_db()
+        self.assertFalse(snippet.highlight_pending)
+        self.assertIn("queued", snippet.highlighted)
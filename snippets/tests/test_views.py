@@ -1,18 +1,43 @@
+import csv
+import gzip
+import io
+import json
+import os
+import tempfile
+import time
+from unittest import mock
+
 from django.apps import apps
 from django.contrib.auth.hashers import make_password
-from django.test import TestCase
+from django.core.cache import caches
+from django.core.exceptions import ValidationError
+from django.core.management import call_command
+from django.db import DatabaseError, connection
+from django.test import TestCase, override_settings
+from django.test.utils import CaptureQueriesContext
 from django.urls import reverse
+from pygments import highlight
+from pygments.formatters.html import HtmlFormatter
+from pygments.lexers import get_lexer_by_name
 from rest_framework import status
 from rest_framework.test import APITestCase
 
 from accounts.models import CustomUser
+from history.models import AuditLog
+from history.querysets import AuditedQuerySet
+from snippets import incremental
+from snippets.highlight_store import delete_highlight_files, highlight_path
+from snippets.highlighting import render_document
 from snippets.models import Snippet
+from tutorial.responsecache import ResponseCache, get_response_cache
 
 
 class SnippetsTestCaseBase(APITestCase):
     fixtures = ["accounts_users", "snippets_snippets"]
 
     def setUp(self):
+        # Test rollbacks undo writes without bumping the cache generations.
+        get_response_cache().clear()
         custom_user_model = apps.get_model("accounts.CustomUser")
         for user in custom_user_model.objects.all():
             user.password = make_password(user.password)
@@ -41,6 +66,116 @@ class SnippetsListViewTests(SnippetsTestCaseBase):
         self.assertEqual(status.HTTP_200_OK, response.status_code)
         self.assertEqual(1, response.data["count"])
 
+    def test_list_does_not_load_highlighted_html(self):
+        with CaptureQueriesContext(connection) as queries:
+            response = self.client.get(reverse("snippet-list"))
+
+        self.assertEqual(status.HTTP_200_OK, response.status_code)
+        self.assertEqual("second-schmo", response.data["results"][0]["owner"])
+        for query in queries.captured_queries:
+            self.assertNotIn('"highlighted"', query["sql"])
+
+
+class SnippetsListCacheTests(SnippetsTestCaseBase):
+    def test_writes_invalidate_cached_pages(self):
+        self.client.get(reverse("snippet-list"))
+        with self.assertNumQueries(0):
+            response = self.client.get(reverse("snippet-list"))
+        self.assertEqual(1, json.loads(response.content)["count"])
+
+        with self.captureOnCommitCallbacks(execute=True):
+            Snippet.objects.create(owner=self.non_staff_user, code="pass")
+        response = self.client.get(reverse("snippet-list"))
+        self.assertEqual(2, json.loads(response.content)["count"])
+
+        # Owners are shown by username.
+        with self.captureOnCommitCallbacks(execute=True):
+            self.active_user.username = "renamed"
+            self.active_user.save()
+        response = self.client.get(reverse("snippet-list"))
+        self.assertEqual("renamed", json.loads(response.content)["results"][0]["owner"])
+
+    def test_writes_invalidate_cached_pages_once_committed(self):
+        self.client.get(reverse("snippet-list"))
+
+        with self.captureOnCommitCallbacks(execute=True):
+            Snippet.objects.create(owner=self.non_staff_user, code="pass")
+            # Until the commit, other requests can only see the old rows, so
+            # whatever they cache must not outlive it.
+            with self.assertNumQueries(0):
+                self.client.get(reverse("snippet-list"))
+
+        response = self.client.get(reverse("snippet-list"))
+        self.assertEqual(2, json.loads(response.content)["count"])
+
+    def test_nothing_is_cached_without_a_shared_backend(self):
+        for backend in (None, "default"):
+            with (
+                override_settings(API_RESPONSE_CACHE={"BACKEND": backend}),
+                mock.patch("tutorial.responsecache._cache", None),
+            ):
+                self.client.get(reverse("snippet-list"))
+                with CaptureQueriesContext(connection) as queries:
+                    self.client.get(reverse("snippet-list"))
+
+            self.assertTrue(queries.captured_queries, backend)
+
+    def test_bumps_are_seen_through_another_cache_client(self):
+        # Each process has its own cache client and local entries.
+        here = ResponseCache(caches.create_connection("shared"))
+        there = ResponseCache(caches.create_connection("shared"))
+        key = there.make_key(["snippets"], ["page"])
+        there.set(key, (b"old", "application/json"))
+        self.assertEqual((b"old", "application/json"), here.get(key))
+
+        here.bump("snippets")
+
+        self.assertNotEqual(key, there.make_key(["snippets"], ["page"]))
+
+    def test_browsable_api_is_not_cached(self):
+        self.client.get(reverse("snippet-list"), HTTP_ACCEPT="text/html")
+
+        with CaptureQueriesContext(connection) as queries:
+            self.client.get(reverse("snippet-list"), HTTP_ACCEPT="text/html")
+        self.assertTrue(queries.captured_queries)
+
+    def test_api_root_is_cached(self):
+        first = self.client.get("/")
+        with self.assertNumQueries(0):
+            second = self.client.get("/")
+        self.assertEqual(first.content, second.content)
+
+
+class SnippetsCursorPaginationTests(SnippetsTestCaseBase):
+    def setUp(self):
+        super().setUp()
+        for number in range(4):
+            Snippet.objects.create(
+                owner=self.non_staff_user, title=f"cursor-{number}", code="pass"
+            )
+
+    def test_cursor_pages_walk_every_snippet_in_creation_order(self):
+        url = reverse("snippet-list") + "?pagination=cursor&page_size=2"
+        titles = []
+        while url:
+            response = self.client.get(url)
+            self.assertEqual(status.HTTP_200_OK, response.status_code)
+            self.assertNotIn("count", response.data)
+            titles.extend(snippet["title"] for snippet in response.data["results"])
+            url = response.data["next"]
+
+        self.assertEqual(
+            ["Test-Snippet", "cursor-0", "cursor-1", "cursor-2", "cursor-3"], titles
+        )
+
+    @override_settings(API_MAX_PAGE_SIZE=3)
+    def test_page_size_is_capped(self):
+        for params in ({"page_size": 50}, {"page_size": 50, "pagination": "cursor"}):
+            response = self.client.get(reverse("snippet-list"), params)
+
+            self.assertEqual(status.HTTP_200_OK, response.status_code)
+            self.assertEqual(3, len(response.data["results"]))
+
 
 class SnippetsCreateViewTests(SnippetsTestCaseBase):
     def test_staff_user_can_create_snippets(self):
@@ -128,6 +263,34 @@ class SnippetUpdateViewTests(SnippetsTestCaseBase):
 
         self.assertEqual(status.HTTP_403_FORBIDDEN, response.status_code)
 
+    @override_settings(SNIPPETS_INCREMENTAL_HIGHLIGHT={"MIN_LINES": 0})
+    def test_editing_a_line_only_lexes_around_it(self):
+        self.client.force_authenticate(user=self.active_user)
+        url = reverse("snippet-detail", kwargs={"pk": 1})
+        lines = [f"value_{index} = {index}" for index in range(200)]
+        self.client.patch(url, data={"code": "\n".join(lines)}, format="json")
+        lines[150] = "value_150 = 'edited'"
+
+        with mock.patch.object(incremental, "lex", wraps=incremental.lex) as lex:
+            response = self.client.patch(
+                url, data={"code": "\n".join(lines)}, format="json"
+            )
+
+        self.assertEqual(status.HTTP_200_OK, response.status_code)
+        snippet = Snippet.objects.get(pk=1)
+        self.assertEqual(
+            highlight(
+                snippet.code,
+                get_lexer_by_name(snippet.language),
+                HtmlFormatter(
+                    style=snippet.style, linenos="table" if snippet.linenos else False
+                ),
+            ),
+            snippet.highlighted,
+        )
+        self.assertEqual(1, lex.call_count)
+        self.assertGreater(lex.call_args.args[3], snippet.code.index("value_100 "))
+
 
 class CustomUserDeleteViewTests(SnippetsTestCaseBase):
     def test_staff_user_cannot_delete_snippet_they_dont_own(self):
@@ -143,3 +306,553 @@ class CustomUserDeleteViewTests(SnippetsTestCaseBase):
         response = self.client.delete(reverse("snippet-detail", kwargs={"pk": 1}))
 
         self.assertEqual(status.HTTP_204_NO_CONTENT, response.status_code)
+
+
+class SnippetHighlightViewTests(SnippetsTestCaseBase):
+    def test_highlight_is_wrapped_in_document_linking_style_sheet(self):
+        response = self.client.get(reverse("snippet-highlight", kwargs={"pk": 1}))
+
+        self.assertEqual(status.HTTP_200_OK, response.status_code)
+        content = response.content.decode()
+        self.assertIn("<title>Test-Snippet</title>", content)
+        self.assertIn(
+            reverse("snippet-style-css", kwargs={"style": "friendly"}), content
+        )
+        self.assertIn('<span class="nf">test_function</span>', content)
+
+    def test_style_sheet_is_cacheable(self):
+        response = self.client.get(
+            reverse("snippet-style-css", kwargs={"style": "friendly"})
+        )
+
+        self.assertEqual(status.HTTP_200_OK, response.status_code)
+        self.assertTrue(response["Content-Type"].startswith("text/css"))
+        self.assertIn("max-age=86400", response["Cache-Control"])
+        self.assertIn("body .k", response.content.decode())
+
+    def test_unknown_style_sheet_is_not_found(self):
+        response = self.client.get(
+            reverse("snippet-style-css", kwargs={"style": "no-such-style"})
+        )
+
+        self.assertEqual(status.HTTP_404_NOT_FOUND, response.status_code)
+
+
+class ConditionalGetTests(SnippetsTestCaseBase):
+    def test_unchanged_highlight_is_not_modified_without_loading_it(self):
+        url = reverse("snippet-highlight", kwargs={"pk": 1})
+        response = self.client.get(url)
+        etag = response["ETag"]
+        self.assertTrue(etag.startswith('"1-1-'))
+        self.assertIn("Last-Modified", response)
+
+        with CaptureQueriesContext(connection) as queries:
+            response = self.client.get(url, HTTP_IF_NONE_MATCH=etag)
+
+        self.assertEqual(status.HTTP_304_NOT_MODIFIED, response.status_code)
+        self.assertEqual(etag, response["ETag"])
+        self.assertEqual(b"", response.content)
+        self.assertEqual(1, len(queries))
+        self.assertNotIn("highlighted", queries[0]["sql"])
+
+    def test_if_modified_since_is_honoured(self):
+        url = reverse("snippet-detail", kwargs={"pk": 1})
+        last_modified = self.client.get(url)["Last-Modified"]
+
+        response = self.client.get(url, HTTP_IF_MODIFIED_SINCE=last_modified)
+
+        self.assertEqual(status.HTTP_304_NOT_MODIFIED, response.status_code)
+
+    def test_saving_changes_the_etag(self):
+        url = reverse("snippet-detail", kwargs={"pk": 1})
+        etag = self.client.get(url)["ETag"]
+
+        self.client.force_authenticate(user=self.active_user)
+        self.client.patch(url, {"title": "Renamed"}, format="json")
+        response = self.client.get(url, HTTP_IF_NONE_MATCH=etag)
+
+        self.assertEqual(status.HTTP_200_OK, response.status_code)
+        self.assertEqual("Renamed", response.data["title"])
+        self.assertNotEqual(etag, response["ETag"])
+        self.assertEqual(2, Snippet.objects.get(pk=1).version)
+
+    def test_queryset_updates_change_the_etag(self):
+        url = reverse("snippet-detail", kwargs={"pk": 1})
+        response = self.client.get(url)
+
+        Snippet.objects.filter(pk=1).update(title="Renamed")
+        response = self.client.get(
+            url,
+            HTTP_IF_NONE_MATCH=response["ETag"],
+            HTTP_IF_MODIFIED_SINCE=response["Last-Modified"],
+        )
+
+        self.assertEqual(status.HTTP_200_OK, response.status_code)
+        self.assertEqual(2, Snippet.objects.get(pk=1).version)
+
+    def test_admin_does_not_offer_the_version(self):
+        self.staff_user.is_superuser = True
+        self.staff_user.save()
+        self.client.force_login(self.staff_user)
+
+        response = self.client.get(reverse("admin:snippets_snippet_change", args=[1]))
+
+        self.assertNotIn("version", response.context["adminform"].form.fields)
+
+    def test_formats_have_different_etags(self):
+        url = reverse("snippet-detail", kwargs={"pk": 1})
+        json_etag = self.client.get(url, HTTP_ACCEPT="application/json")["ETag"]
+        html_etag = self.client.get(url, HTTP_ACCEPT="text/html")["ETag"]
+
+        self.assertNotEqual(json_etag, html_etag)
+
+
+class CompressedHighlightTests(SnippetsTestCaseBase):
+    def setUp(self):
+        super().setUp()
+        self.snippet = Snippet.objects.create(
+            owner=self.active_user, title="Big", code="x = 1\n" * 200
+        )
+        self.url = reverse("snippet-highlight", kwargs={"pk": self.snippet.pk})
+
+    def test_precompressed_copy_is_served_to_gzip_clients(self):
+        plain = self.client.get(self.url)
+        compressed = self.client.get(self.url, HTTP_ACCEPT_ENCODING="gzip, br")
+
+        self.assertNotIn("Content-Encoding", plain)
+        self.assertEqual("gzip", compressed["Content-Encoding"])
+        self.assertEqual(plain.content, gzip.decompress(compressed.content))
+        self.assertEqual(
+            bytes(Snippet.objects.get(pk=self.snippet.pk).highlighted_gzip),
+            compressed.content,
+        )
+        self.assertIn("Accept-Encoding", compressed["Vary"])
+        self.assertNotEqual(plain["ETag"], compressed["ETag"])
+
+        response = self.client.get(
+            self.url,
+            HTTP_ACCEPT_ENCODING="gzip",
+            HTTP_IF_NONE_MATCH=compressed["ETag"],
+        )
+        self.assertEqual(status.HTTP_304_NOT_MODIFIED, response.status_code)
+
+    def test_compressed_copy_follows_the_title(self):
+        self.snippet.title = "Renamed"
+        self.snippet.save()
+
+        response = self.client.get(self.url, HTTP_ACCEPT_ENCODING="gzip")
+
+        self.assertIn(b"<title>Renamed</title>", gzip.decompress(response.content))
+
+    def test_api_responses_are_compressed(self):
+        response = self.client.get(
+            reverse("snippet-detail", kwargs={"pk": self.snippet.pk}),
+            HTTP_ACCEPT_ENCODING="gzip",
+        )
+
+        self.assertEqual("gzip", response["Content-Encoding"])
+        self.assertEqual(
+            self.snippet.code, json.loads(gzip.decompress(response.content))["code"]
+        )
+
+
+class SnippetCatalogTests(SnippetsTestCaseBase):
+    def test_catalog_is_cacheable(self):
+        response = self.client.get(reverse("snippet-catalog"))
+
+        self.assertEqual(status.HTTP_200_OK, response.status_code)
+        self.assertIn("max-age=86400", response["Cache-Control"])
+        catalog = json.loads(response.content)
+        self.assertIn({"alias": "python", "name": "Python"}, catalog["languages"])
+        self.assertIn("friendly", catalog["styles"])
+
+        response = self.client.get(
+            reverse("snippet-catalog"), HTTP_IF_NONE_MATCH=response["ETag"]
+        )
+        self.assertEqual(status.HTTP_304_NOT_MODIFIED, response.status_code)
+
+    def test_unknown_language_and_style_are_rejected(self):
+        self.client.force_authenticate(user=self.active_user)
+
+        response = self.client.post(
+            reverse("snippet-list"),
+            {"code": "x", "language": "no-such-language", "style": "nope"},
+            format="json",
+        )
+
+        self.assertEqual(status.HTTP_400_BAD_REQUEST, response.status_code)
+        self.assertEqual(
+            ['"no-such-language" is not a valid choice.'], response.data["language"]
+        )
+        self.assertIn("style", response.data)
+
+    def test_saving_an_unknown_language_fails_cleanly(self):
+        snippet = Snippet(owner=self.active_user, code="x", language="nope")
+
+        with self.assertRaises(ValidationError) as raised:
+            snippet.save()
+        self.assertEqual(["language"], list(raised.exception.message_dict))
+
+    def test_admin_rejects_unknown_language(self):
+        self.staff_user.is_superuser = True
+        self.staff_user.save()
+        self.client.force_login(self.staff_user)
+
+        response = self.client.post(
+            reverse("admin:snippets_snippet_add"),
+            {
+                "title": "",
+                "code": "x",
+                "language": "nope",
+                "style": "friendly",
+                "owner": self.staff_user.pk,
+            },
+        )
+
+        self.assertEqual(status.HTTP_200_OK, response.status_code)
+        self.assertIn("language", response.context["adminform"].form.errors)
+
+    def test_options_does_not_list_every_language(self):
+        self.client.force_authenticate(user=self.active_user)
+
+        response = self.client.options(reverse("snippet-list"))
+
+        self.assertNotIn("choices", response.data["actions"]["POST"]["language"])
+
+
+class RenderStatsTests(SnippetsTestCaseBase):
+    def test_render_stats_are_staff_only(self):
+        self.client.force_authenticate(user=self.non_staff_user)
+        response = self.client.get(reverse("snippet-render-stats"))
+        self.assertEqual(status.HTTP_403_FORBIDDEN, response.status_code)
+
+        self.client.force_authenticate(user=self.staff_user)
+        response = self.client.get(reverse("snippet-render-stats"))
+        self.assertEqual(status.HTTP_200_OK, response.status_code)
+        self.assertEqual({"lexers", "formatters", "style_sheets"}, set(response.data))
+        self.assertIn("hit_rate", response.data["lexers"])
+
+
+class LargeSnippetTests(SnippetsTestCaseBase):
+    def setUp(self):
+        super().setUp()
+        directory = tempfile.TemporaryDirectory()
+        self.addCleanup(directory.cleanup)
+        self.directory = directory.name
+        limits = override_settings(
+            SNIPPETS_SIZE_LIMITS={
+                "MAX_CODE_SIZE": 8000,
+                "STREAM_THRESHOLD": 1000,
+                "DIRECTORY": self.directory,
+            }
+        )
+        limits.enable()
+        self.addCleanup(limits.disable)
+
+        self.code = "def f(a):\n    return a\n" * 100
+        self.client.force_authenticate(user=self.active_user)
+        response = self.client.post(
+            reverse("snippet-list"),
+            {"title": "Large", "code": self.code, "linenos": True},
+            format="json",
+        )
+        self.snippet = Snippet.objects.get(pk=response.data["id"])
+        self.url = reverse("snippet-highlight", kwargs={"pk": self.snippet.pk})
+
+    def stored_files(self):
+        return sorted(os.listdir(self.directory))
+
+    def test_large_snippets_are_highlighted_to_a_file(self):
+        self.assertEqual("", self.snippet.highlighted)
+        self.assertEqual([self.snippet.highlight_file], self.stored_files())
+
+        response = self.client.get(self.url, HTTP_ACCEPT_ENCODING="gzip")
+
+        self.assertEqual(status.HTTP_200_OK, response.status_code)
+        self.assertEqual("bytes", response["Accept-Ranges"])
+        self.assertNotIn("Content-Encoding", response)
+        self.assertIn("ETag", response)
+        css_url = reverse("snippet-style-css", kwargs={"style": "friendly"})
+        expected = render_document(
+            highlight(
+                self.code,
+                get_lexer_by_name("python"),
+                HtmlFormatter(style="friendly", linenos="inline"),
+            ),
+            "Large",
+            css_url,
+        )
+        self.assertEqual(expected.encode(), b"".join(response.streaming_content))
+
+    def test_byte_ranges(self):
+        full = b"".join(self.client.get(self.url).streaming_content)
+
+        response = self.client.get(self.url, HTTP_RANGE="bytes=10-109")
+        self.assertEqual(status.HTTP_206_PARTIAL_CONTENT, response.status_code)
+        self.assertEqual(f"bytes 10-109/{len(full)}", response["Content-Range"])
+        self.assertEqual(full[10:110], b"".join(response.streaming_content))
+
+        response = self.client.get(self.url, HTTP_RANGE="bytes=-20")
+        self.assertEqual(full[-20:], b"".join(response.streaming_content))
+
+        response = self.client.get(self.url, HTTP_RANGE=f"bytes={len(full)}-")
+        self.assertEqual(416, response.status_code)
+
+        response = self.client.get(
+            self.url, HTTP_RANGE="bytes=0-9", HTTP_IF_RANGE='"stale"'
+        )
+        self.assertEqual(status.HTTP_200_OK, response.status_code)
+
+    def test_replaced_and_deleted_files_are_removed(self):
+        url = reverse("snippet-detail", kwargs={"pk": self.snippet.pk})
+        with self.captureOnCommitCallbacks(execute=True):
+            self.client.patch(url, {"title": "Renamed"}, format="json")
+        self.snippet.refresh_from_db()
+        self.assertEqual([self.snippet.highlight_file], self.stored_files())
+
+        with self.captureOnCommitCallbacks(execute=True):
+            self.client.patch(url, {"code": "print(1)"}, format="json")
+        self.snippet.refresh_from_db()
+        self.assertEqual("", self.snippet.highlight_file)
+        self.assertIn("print", self.snippet.highlighted)
+        self.assertEqual([], self.stored_files())
+
+    def test_failed_writes_delete_the_files_they_rendered(self):
+        url = reverse("snippet-detail", kwargs={"pk": self.snippet.pk})
+        with mock.patch.object(Snippet, "save_base", side_effect=DatabaseError):
+            with self.assertRaises(DatabaseError):
+                self.client.patch(url, {"code": self.code + "#"}, format="json")
+        self.assertEqual([self.snippet.highlight_file], self.stored_files())
+
+        with mock.patch.object(
+            AuditedQuerySet, "bulk_update", side_effect=DatabaseError
+        ):
+            with self.assertRaises(DatabaseError):
+                self.client.patch(
+                    reverse("snippet-bulk"),
+                    [{"id": self.snippet.pk, "code": self.code + "#"}],
+                    format="json",
+                )
+        self.assertEqual([self.snippet.highlight_file], self.stored_files())
+
+    def test_only_store_files_are_ever_deleted(self):
+        outside = tempfile.TemporaryDirectory()
+        self.addCleanup(outside.cleanup)
+        victim = os.path.join(outside.name, "victim.txt")
+        with open(victim, "w") as stream:
+            stream.write("keep me")
+
+        self.staff_user.is_superuser = True
+        self.staff_user.save()
+        self.client.force_login(self.staff_user)
+        with self.captureOnCommitCallbacks(execute=True):
+            self.client.post(
+                reverse("admin:snippets_snippet_change", args=[self.snippet.pk]),
+                {
+                    "title": "Large",
+                    "code": self.code,
+                    "linenos": "on",
+                    "language": "python",
+                    "style": "friendly",
+                    "owner": self.active_user.pk,
+                    "highlight_file": victim,
+                },
+            )
+        self.snippet.refresh_from_db()
+        self.assertEqual([self.snippet.highlight_file], self.stored_files())
+
+        self.snippet.highlight_file = victim
+        with self.captureOnCommitCallbacks(execute=True):
+            self.snippet.save()
+        with self.captureOnCommitCallbacks(execute=True):
+            Snippet.objects.get(pk=self.snippet.pk).delete()
+        delete_highlight_files([victim, "../victim.txt"])
+
+        self.assertTrue(os.path.exists(victim))
+        with self.assertRaises(ValueError):
+            highlight_path(victim)
+
+    def test_sweep_deletes_unreferenced_files(self):
+        stray = os.path.join(self.directory, "stray.html")
+        with open(stray, "w") as stream:
+            stream.write("<html></html>")
+        recent = os.path.join(self.directory, "recent.html")
+        with open(recent, "w") as stream:
+            stream.write("<html></html>")
+        old = time.time() - 2 * 60 * 60
+        for name in (stray, os.path.join(self.directory, self.snippet.highlight_file)):
+            os.utime(name, (old, old))
+
+        out = io.StringIO()
+        call_command("sweep_highlight_store", stdout=out)
+
+        self.assertIn("Deleted 1 unreferenced highlight file(s).", out.getvalue())
+        self.assertEqual(
+            sorted([self.snippet.highlight_file, "recent.html"]), self.stored_files()
+        )
+
+    def test_code_over_the_limit_is_rejected(self):
+        response = self.client.post(
+            reverse("snippet-list"), {"code": "x" * 8001}, format="json"
+        )
+
+        self.assertEqual(status.HTTP_400_BAD_REQUEST, response.status_code)
+        self.assertIn("code", response.data)
+
+
+class SnippetExportTests(SnippetsTestCaseBase):
+    def test_export_ndjson(self):
+        response = self.client.get(reverse("snippet-export", args=["ndjson"]))
+
+        self.assertEqual(status.HTTP_200_OK, response.status_code)
+        self.assertTrue(response.streaming)
+        self.assertEqual("application/x-ndjson", response["Content-Type"])
+        rows = [json.loads(line) for line in b"".join(response).splitlines()]
+        self.assertEqual([1], [row["id"] for row in rows])
+        self.assertEqual("second-schmo", rows[0]["owner"])
+        self.assertNotIn("highlighted", rows[0])
+
+    def test_export_csv_is_gzipped_when_accepted(self):
+        response = self.client.get(
+            reverse("snippet-export", args=["csv"]),
+            HTTP_ACCEPT="text/csv",
+            HTTP_ACCEPT_ENCODING="gzip, deflate",
+        )
+
+        self.assertEqual(status.HTTP_200_OK, response.status_code)
+        self.assertEqual("gzip", response["Content-Encoding"])
+        rows = list(
+            csv.reader(io.StringIO(gzip.decompress(b"".join(response)).decode()))
+        )
+        self.assertEqual(
+            ["id", "created", "title", "code", "linenos", "language", "style", "owner"],
+            rows[0],
+        )
+        self.assertEqual(["1"], [row[0] for row in rows[1:]])
+
+    def test_unknown_export_format(self):
+        response = self.client.get(reverse("snippet-export", args=["xml"]))
+        self.assertEqual(status.HTTP_404_NOT_FOUND, response.status_code)
+
+
+class SnippetBulkTests(SnippetsTestCaseBase):
+    def setUp(self):
+        super().setUp()
+        self.client.force_authenticate(user=self.non_staff_user)
+        self.url = reverse("snippet-bulk")
+
+    def create(self, count):
+        return [
+            Snippet.objects.create(
+                title=f"mine {number}",
+                code=f"print({number})",
+                owner=self.non_staff_user,
+            )
+            for number in range(count)
+        ]
+
+    def test_bulk_create(self):
+        with self.captureOnCommitCallbacks(execute=True):
+            response = self.client.post(
+                self.url,
+                [
+                    {"title": "one", "code": "print(1)"},
+                    {
+                        "title": "two",
+                        "code": "puts 2",
+                        "language": "ruby",
+                        "linenos": True,
+                    },
+                ],
+                format="json",
+            )
+
+        self.assertEqual(status.HTTP_201_CREATED, response.status_code)
+        self.assertEqual(["one", "two"], [item["title"] for item in response.data])
+        snippets = Snippet.objects.filter(owner=self.non_staff_user).order_by("id")
+        self.assertEqual(2, len(snippets))
+        for snippet in snippets:
+            self.assertTrue(snippet.highlighted.startswith('<div class="highlight">'))
+        self.assertEqual(
+            {("create", snippet.pk) for snippet in snippets},
+            set(
+                AuditLog.objects.filter(model_name="Snippet").values_list(
+                    "action", "object_id"
+                )
+            ),
+        )
+
+    def test_bulk_create_reports_errors_per_item(self):
+        response = self.client.post(
+            self.url,
+            [
+                {"code": "print(1)"},
+                {"title": "no code"},
+                {"code": "x", "style": "nope"},
+            ],
+            format="json",
+        )
+
+        self.assertEqual(status.HTTP_400_BAD_REQUEST, response.status_code)
+        self.assertEqual({}, response.data[0])
+        self.assertIn("code", response.data[1])
+        self.assertIn("style", response.data[2])
+        self.assertFalse(Snippet.objects.filter(owner=self.non_staff_user).exists())
+
+    def test_bulk_update(self):
+        first, second = self.create(2)
+
+        response = self.client.patch(
+            self.url,
+            [
+                {"id": first.pk, "code": "print(10)"},
+                {"id": second.pk, "title": "renamed"},
+            ],
+            format="json",
+        )
+
+        self.assertEqual(status.HTTP_200_OK, response.status_code)
+        first.refresh_from_db()
+        second.refresh_from_db()
+        self.assertEqual("print(10)", first.code)
+        self.assertIn("10", first.highlighted)
+        self.assertEqual("renamed", second.title)
+        self.assertEqual("print(1)", second.code)
+
+    def test_bulk_update_only_reaches_own_snippets(self):
+        (mine,) = self.create(1)
+
+        response = self.client.patch(
+            self.url,
+            [{"id": mine.pk, "title": "renamed"}, {"id": 1, "title": "not mine"}],
+            format="json",
+        )
+
+        self.assertEqual(status.HTTP_400_BAD_REQUEST, response.status_code)
+        self.assertEqual([{}, {"id": ["Not found."]}], response.data)
+        mine.refresh_from_db()
+        self.assertEqual("mine 0", mine.title)
+
+    def test_bulk_delete(self):
+        snippets = self.create(3)
+
+        response = self.client.delete(
+            self.url, [snippet.pk for snippet in snippets[:2]], format="json"
+        )
+
+        self.assertEqual(status.HTTP_204_NO_CONTENT, response.status_code)
+        self.assertEqual(
+            [snippets[2].pk],
+            list(
+                Snippet.objects.filter(owner=self.non_staff_user).values_list(
+                    "pk", flat=True
+                )
+            ),
+        )
+
+    @override_settings(SNIPPETS_BULK={"MAX_ITEMS": 2})
+    def test_bulk_requests_are_limited(self):
+        for items in ([], [{"code": "a"}] * 3, {"code": "a"}):
+            response = self.client.post(self.url, items, format="json")
+            self.assertEqual(status.HTTP_400_BAD_REQUEST, response.status_code)
+            self.assertIn("non_field_errors", response.data)
@@ -5,6 +5,8 @@ from snippets import views
 
 urlpatterns = [
     path("", views.SnippetList.as_view(), name="snippet-list"),
+    path("bulk/", views.SnippetBulk.as_view(), name="snippet-bulk"),
+    path("render-stats/", views.RenderStats.as_view(), name="snippet-render-stats"),
     path("<int:pk>/", views.SnippetDetail.as_view(), name="snippet-detail"),
     path(
         "<int:pk>/highlight/",
@@ -13,4 +15,16 @@ urlpatterns = [
     ),
 ]
 
-urlpatterns = format_suffix_patterns(urlpatterns)
+urlpatterns = format_suffix_patterns(urlpatterns) + [
+    path(
+        "export.<str:export_format>",
+        views.SnippetExport.as_view(),
+        name="snippet-export",
+    ),
+    path("catalog/", views.snippet_catalog, name="snippet-catalog"),
+    path(
+        "styles/<str:style>.css",
+        views.snippet_style_css,
+        name="snippet-style-css",
+    ),
+]
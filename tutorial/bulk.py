@@ -0,0 +1,16 @@
+from rest_framework.exceptions import ValidationError
+from rest_framework.settings import api_settings
+
+
+def check_item_list(items, max_items):
+    """
+    Reject a bulk request body that is not a non-empty list of at most
+    `max_items` items, before any item is looked at.
+    """
+    if not isinstance(items, list) or not items:
+        message = "Expected a non-empty list of items."
+    elif len(items) > max_items:
+        message = f"Ensure this list has no more than {max_items} items."
+    else:
+        return
+    raise ValidationError({api_settings.NON_FIELD_ERRORS_KEY: [message]})
@@ -0,0 +1,13 @@
+from django.middleware import gzip
+
+
+class GZipMiddleware(gzip.GZipMiddleware):
+    """
+    Django's `GZipMiddleware`, except for responses that serve byte ranges:
+    their offsets refer to the uncompressed file.
+    """
+
+    def process_response(self, request, response):
+        if response.has_header("Accept-Ranges") or response.status_code == 206:
+            return response
+        return super().process_response(request, response)
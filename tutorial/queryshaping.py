@@ -0,0 +1,124 @@
+import functools
+from collections import namedtuple
+
+from django.core.exceptions import FieldDoesNotExist
+from django.db.models import Prefetch
+from rest_framework import permissions
+from rest_framework.relations import ManyRelatedField, RelatedField
+
+QueryPlan = namedtuple("QueryPlan", "only select_related prefetch unresolved")
+
+
+def _resolve_source(model, source_attrs):
+    """
+    Map a serializer field's `source_attrs` onto an ORM lookup. Returns
+    ("only", lookup), ("prefetch", lookup, model_field) or None when the
+    source is not a model field (a property, method or annotation).
+    """
+    lookups = []
+    for position, attr in enumerate(source_attrs):
+        try:
+            model_field = model._meta.get_field(attr)
+        except FieldDoesNotExist:
+            return None
+
+        lookups.append(attr)
+        last = position == len(source_attrs) - 1
+        if model_field.one_to_many or model_field.many_to_many:
+            return ("prefetch", "__".join(lookups), model_field) if last else None
+        if not model_field.concrete:
+            return None
+        if not last:
+            if not model_field.is_relation:
+                return None
+            model = model_field.related_model
+            continue
+        return "only", "__".join(lookups)
+
+
+@functools.cache
+def serializer_query_plan(serializer_class, model):
+    """
+    Work out which columns and relations rendering `serializer_class`
+    touches, so everything else can be left in the database.
+    """
+    only = {model._meta.pk.name}
+    select_related = set()
+    prefetch = []
+    unresolved = set()
+
+    for field in serializer_class().fields.values():
+        if field.write_only:
+            continue
+
+        if field.source == "*":
+            # Identity fields only need their lookup value; anything else
+            # rendering the whole object could read any column.
+            lookup_field = getattr(field, "lookup_field", None)
+            if lookup_field is None:
+                unresolved.add(field.field_name)
+            else:
+                only.add(lookup_field)
+            continue
+
+        resolved = _resolve_source(model, field.source_attrs)
+        if resolved is None:
+            unresolved.add(field.source_attrs[0])
+        elif resolved[0] == "only":
+            lookup = resolved[1]
+            only.add(lookup)
+            if "__" in lookup:
+                select_related.add(lookup.rsplit("__", 1)[0])
+        else:
+            _, lookup, model_field = resolved
+            related_only = None
+            if isinstance(field, ManyRelatedField) and isinstance(
+                field.child_relation, RelatedField
+            ):
+                # Links and primary keys need nothing but the keys.
+                related_model = model_field.related_model
+                related_only = [related_model._meta.pk.attname]
+                if model_field.one_to_many:
+                    related_only.append(model_field.field.attname)
+            prefetch.append((lookup, model_field.related_model, related_only))
+
+    return QueryPlan(
+        only=tuple(sorted(only)),
+        select_related=tuple(sorted(select_related)),
+        prefetch=tuple(prefetch),
+        unresolved=frozenset(unresolved),
+    )
+
+
+def shape_queryset(queryset, serializer_class):
+    plan = serializer_query_plan(serializer_class, queryset.model)
+
+    if plan.select_related:
+        queryset = queryset.select_related(*plan.select_related)
+
+    for lookup, related_model, related_only in plan.prefetch:
+        related_queryset = related_model._default_manager.all()
+        if related_only is not None:
+            related_queryset = related_queryset.only(*related_only)
+        queryset = queryset.prefetch_related(
+            Prefetch(lookup, queryset=related_queryset)
+        )
+
+    # Columns can only be restricted when every rendered source is known;
+    # annotations are computed by the query itself and don't count.
+    if plan.unresolved <= set(queryset.query.annotations):
+        queryset = queryset.only(*plan.only)
+    return queryset
+
+
+class ShapedQuerysetMixin:
+    """
+    Limit read queries to the columns and relations the serializer renders.
+    Writes keep loading full rows so `save()` persists every field.
+    """
+
+    def filter_queryset(self, queryset):
+        queryset = super().filter_queryset(queryset)
+        if self.request.method in permissions.SAFE_METHODS:
+            queryset = shape_queryset(queryset, self.get_serializer_class())
+        return queryset
@@ -0,0 +1,200 @@
+import hashlib
+import uuid
+
+from django.conf import settings
+from django.core.cache import caches
+from django.core.cache.backends.locmem import LocMemCache
+from django.db import transaction
+from django.db.models.signals import post_delete, post_save
+from django.http import HttpResponse
+from rest_framework import status
+
+from history.signals import bulk_operation
+from tutorial.caching import LRUCache
+
+
+def new_generation():
+    return uuid.uuid4().hex
+
+
+class ResponseCache:
+    """
+    Rendered GET responses, in a TTL'd in-process LRU in front of a Django
+    cache backend shared by every process.
+
+    Every cached response belongs to one or more scopes (e.g. "snippets"),
+    each with a generation counter that is part of the key. Writes bump the
+    generation of the scopes they touch, which orphans every response built
+    from the old data at once; the LRU and TTL dispose of the orphans. The
+    generations live in the backend, so a write in one process orphans the
+    responses cached by all of them.
+    """
+
+    def __init__(
+        self, backend, max_entries=512, ttl=30, key_prefix="tutorial:response:"
+    ):
+        self.local = LRUCache(max_entries, ttl=ttl)
+        self.ttl = ttl
+        self.backend = backend
+        self.key_prefix = key_prefix
+
+    def _generation_key(self, scope):
+        return f"{self.key_prefix}generation:{scope}"
+
+    def generation(self, scope):
+        return self.backend.get_or_set(
+            self._generation_key(scope), new_generation, None
+        )
+
+    def bump(self, scope):
+        # A fresh token rather than an increment: backends without an atomic
+        # incr (files, the database) could lose one of two racing bumps.
+        self.backend.set(self._generation_key(scope), new_generation(), None)
+
+    def bump_on_commit(self, scope, using=None):
+        """
+        Bump `scope` once the current transaction commits, or right away
+        outside of one. Bumping earlier would let a request that reads the
+        old data before the commit cache it under the new generation.
+        """
+        transaction.on_commit(lambda: self.bump(scope), using=using)
+
+    def make_key(self, scopes, parts):
+        generations = [f"{scope}={self.generation(scope)}" for scope in scopes]
+        digest = hashlib.sha256("\0".join([*generations, *parts]).encode())
+        return digest.hexdigest()
+
+    def get(self, key):
+        entry = self.local.get(key)
+        if entry is None:
+            entry = self.backend.get(self.key_prefix + key)
+            if entry is not None:
+                self.local.set(key, entry)
+        return entry
+
+    def set(self, key, entry):
+        self.local.set(key, entry)
+        self.backend.set(self.key_prefix + key, entry, self.ttl)
+
+    def clear(self):
+        self.local.clear()
+        self.backend.clear()
+
+
+_cache = None
+
+
+def response_cache_options():
+    options = {"ENABLED": True, "MAX_ENTRIES": 512, "TTL": 30, "BACKEND": None}
+    options.update(getattr(settings, "API_RESPONSE_CACHE", {}))
+    return options
+
+
+def get_response_cache():
+    """
+    The response cache, or None unless BACKEND names a cache shared between
+    processes: generations kept by each process alone, as the local-memory
+    cache does, would let one serve what another's writes invalidated.
+    """
+    global _cache
+
+    if _cache is None:
+        options = response_cache_options()
+        if not options["BACKEND"]:
+            return None
+        backend = caches[options["BACKEND"]]
+        if isinstance(backend, LocMemCache):
+            return None
+        _cache = ResponseCache(
+            backend,
+            max_entries=options["MAX_ENTRIES"],
+            ttl=options["TTL"],
+        )
+    return _cache
+
+
+class CachedResponseMixin:
+    """
+    Serve GETs from the response cache. The key covers the view, the query
+    string, the host and format (links are absolute) and
+    `get_cache_visibility()`, which must name everything about the user
+    that changes the response. Views list the data they render in
+    `cache_scopes`.
+
+    Permissions and content negotiation still run on every request. Only
+    `cache_formats` are stored, since the browsable API renders per-user
+    forms and CSRF tokens.
+    """
+
+    cache_scopes = ()
+    cache_formats = ("json",)
+
+    def get_cache_visibility(self):
+        return "public"
+
+    def get_cache_key(self, request):
+        if request.accepted_renderer.format not in self.cache_formats:
+            return None
+        cache = get_response_cache()
+        if cache is None or not response_cache_options()["ENABLED"]:
+            return None
+
+        parts = [
+            type(self).__module__,
+            type(self).__qualname__,
+            request.get_host(),
+            request.accepted_media_type,
+            self.get_cache_visibility(),
+            *(
+                f"{name}={value}"
+                for name, values in sorted(request.query_params.lists())
+                for value in values
+            ),
+        ]
+        return cache.make_key(self.cache_scopes, parts)
+
+    def get(self, request, *args, **kwargs):
+        # The generations are read before the data, so a write racing with
+        # this request can only orphan the entry, not hide behind it.
+        key = self.get_cache_key(request)
+        if key is None:
+            return super().get(request, *args, **kwargs)
+
+        cache = get_response_cache()
+        entry = cache.get(key)
+        if entry is not None:
+            content, content_type = entry
+            return HttpResponse(content, content_type=content_type)
+
+        response = super().get(request, *args, **kwargs)
+        if response.status_code == status.HTTP_200_OK:
+
+            def store(rendered):
+                cache.set(key, (rendered.content, rendered["Content-Type"]))
+
+            response.add_post_render_callback(store)
+        return response
+
+
+def invalidate_scope_on_write(model, scope, ignore_fields=()):
+    """
+    Bump `scope` when a transaction that saves, deletes or changes `model`
+    rows in bulk commits. Saves that only touch `ignore_fields` leave it
+    alone.
+    """
+    ignore_fields = frozenset(ignore_fields)
+
+    def changed(sender, using=None, **kwargs):
+        cache = get_response_cache()
+        if cache is not None:
+            cache.bump_on_commit(scope, using=using)
+
+    def saved(sender, update_fields=None, **kwargs):
+        if update_fields and set(update_fields) <= ignore_fields:
+            return
+        changed(sender, **kwargs)
+
+    uid = f"tutorial.responsecache.{scope}.{model._meta.label_lower}"
+    post_save.connect(saved, sender=model, dispatch_uid=uid, weak=False)
+    post_delete.connect(changed, sender=model, dispatch_uid=uid, weak=False)
+    bulk_operation.connect(changed, sender=model, dispatch_uid=uid, weak=False)
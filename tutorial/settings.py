@@ -45,7 +45,10 @@ INSTALLED_APPS = [
 ]
 
 MIDDLEWARE = [
+    "history.middleware.AuditMiddleware",
     "django.middleware.security.SecurityMiddleware",
+    # Compresses what isn't already: exports and highlight pages come gzipped.
+    "tutorial.middleware.GZipMiddleware",
     "django.contrib.sessions.middleware.SessionMiddleware",
     "django.middleware.common.CommonMiddleware",
     "django.middleware.csrf.CsrfViewMiddleware",
@@ -89,6 +92,28 @@ DATABASES = {
 # Password validation
 # https://docs.djangoproject.com/en/4.1/ref/settings/#auth-password-validators
 
+# The first hasher is used for new passwords; passwords stored with any of
+# the others (or with other scrypt costs) are rehashed on the next login.
+PASSWORD_HASHERS = [
+    "accounts.hashers.TunableScryptPasswordHasher",
+    "django.contrib.auth.hashers.PBKDF2PasswordHasher",
+    "django.contrib.auth.hashers.PBKDF2SHA1PasswordHasher",
+    "django.contrib.auth.hashers.Argon2PasswordHasher",
+    "django.contrib.auth.hashers.BCryptSHA256PasswordHasher",
+]
+
+AUTHENTICATION_BACKENDS = ["accounts.backends.PooledHashingBackend"]
+
+# SCRYPT sets the cost of new hashes. Logins verify passwords on at most
+# VERIFY_WORKERS threads with VERIFY_QUEUE waiting or running; requests wait
+# QUEUE_TIMEOUT seconds for a slot before getting a 503.
+ACCOUNTS_PASSWORD_HASHING = {
+    "SCRYPT": {"WORK_FACTOR": 2**14, "BLOCK_SIZE": 8, "PARALLELISM": 1},
+    "VERIFY_WORKERS": 4,
+    "VERIFY_QUEUE": 64,
+    "QUEUE_TIMEOUT": 5.0,
+}
+
 AUTH_PASSWORD_VALIDATORS = [
     {
         "NAME": "django.contrib.auth.password_validation.UserAttributeSimilarityValidator",
@@ -130,10 +155,133 @@ AUTH_USER_MODEL = "accounts.CustomUser"
 DEFAULT_AUTO_FIELD = "django.db.models.BigAutoField"
 
 REST_FRAMEWORK = {
-    "DEFAULT_PAGINATION_CLASS": "rest_framework.pagination.PageNumberPagination",
+    "DEFAULT_PAGINATION_CLASS": "tutorial.pagination.PageNumberPagination",
     "PAGE_SIZE": 10,
     "DEFAULT_AUTHENTICATION_CLASSES": [
-        "rest_framework.authentication.TokenAuthentication",
+        "accounts.authentication.SignedTokenAuthentication",
+        "accounts.authentication.CachedTokenAuthentication",
         "rest_framework.authentication.SessionAuthentication",
     ],
 }
+
+# Token -> user lookups are cached for TTL seconds. BACKEND optionally names a
+# CACHES alias shared between processes; the in-process LRU is always used.
+ACCOUNTS_TOKEN_CACHE = {
+    "MAX_ENTRIES": 1024,
+    "TTL": 60,
+    "BACKEND": None,
+}
+
+# Signed access tokens live ACCESS_TTL seconds and are checked without a
+# query; revocations made by other processes are picked up every
+# REVOCATION_SYNC_INTERVAL seconds. Refresh tokens live REFRESH_TTL seconds.
+ACCOUNTS_SIGNED_TOKENS = {
+    "ACCESS_TTL": 5 * 60,
+    "REFRESH_TTL": 14 * 24 * 60 * 60,
+    "REVOCATION_SYNC_INTERVAL": 10,
+}
+
+# Upper bound for the `page_size` query parameter on every list endpoint.
+API_MAX_PAGE_SIZE = 100
+
+# "shared" is seen by every process on this host. Point it at Redis or
+# memcached when the API is served from more than one host.
+CACHES = {
+    "default": {
+        "BACKEND": "django.core.cache.backends.locmem.LocMemCache",
+    },
+    "shared": {
+        "BACKEND": "django.core.cache.backends.filebased.FileBasedCache",
+        "LOCATION": BASE_DIR / "shared_cache",
+    },
+}
+
+# JSON responses of the list endpoints and the API root are cached for TTL
+# seconds, and dropped as soon as a write to the snippets or users they show
+# commits. BACKEND names the CACHES alias holding the invalidation counters,
+# which must be shared by every process serving the API; responses aren't
+# cached without one, or with a local-memory cache.
+API_RESPONSE_CACHE = {
+    "ENABLED": True,
+    "MAX_ENTRIES": 512,
+    "TTL": 30,
+    "BACKEND": "shared",
+}
+
+# Bulk user creation hashes passwords in a process pool once there are at
+# least PARALLEL_THRESHOLD of them; HASH_PROCESSES None means one per CPU.
+ACCOUNTS_BULK = {
+    "MAX_ITEMS": 1000,
+    "HASH_PROCESSES": None,
+    "PARALLEL_THRESHOLD": 4,
+}
+
+# Rendered snippet HTML is cached by content hash. BACKEND optionally names a
+# CACHES alias shared between processes; the in-process LRU is always used.
+SNIPPETS_HIGHLIGHT_CACHE = {
+    "MAX_ENTRIES": 256,
+    "MAX_ENTRY_SIZE": 512 * 1024,
+    "BACKEND": None,
+    "TIMEOUT": 60 * 60 * 24,
+}
+
+# Snippets are limited to MAX_CODE_SIZE bytes of code. Those over
+# STREAM_THRESHOLD bytes are highlighted straight to a file under DIRECTORY
+# and served from there, with range requests, instead of from the database.
+# `manage.py sweep_highlight_store` deletes files left by rolled-back saves.
+SNIPPETS_SIZE_LIMITS = {
+    "MAX_CODE_SIZE": 4 * 1024 * 1024,
+    "STREAM_THRESHOLD": 256 * 1024,
+    "DIRECTORY": BASE_DIR / "highlight_store",
+}
+
+# Each process keeps up to LEXERS_PER_LANGUAGE idle lexers per language, plus
+# one formatter per style and line number setting; see /snippets/render-stats/.
+SNIPPETS_RENDER_ENGINE = {
+    "LEXERS_PER_LANGUAGE": 4,
+}
+
+# Snippets of at least MIN_LINES lines keep the lexer state every
+# CHECKPOINT_INTERVAL lines, so an edit only lexes the lines around it again.
+SNIPPETS_INCREMENTAL_HIGHLIGHT = {
+    "ENABLED": True,
+    "MIN_LINES": 500,
+    "CHECKPOINT_INTERVAL": 32,
+}
+
+# Bulk writes render their misses in a process pool once there are at least
+# PARALLEL_THRESHOLD of them; HIGHLIGHT_PROCESSES None means one per CPU.
+SNIPPETS_BULK = {
+    "MAX_ITEMS": 500,
+    "HIGHLIGHT_PROCESSES": None,
+    "PARALLEL_THRESHOLD": 8,
+}
+
+# When enabled, snippet writes only queue the Pygments render; a thread pool
+# picks up the job after commit and `manage.py process_highlight_jobs` drains
+# anything left behind by a restart. Failed renders are retried after
+# RETRY_DELAY seconds, doubled each time; after MAX_ATTEMPTS the code is
+# served without highlighting.
+SNIPPETS_ASYNC_HIGHLIGHT = {
+    "ENABLED": False,
+    "WORKERS": 2,
+    "MAX_ATTEMPTS": 3,
+    "RETRY_DELAY": 5,
+    "CLAIM_TIMEOUT": 5 * 60,
+}
+
+# Audit entries are buffered and written in batches; see history.writer.
+HISTORY_AUDIT_WRITER = {
+    "MAX_BATCH": 100,
+    "MAX_DELAY": 1.0,
+    "FLUSH_ON_REQUEST_END": True,
+}
+
+# Audit entries older than RETENTION_DAYS are moved out of the database into
+# per-month block files under DIRECTORY by `manage.py archive_audit_log`.
+HISTORY_AUDIT_ARCHIVE = {
+    "DIRECTORY": BASE_DIR / "audit_archive",
+    "RETENTION_DAYS": 90,
+    "BLOCK_ROWS": 5000,
+    "DELETE_CHUNK": 500,
+}
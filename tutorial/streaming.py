@@ -0,0 +1,171 @@
+import csv
+import os
+import re
+import sys
+
+from django.conf import settings
+from django.core.serializers.json import DjangoJSONEncoder
+from django.http import FileResponse, Http404, HttpResponse, StreamingHttpResponse
+from django.utils.cache import patch_vary_headers
+from django.utils.text import compress_sequence
+from rest_framework.negotiation import BaseContentNegotiation
+
+EXPORT_CONTENT_TYPES = {
+    "ndjson": "application/x-ndjson",
+    "csv": "text/csv; charset=utf-8",
+}
+
+accepts_gzip = re.compile(r"\bgzip\b")
+single_byte_range = re.compile(r"^bytes=(\d*)-(\d*)$")
+
+
+def export_chunk_size():
+    return getattr(settings, "EXPORT_CHUNK_SIZE", 2000)
+
+
+class _Echo:
+    """File-like object handing back whatever `csv.writer` writes to it."""
+
+    def write(self, value):
+        return value
+
+
+def _ndjson_lines(rows, columns):
+    encoder = DjangoJSONEncoder(separators=(",", ":"))
+    for row in rows:
+        yield encoder.encode({name: row[key] for name, key in columns.items()}) + "\n"
+
+
+def _csv_lines(rows, columns):
+    writer = csv.writer(_Echo())
+    yield writer.writerow(columns)
+    for row in rows:
+        yield writer.writerow([row[key] for key in columns.values()])
+
+
+def export_chunks(rows, columns, export_format, compress=False, buffer_size=65536):
+    """
+    Encode `rows` (dicts, usually from `values().iterator()`) as NDJSON or CSV
+    bytes, in chunks of about `buffer_size`, gzipped if `compress`.
+    `columns` maps each exported name to its key in the rows.
+    """
+    if export_format == "csv":
+        lines = _csv_lines(rows, columns)
+    else:
+        lines = _ndjson_lines(rows, columns)
+
+    def buffered():
+        buffer, size = [], 0
+        for line in lines:
+            encoded = line.encode()
+            buffer.append(encoded)
+            size += len(encoded)
+            if size >= buffer_size:
+                yield b"".join(buffer)
+                buffer, size = [], 0
+        if buffer:
+            yield b"".join(buffer)
+
+    return compress_sequence(buffered()) if compress else buffered()
+
+
+class ExportContentNegotiation(BaseContentNegotiation):
+    """
+    Exports choose their own content type from the URL, so the Accept header
+    (e.g. "text/csv") must not get the request rejected.
+    """
+
+    def select_parser(self, request, parsers):
+        return parsers[0] if parsers else None
+
+    def select_renderer(self, request, renderers, format_suffix=None):
+        return renderers[0], renderers[0].media_type
+
+
+def export_response(request, rows, columns, export_format, filename):
+    """
+    Stream an export as a download, gzipped on the fly when the client
+    accepts it. Nothing is held in memory beyond one chunk of rows.
+    """
+    if export_format not in EXPORT_CONTENT_TYPES:
+        raise Http404(f"Unknown export format: {export_format}")
+
+    compress = bool(accepts_gzip.search(request.META.get("HTTP_ACCEPT_ENCODING", "")))
+    response = StreamingHttpResponse(
+        export_chunks(rows, columns, export_format, compress=compress),
+        content_type=EXPORT_CONTENT_TYPES[export_format],
+    )
+    if compress:
+        response.headers["Content-Encoding"] = "gzip"
+    patch_vary_headers(response, ("Accept-Encoding",))
+    response.headers["Content-Disposition"] = (
+        f'attachment; filename="{filename}.{export_format}"'
+    )
+    return response
+
+
+def write_export(rows, columns, export_format, output, compress=False):
+    """
+    Write an export to the file at `output`, or to stdout for "-".
+    """
+    chunks = export_chunks(rows, columns, export_format, compress=compress)
+    if output == "-":
+        stream = sys.stdout.buffer
+        for chunk in chunks:
+            stream.write(chunk)
+        stream.flush()
+        return
+
+    with open(output, "wb") as stream:
+        for chunk in chunks:
+            stream.write(chunk)
+
+
+def _file_range(stream, length, chunk_size=65536):
+    try:
+        while length > 0:
+            chunk = stream.read(min(chunk_size, length))
+            if not chunk:
+                break
+            length -= len(chunk)
+            yield chunk
+    finally:
+        stream.close()
+
+
+def ranged_file_response(request, path, content_type, etag=None):
+    """
+    Stream the file at `path`, or the one byte range named by a Range header
+    as a 206. Ranges can't be combined with If-Range not matching `etag`, or
+    with several ranges at once; those get the whole file.
+    """
+    size = os.path.getsize(path)
+    match = single_byte_range.match(request.META.get("HTTP_RANGE", "").strip())
+    if_range = request.META.get("HTTP_IF_RANGE")
+    if match is None or (if_range is not None and if_range != etag):
+        response = FileResponse(open(path, "rb"), content_type=content_type)
+        response.headers["Accept-Ranges"] = "bytes"
+        return response
+
+    first, last = match.groups()
+    if first:
+        start = int(first)
+        end = min(int(last), size - 1) if last else size - 1
+    elif last:
+        start, end = max(size - int(last), 0), size - 1
+    else:
+        start, end = 0, -1
+    if start > end:
+        response = HttpResponse(status=416)
+        response.headers["Content-Range"] = f"bytes */{size}"
+        return response
+
+    stream = open(path, "rb")
+    stream.seek(start)
+    response = StreamingHttpResponse(
+        _file_range(stream, end - start + 1), status=206, content_type=content_type
+    )
+    response.headers["Content-Range"] = f"bytes {start}-{end}/{size}"
+    response.headers["Content-Length"] = str(end - start + 1)
+    response.headers["Accept-Ranges"] = "bytes"
+    return response
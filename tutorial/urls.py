@@ -10,4 +10,5 @@ urlpatterns = [
     path("api-auth/", include("rest_framework.urls")),
     path("snippets/", include("snippets.urls")),
     path("accounts/", include("accounts.urls")),
+    path("history/", include("history.urls")),
 ]
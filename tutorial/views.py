@@ -1,13 +1,19 @@
-from rest_framework.decorators import api_view
 from rest_framework.response import Response
 from rest_framework.reverse import reverse
+from rest_framework.views import APIView
 
+from tutorial.responsecache import CachedResponseMixin
 
-@api_view(["GET"])
-def api_root(request, format=None):
-    return Response(
-        {
-            "users": reverse("customuser-list", request=request, format=format),
-            "snippets": reverse("snippet-list", request=request, format=format),
-        }
-    )
+
+class APIRoot(CachedResponseMixin, APIView):
+    def get(self, request, format=None):
+        return Response(
+            {
+                "users": reverse("customuser-list", request=request, format=format),
+                "snippets": reverse("snippet-list", request=request, format=format),
+                "history": reverse("auditlog-list", request=request, format=format),
+            }
+        )
+
+
+api_root = APIRoot.as_view()